@@ -1,14 +1,149 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models import F, Q
+from django.shortcuts import render
+
+from .analytics import refresh_stats
+from .boards import invalidate_boards
+from .fragments import DEPENDENCIES, invalidate_fragments
+from .models import Flight, Airport, Job, Passenger
+from .pagination import ApproximateCountPaginator
+from .routing import route_index
+from .search import search_by_name
+
+
+class ReassignAirportForm(forms.Form):
+    side = forms.ChoiceField(choices=[("origin", "Origin"), ("destination", "Destination")])
+    code = forms.CharField(max_length=3, label="New airport code")
+
+    def clean_code(self):
+        code = self.cleaned_data["code"].upper()
+        try:
+            self.cleaned_data["airport"] = Airport.objects.get(code=code)
+        except Airport.DoesNotExist:
+            raise forms.ValidationError(f"No airport with code {code}.")
+        return code
+
+
+class PassengerAdminForm(forms.ModelForm):
+    class Meta:
+        model = Passenger
+        fields = "__all__"
+
+    def clean_flights(self):
+        # The relation books through the ORM, which raises the counters
+        # without checking them; full flights are refused here instead of
+        # failing the flight_not_overbooked constraint on save.
+        flights = self.cleaned_data["flights"]
+        booked = set(self.instance.flights.values_list("pk", flat=True)) if self.instance.pk else set()
+        full = flights.exclude(pk__in=booked).filter(seats_booked__gte=F("capacity"))
+        if full:
+            raise forms.ValidationError(
+                "No seats left on flight %(flights)s.",
+                params={"flights": ", ".join(str(flight.pk) for flight in full)},
+            )
+        return flights
 
-from .models import Flight, Airport, Passenger
 
 # Register your models here.
+class AirportAdmin(admin.ModelAdmin):
+    list_display = ("code", "city")
+    search_fields = ("=code", "city")
+    ordering = ("code",)
+
 class FlightAdmin(admin.ModelAdmin):
-    list_display = ("id", "origin", "destination", "duration")
+    list_display = ("id", "origin", "destination", "duration", "capacity", "seats_booked")
+    list_select_related = ("origin", "destination")
+    # Searched by get_search_results below; declared for the search box and
+    # the passenger flights autocomplete.
+    search_fields = ("id", "origin__code", "destination__code")
+    raw_id_fields = ("origin", "destination")
+    ordering = ("id",)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+    actions = ["reassign_airport"]
+
+    def get_queryset(self, request):
+        # Autocomplete results print flights with their airports.
+        return super().get_queryset(request).select_related("origin", "destination")
+
+    def get_search_results(self, request, queryset, search_term):
+        # Exact, indexed lookups only: a flight id, an airport code, or a
+        # route written as "WAW-JFK".
+        term = search_term.strip().upper()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+        if "-" in term:
+            origin, _, destination = term.partition("-")
+            return queryset.filter(
+                origin__in=Airport.objects.filter(code=origin.strip()),
+                destination__in=Airport.objects.filter(code=destination.strip()),
+            ), False
+        airports = Airport.objects.filter(code=term)
+        return queryset.filter(Q(origin__in=airports) | Q(destination__in=airports)), False
+
+    @admin.action(description="Reassign selected flights to another airport")
+    def reassign_airport(self, request, queryset):
+        form = ReassignAirportForm(request.POST if "apply" in request.POST else None)
+        if not form.is_valid():
+            return render(request, "admin/flights/flight/reassign_airport.html", {
+                **self.admin_site.each_context(request),
+                "opts": self.model._meta,
+                "form": form,
+                "flights": queryset.count(),
+                "selected": request.POST.getlist(admin.helpers.ACTION_CHECKBOX_NAME),
+                "select_across": request.POST.get("select_across", "0"),
+            })
+
+        side = form.cleaned_data["side"]
+        airport = form.cleaned_data["airport"]
+        other = "destination" if side == "origin" else "origin"
+        with transaction.atomic():
+            # Boards on both ends of a moved flight show the airport it left.
+            touched = set(queryset.values_list(f"{side}_id", flat=True).distinct())
+            touched.update(queryset.values_list(f"{other}_id", flat=True).distinct())
+            # A flight cannot start and end at the same airport.
+            skipped = queryset.filter(**{other: airport}).count()
+            updated = queryset.exclude(**{other: airport}).update(**{side: airport})
+
+        # A single UPDATE bypasses model signals: reset what they maintain.
+        route_index.reset()
+        invalidate_boards(touched | {airport.pk})
+        invalidate_fragments(DEPENDENCIES)
+        refresh_stats()
+        self.message_user(request, f"Moved the {side} of {updated} flights to {airport.code}.", messages.SUCCESS)
+        if skipped:
+            self.message_user(request, f"Skipped {skipped} flights that would start and end at {airport.code}.", messages.WARNING)
 
 class PassengerAdmin(admin.ModelAdmin):
-    filter_horizontal = ("flights",)
+    form = PassengerAdminForm
+    list_display = ("id", "first", "last", "flight_count")
+    search_fields = ("first", "last")
+    autocomplete_fields = ("flights",)
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # Name prefixes through the functional indexes instead of icontains.
+        terms = search_term.split()
+        if not terms:
+            return queryset, False
+        return search_by_name(queryset, terms), False
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        if db_field.name == "flights":
+            kwargs["queryset"] = Flight.objects.select_related("origin", "destination")
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "task", "status", "attempts", "run_after", "finished_at")
+    list_filter = ("status", "task")
+    ordering = ("-id",)
 
-admin.site.register(Airport)
+admin.site.register(Airport, AirportAdmin)
 admin.site.register(Flight, FlightAdmin)
-admin.site.register(Passenger, PassengerAdmin)
\ No newline at end of file
+admin.site.register(Passenger, PassengerAdmin)
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,107 @@
+import functools
+import operator
+
+from django.db import transaction
+from django.db.models import Avg, Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Airport, AirportStats, Flight, RouteStats
+from .transfer import batches
+
+BATCH_SIZE = 2000
+ROUTE_FIELDS = ["flights", "average_duration", "passengers", "updated_at"]
+AIRPORT_FIELDS = ["departures", "arrivals", "passengers_departing", "passengers_arriving", "updated_at"]
+
+
+def _routes_filter(routes):
+    return functools.reduce(
+        operator.or_, (Q(origin_id=origin, destination_id=destination) for origin, destination in routes),
+    )
+
+
+def refresh_routes(routes=None):
+    """
+    Recompute RouteStats for the given ``(origin_id, destination_id)`` pairs,
+    or for every route when None. Passenger totals are summed from the
+    Flight.seats_booked counters rather than counted from bookings. Rows
+    are upserted in place, so readers never see a route missing, and
+    routes left without flights are deleted afterwards.
+    """
+    flights = Flight.objects.order_by()
+    stats = RouteStats.objects.all()
+    if routes is not None:
+        routes = set(routes)
+        if not routes:
+            return 0
+        flights = flights.filter(_routes_filter(routes))
+        stats = stats.filter(_routes_filter(routes))
+
+    rows = flights.values("origin_id", "destination_id").annotate(
+        total=Count("id"),
+        average_duration=Avg("duration"),
+        passengers=Coalesce(Sum("seats_booked"), 0),
+    )
+    now = timezone.now()
+    refreshed = 0
+    with transaction.atomic():
+        for batch in batches(rows.iterator(chunk_size=BATCH_SIZE), BATCH_SIZE):
+            RouteStats.objects.bulk_create(
+                [
+                    RouteStats(
+                        origin_id=row["origin_id"], destination_id=row["destination_id"], flights=row["total"],
+                        average_duration=row["average_duration"], passengers=row["passengers"], updated_at=now,
+                    )
+                    for row in batch
+                ],
+                update_conflicts=True,
+                unique_fields=["origin", "destination"],
+                update_fields=ROUTE_FIELDS,
+            )
+            refreshed += len(batch)
+        stats.filter(updated_at__lt=now).delete()
+    return refreshed
+
+
+def refresh_airports(airport_ids=None):
+    """Recompute AirportStats for the given airports, or for all when None."""
+    flights = Flight.objects.order_by()
+    airports = Airport.objects.order_by("id")
+    if airport_ids is not None:
+        airport_ids = set(airport_ids)
+        flights = flights.filter(Q(origin_id__in=airport_ids) | Q(destination_id__in=airport_ids))
+        airports = airports.filter(pk__in=airport_ids)
+    airports = list(airports.values_list("id", flat=True))
+
+    def totals(side):
+        rows = (
+            flights.values(side).annotate(total=Count("id"), passengers=Coalesce(Sum("seats_booked"), 0))
+            .values_list(side, "total", "passengers")
+        )
+        return {airport_id: (total, passengers) for airport_id, total, passengers in rows}
+
+    departures, arrivals = totals("origin"), totals("destination")
+    now = timezone.now()
+    summaries = [
+        AirportStats(
+            airport_id=airport_id,
+            departures=departures.get(airport_id, (0, 0))[0],
+            arrivals=arrivals.get(airport_id, (0, 0))[0],
+            passengers_departing=departures.get(airport_id, (0, 0))[1],
+            passengers_arriving=arrivals.get(airport_id, (0, 0))[1],
+            updated_at=now,
+        )
+        for airport_id in airports
+    ]
+    AirportStats.objects.bulk_create(
+        summaries,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["airport"],
+        update_fields=AIRPORT_FIELDS,
+    )
+    return len(summaries)
+
+
+def refresh_stats():
+    return {"routes": refresh_routes(), "airports": refresh_airports()}
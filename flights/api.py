@@ -0,0 +1,227 @@
+import functools
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Callable
+
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import urlencode, quote_etag
+
+from .models import Airport, Flight, Passenger
+from .pagination import CursorEncoder, CursorPaginator, InvalidCursor
+from .schedule import in_window
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _int(params, name):
+    value = params.get(name)
+    return None if value in (None, "") else int(value)
+
+
+def _filter_airports(queryset, params):
+    if params.get("code"):
+        queryset = queryset.filter(code=params["code"].upper())
+    if params.get("city"):
+        queryset = queryset.filter(city=params["city"])
+    return queryset
+
+
+def _filter_flights(queryset, params):
+    if params.get("origin"):
+        queryset = queryset.filter(origin__code=params["origin"].upper())
+    if params.get("destination"):
+        queryset = queryset.filter(destination__code=params["destination"].upper())
+    if (minimum := _int(params, "min_duration")) is not None:
+        queryset = queryset.filter(duration__gte=minimum)
+    if (maximum := _int(params, "max_duration")) is not None:
+        queryset = queryset.filter(duration__lte=maximum)
+    return in_window(queryset, params)
+
+
+def _filter_passengers(queryset, params):
+    if params.get("first"):
+        queryset = queryset.filter(first=params["first"])
+    if params.get("last"):
+        queryset = queryset.filter(last=params["last"])
+    return queryset
+
+
+@dataclass
+class Resource:
+    model: type
+    # Public field name -> ORM path passed to values().
+    fields: dict
+    filter: Callable
+    login_required: bool = False
+    ordering: tuple = ("id",)
+
+
+RESOURCES = {
+    "airports": Resource(
+        model=Airport,
+        fields={"id": "id", "code": "code", "city": "city"},
+        filter=_filter_airports,
+    ),
+    "flights": Resource(
+        model=Flight,
+        fields={
+            "id": "id",
+            "origin": "origin__code",
+            "destination": "destination__code",
+            "duration": "duration",
+            "capacity": "capacity",
+            "seats_booked": "seats_booked",
+            "departure": "departure",
+            "arrival": "arrival",
+        },
+        filter=_filter_flights,
+        # Timetable order, on the flight_departure index (or the
+        # origin/destination ones when filtered by airport).
+        ordering=("departure", "id"),
+    ),
+    "passengers": Resource(
+        model=Passenger,
+        fields={"id": "id", "first": "first", "last": "last", "flight_count": "flight_count"},
+        filter=_filter_passengers,
+        login_required=True,
+    ),
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _error(message, status):
+    return JsonResponse({"error": message}, status=status)
+
+
+def _selected_fields(resource, params):
+    requested = params.get("fields")
+    if not requested:
+        return list(resource.fields)
+
+    selected = [name.strip() for name in requested.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in resource.fields]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}.")
+    return selected
+
+
+def _rows(resource, queryset, selected):
+    # Rows always carry the ordering columns for keyset pagination; they
+    # are dropped again when not selected.
+    paths = {resource.fields[name]: name for name in selected}
+    for name in resource.ordering:
+        paths.setdefault(name.lstrip("-"), None)
+    return queryset.values(*paths), paths
+
+
+def _present(row, paths):
+    return {name: row[path] for path, name in paths.items() if name is not None}
+
+
+def _conditional_json(request, data):
+    body = json.dumps(data, cls=CursorEncoder).encode()
+    etag = quote_etag(hashlib.sha1(body).hexdigest())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    return response
+
+
+def _prepare(request, name):
+    resource = RESOURCES[name]
+    if resource.login_required and not request.user.is_authenticated:
+        raise PermissionDenied
+    selected = _selected_fields(resource, request.GET)
+    try:
+        queryset = resource.filter(resource.model.objects.all(), request.GET)
+    except (ValueError, ValidationError):
+        raise BadRequest("Invalid filter value.")
+    return resource, selected, queryset
+
+
+def _guarded(view):
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except PermissionDenied:
+            return _error("Authentication required.", 403)
+        except BadRequest as exc:
+            return _error(str(exc), 400)
+    return wrapper
+
+
+@_guarded
+def list_view(request, name):
+    resource, selected, queryset = _prepare(request, name)
+    try:
+        limit = max(1, min(int(request.GET.get("limit", DEFAULT_LIMIT)), MAX_LIMIT))
+    except ValueError:
+        raise BadRequest("limit must be an integer.")
+
+    rows, paths = _rows(resource, queryset, selected)
+    paginator = CursorPaginator(rows, limit, resource.ordering)
+    try:
+        page = paginator.page(after=request.GET.get("after"), before=request.GET.get("before"))
+    except (InvalidCursor, ValueError, ValidationError):
+        raise BadRequest("Invalid cursor.")
+
+    def link(**cursor):
+        params = {key: value for key, value in request.GET.items() if key not in ("after", "before")}
+        return f"{request.path}?{urlencode({**params, **cursor})}"
+
+    return _conditional_json(request, {
+        "results": [_present(row, paths) for row in page],
+        "next": link(after=page.next_cursor) if page.has_next() else None,
+        "previous": link(before=page.previous_cursor) if page.has_previous() else None,
+    })
+
+
+@_guarded
+def detail_view(request, name, pk):
+    resource, selected, queryset = _prepare(request, name)
+    rows, paths = _rows(resource, queryset.filter(pk=pk), selected)
+    row = rows.first()
+    if row is None:
+        return _error("Not found.", 404)
+    return _conditional_json(request, _present(row, paths))
+
+
+@_guarded
+def export_view(request, name):
+    """
+    Stream every matching row as newline-delimited JSON. Rows are read with
+    a server-side iterator in chunks, so memory use does not depend on the
+    size of the table.
+    """
+    resource, selected, queryset = _prepare(request, name)
+    rows, paths = _rows(resource, queryset.order_by(*resource.ordering), selected)
+
+    def lines():
+        for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield json.dumps(_present(row, paths), cls=CursorEncoder) + "\n"
+
+    response = StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+    response["Content-Disposition"] = f'attachment; filename="{name}.ndjson"'
+    return response
+
+
+def index_view(request):
+    return JsonResponse({
+        name: {
+            "list": request.build_absolute_uri(reverse(f"api_{name}")),
+            "export": request.build_absolute_uri(reverse(f"api_{name}_export")),
+            "fields": list(resource.fields),
+        }
+        for name, resource in RESOURCES.items()
+    })
@@ -0,0 +1,72 @@
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth import get_user
+from django.shortcuts import render
+from django.http import HttpResponseBadRequest, HttpResponseRedirect, Http404
+from django.urls import reverse
+from django.core.exceptions import ValidationError
+
+from .fragments import fragment_key
+from .models import Flight, Passenger, Airport
+from .pagination import apaginate
+from .views import FLIGHT_ORDERING, FLIGHT_PASSENGERS, flight_list
+
+
+# Native async variants of the read-only views, for deployments behind
+# tin.asgi. Every query goes through the async ORM; templates are rendered
+# only from already evaluated data.
+
+async def _user(request):
+    # AuthenticationMiddleware leaves a lazy user that would hit the session
+    # and user tables synchronously on first access. Resolve it once here,
+    # which also loads the session for the messages framework.
+    request.user = await sync_to_async(get_user)(request)
+    return request.user
+
+async def index(request):
+    await _user(request)
+    try:
+        flights, filters = flight_list(request)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    flights_paginated = await apaginate(request, flights, 3, ordering=FLIGHT_ORDERING)
+
+    return render(request, "flights/index.html", {
+        "flights": flights_paginated,
+        "fragment": fragment_key(request, "flights"),
+        "filters": filters,
+    })
+
+async def airports(request):
+    await _user(request)
+    airports_paginated = await apaginate(request, Airport.objects.all(), 3)
+
+    return render(request, "flights/airports.html", {
+        "airports": airports_paginated,
+        "fragment": fragment_key(request, "airports"),
+    })
+
+async def passengers(request):
+    user = await _user(request)
+    if not user.is_authenticated:
+        return HttpResponseRedirect(reverse("login"))
+
+    passengers_paginated = await apaginate(request, Passenger.objects.all(), 3)
+
+    return render(request, "flights/passengers.html", {
+        "passengers": passengers_paginated,
+        "fragment": fragment_key(request, "passengers"),
+    })
+
+async def flight(request, flight_id):
+    await _user(request)
+    try:
+        flight = await Flight.objects.select_related("origin", "destination").aget(pk=flight_id)
+    except (Flight.DoesNotExist, ValueError, ValidationError):
+        raise Http404("Flight does not exist or invalid flight_id.")
+
+    return render(request, "flights/flight.html", {
+        "flight": flight,
+        "passengers": [passenger async for passenger in flight.passengers.order_by("id")[:FLIGHT_PASSENGERS]],
+        "truncated": flight.seats_booked > FLIGHT_PASSENGERS,
+    })
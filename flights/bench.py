@@ -0,0 +1,102 @@
+import json
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+from .querybudget import QueryCounter
+
+
+@contextmanager
+def scratch_database(alias="default"):
+    """
+    Run a benchmark against a throwaway copy of the schema, created the
+    same way the test runner does. SQLite gets a temporary file rather than
+    an in-memory database so that worker threads can share it.
+    """
+    connection = connections[alias]
+    path = None
+    if connection.vendor == "sqlite":
+        handle, path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(handle)
+        connection.settings_dict["TEST"]["NAME"] = path
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if path:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+
+class Timer:
+    def __init__(self):
+        self.samples = []
+
+    @contextmanager
+    def measure(self):
+        # Only operations that complete are sampled.
+        start = time.perf_counter()
+        yield
+        self.samples.append(time.perf_counter() - start)
+
+    def summary(self, elapsed=None):
+        samples = sorted(self.samples)
+        if not samples:
+            return {"count": 0}
+
+        def percentile(fraction):
+            return samples[min(int(len(samples) * fraction), len(samples) - 1)] * 1000
+
+        summary = {
+            "count": len(samples),
+            "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+            "p50_ms": round(percentile(0.50), 3),
+            "p95_ms": round(percentile(0.95), 3),
+            "p99_ms": round(percentile(0.99), 3),
+            "max_ms": round(samples[-1] * 1000, 3),
+        }
+        if elapsed:
+            summary["per_second"] = round(len(samples) / elapsed, 1)
+        return summary
+
+
+class Recorder:
+    """Sends requests through the test client, timing each and counting its queries."""
+
+    def __init__(self, client):
+        self.client = client
+        self.timer = Timer()
+        self.queries = []
+        self.statuses = Counter()
+
+    def __call__(self, method, path, data=None):
+        with ExitStack() as stack:
+            counter = QueryCounter().install(stack)
+            with self.timer.measure():
+                response = getattr(self.client, method)(path, data)
+        self.queries.append(counter.count)
+        self.statuses[response.status_code] += 1
+        return response
+
+    def report(self):
+        return {
+            "latency": self.timer.summary(sum(self.timer.samples)),
+            "queries": {
+                "mean": round(statistics.fmean(self.queries), 2) if self.queries else None,
+                "max": max(self.queries, default=None),
+            },
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+        }
+
+
+def dump(data):
+    return json.dumps(data, indent=2, sort_keys=True, default=str)
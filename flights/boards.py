@@ -0,0 +1,66 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import Airport
+
+BOARD_SIZE = 50
+
+
+def board_key(airport_id):
+    return f"flights:board:{airport_id}"
+
+
+def _entry(flight, other):
+    return {
+        "flight": flight.id,
+        "airport": other.code,
+        "city": other.city,
+        "duration": flight.duration,
+        "departure": flight.departure,
+        "arrival": flight.arrival,
+        "seats_booked": flight.seats_booked,
+        "capacity": flight.capacity,
+        "load_factor": flight.load_factor,
+    }
+
+
+def build_board(airport_id):
+    try:
+        airport = Airport.objects.get(pk=airport_id)
+    except Airport.DoesNotExist:
+        return None
+
+    # Timetable order, read straight off the (origin, departure) and
+    # (destination, arrival) indexes.
+    departures = airport.departures.select_related("destination").order_by("departure", "id")[:BOARD_SIZE]
+    arrivals = airport.arrivals.select_related("origin").order_by("arrival", "id")[:BOARD_SIZE]
+    data = {
+        "airport": {"id": airport.id, "code": airport.code, "city": airport.city},
+        "departures": [_entry(flight, flight.destination) for flight in departures],
+        "arrivals": [_entry(flight, flight.origin) for flight in arrivals],
+    }
+    digest = hashlib.sha1(json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder).encode()).hexdigest()
+    return {**data, "etag": digest, "last_modified": timezone.now()}
+
+
+def get_board(airport_id):
+    """
+    Return the cached departures/arrivals board of an airport, building it
+    on a miss. Entries carry no expiry: signals drop them whenever a flight
+    touching the airport, or the airport itself, changes.
+    """
+    key = board_key(airport_id)
+    board = cache.get(key)
+    if board is None:
+        board = build_board(airport_id)
+        if board is not None:
+            cache.set(key, board, timeout=None)
+    return board
+
+
+def invalidate_boards(airport_ids):
+    cache.delete_many([board_key(airport_id) for airport_id in set(airport_ids) if airport_id])
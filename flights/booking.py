@@ -0,0 +1,110 @@
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import F
+
+from .boards import invalidate_boards
+from .fragments import invalidate_fragments, lists_showing
+from .models import Flight, Passenger
+
+# Keeps IN (...) lists well below the bound-parameter limits of every backend.
+CHUNK_SIZE = 500
+
+
+@dataclass
+class BookingResult:
+    changed: list = field(default_factory=list)
+    unchanged: list = field(default_factory=list)
+    missing: list = field(default_factory=list)
+    full: list = field(default_factory=list)
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _lock_flight(flight):
+    # A no-op UPDATE takes the row lock on PostgreSQL and the database write
+    # lock on SQLite, so concurrent bookings of one flight are serialized from
+    # here until the transaction commits, on every backend.
+    Flight.objects.filter(pk=flight.pk).update(seats_booked=F("seats_booked"))
+    return Flight.objects.values_list("capacity", "seats_booked", "origin_id", "destination_id").get(pk=flight.pk)
+
+
+def _count(flight, passenger_ids, step):
+    # Both booking counters move in the transaction that changes the
+    # bookings; the lists and boards showing them are dropped at commit.
+    Flight.objects.filter(pk=flight.pk).update(seats_booked=F("seats_booked") + step * len(passenger_ids))
+    for chunk in _chunks(passenger_ids):
+        Passenger.objects.filter(pk__in=chunk).update(flight_count=F("flight_count") + step)
+
+
+def _invalidate(airport_ids):
+    invalidate_boards(airport_ids)
+    invalidate_fragments(lists_showing(Passenger.flights.through))
+
+
+def _split(flight, passenger_ids):
+    passenger_ids = list(dict.fromkeys(passenger_ids))
+    through = Passenger.flights.through
+    known, booked = set(), set()
+    for chunk in _chunks(passenger_ids):
+        known.update(Passenger.objects.filter(pk__in=chunk).values_list("pk", flat=True))
+        booked.update(
+            through.objects.filter(flight_id=flight.pk, passenger_id__in=chunk)
+            .values_list("passenger_id", flat=True)
+        )
+
+    result = BookingResult(missing=[pk for pk in passenger_ids if pk not in known])
+    return passenger_ids, known, booked, result
+
+
+def book_passengers(flight, passenger_ids):
+    """
+    Book many passengers on a flight in one transaction. Passengers that
+    are already booked are reported as unchanged, unknown ids as missing and
+    those that did not fit in the remaining seats as full.
+    """
+    through = Passenger.flights.through
+    with transaction.atomic():
+        capacity, seats_booked, *airports = _lock_flight(flight)
+        passenger_ids, known, booked, result = _split(flight, passenger_ids)
+
+        seats_left = capacity - seats_booked
+        for pk in passenger_ids:
+            if pk not in known:
+                continue
+            if pk in booked:
+                result.unchanged.append(pk)
+            elif len(result.changed) < seats_left:
+                result.changed.append(pk)
+            else:
+                result.full.append(pk)
+
+        if result.changed:
+            through.objects.bulk_create(
+                [through(flight_id=flight.pk, passenger_id=pk) for pk in result.changed],
+                batch_size=CHUNK_SIZE,
+            )
+            _count(flight, result.changed, 1)
+            transaction.on_commit(lambda: _invalidate(airports))
+    return result
+
+
+def unbook_passengers(flight, passenger_ids):
+    """Remove many passengers from a flight in one transaction."""
+    through = Passenger.flights.through
+    with transaction.atomic():
+        _, _, *airports = _lock_flight(flight)
+        passenger_ids, known, booked, result = _split(flight, passenger_ids)
+        for pk in passenger_ids:
+            if pk in known:
+                (result.changed if pk in booked else result.unchanged).append(pk)
+
+        if result.changed:
+            for chunk in _chunks(result.changed):
+                through.objects.filter(flight_id=flight.pk, passenger_id__in=chunk).delete()
+            _count(flight, result.changed, -1)
+            transaction.on_commit(lambda: _invalidate(airports))
+    return result
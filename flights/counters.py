@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Flight, Passenger
+
+BATCH_SIZE = 5000
+
+# Model -> (counter field, through table column pointing at the model).
+COUNTERS = {
+    Flight: ("seats_booked", "flight_id"),
+    Passenger: ("flight_count", "passenger_id"),
+}
+
+
+def _booked(column):
+    through = Passenger.flights.through
+    rows = through.objects.filter(**{column: OuterRef("pk")}).order_by().values(column).annotate(total=Count("id"))
+    return Coalesce(Subquery(rows.values("total")), 0)
+
+
+def _batches(model, ids, batch_size):
+    if ids is not None:
+        ids = sorted(set(ids))
+        for start in range(0, len(ids), batch_size):
+            yield model.objects.filter(pk__in=ids[start:start + batch_size])
+        return
+
+    # Primary key ranges rather than OFFSET pages: each batch is an index
+    # range however far into the table it is.
+    last = model.objects.aggregate(last=Max("pk"))["last"] or 0
+    for start in range(0, last + 1, batch_size):
+        yield model.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+
+
+def recount(model, ids=None, batch_size=BATCH_SIZE):
+    """
+    Recompute the booking counter of ``model`` (Flight or Passenger) from
+    the through table, for the given ids or for every row, one transaction
+    per batch. Only rows whose counter is wrong are written; returns how
+    many were.
+    """
+    field, column = COUNTERS[model]
+    actual = _booked(column)
+    fixed = 0
+    for rows in _batches(model, ids, batch_size):
+        with transaction.atomic():
+            fixed += rows.exclude(**{field: actual}).update(**{field: actual})
+    return fixed
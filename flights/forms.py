@@ -10,7 +10,8 @@ class AirportForm(forms.ModelForm):
         fields = ['code', 'city']
 
     def clean_code(self):
-        code = self.cleaned_data['code']
+        # Codes are stored and looked up in upper case.
+        code = self.cleaned_data['code'].upper()
 
         if not code.isalpha():
             raise forms.ValidationError("The airport code should only contain letters.")
@@ -49,7 +50,20 @@ class PassengerForm(forms.ModelForm):
 class FlightForm(forms.ModelForm):
     class Meta:
         model = Flight
-        fields = ['origin', 'destination', 'duration']
+        fields = ['origin', 'destination', 'departure', 'duration', 'capacity']
+        widgets = {
+            'departure': forms.DateTimeInput(attrs={'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'),
+        }
+
+    def clean_capacity(self):
+        capacity = self.cleaned_data['capacity']
+
+        if self.instance.pk and capacity < self.instance.seats_booked:
+            raise forms.ValidationError(
+                f"The capacity cannot be lower than the {self.instance.seats_booked} seats already booked."
+            )
+
+        return capacity
 
 class RegistrationForm(UserCreationForm):
     email = forms.EmailField()
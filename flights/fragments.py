@@ -0,0 +1,46 @@
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.utils.http import urlencode
+
+from .models import Airport, Flight, Passenger
+from .schedule import WINDOW_PARAMS
+
+# List page -> models whose rows are rendered on it. Both the flight and
+# passenger lists show booking counters, which change with the bookings.
+DEPENDENCIES = {
+    "flights": (Flight, Airport, Passenger.flights.through),
+    "airports": (Airport,),
+    "passengers": (Passenger, Passenger.flights.through),
+}
+
+# Query parameters that select what a list page shows.
+PAGE_PARAMS = ("page", "after", "before", "count", "origin", *WINDOW_PARAMS)
+
+
+def _version_key(name):
+    return f"flights:fragments:{name}"
+
+
+def fragment_key(request, name):
+    """
+    Cache key suffix for the rendered body of a list page, for use as the
+    vary-on argument of {% cache %}. It combines the list's current version,
+    whether the visitor is signed in, and the pagination parameters.
+    """
+    version = cache.get_or_set(_version_key(name), lambda: uuid.uuid4().hex, timeout=None)
+    visibility = "user" if request.user.is_authenticated else "anonymous"
+    params = urlencode([(key, request.GET[key]) for key in PAGE_PARAMS if key in request.GET])
+    return f"{version}:{visibility}:{hashlib.md5(params.encode()).hexdigest()}"
+
+
+def lists_showing(model):
+    return [name for name, models in DEPENDENCIES.items() if model in models]
+
+
+def invalidate_fragments(names):
+    # A new version makes every cached page of the list unreachable at once;
+    # the old entries expire within a day, the {% cache %} timeout in the
+    # list templates. Versions themselves are kept until replaced.
+    cache.set_many({_version_key(name): uuid.uuid4().hex for name in names}, timeout=None)
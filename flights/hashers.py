@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the iteration count taken from
+    settings.PASSWORD_HASH_ITERATIONS. It keeps the pbkdf2_sha256 algorithm
+    name, so existing hashes verify as before and are rewritten with the
+    configured count the next time their user logs in.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, "PASSWORD_HASH_ITERATIONS", PBKDF2PasswordHasher.iterations)
@@ -0,0 +1,236 @@
+import bisect
+import json
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+from .querybudget import QueryCounter
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets; the last bucket is open-ended.
+MILLISECOND_BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+BYTE_BOUNDS = (1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20)
+
+_recording = ContextVar("flights_performance_recording", default=None)
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the percentile; None past the last bound.
+        rank = fraction * self.count
+        seen = 0
+        for position, hits in enumerate(self.buckets):
+            seen += hits
+            if hits and seen >= rank:
+                return self.bounds[position] if position < len(self.bounds) else None
+        return None
+
+    def snapshot(self):
+        labels = [f"le_{bound}" for bound in self.bounds] + ["inf"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": dict(zip(labels, self.buckets)),
+        }
+
+
+class Recording:
+    """Measurements for one sampled request."""
+
+    def __init__(self):
+        self.queries = QueryCounter()
+        self.template_time = 0.0
+        self.templates = 0
+
+
+def _record_query(execute, sql, params, many, context):
+    recording = _recording.get()
+    if recording is None:
+        return execute(sql, params, many, context)
+    return recording.queries(execute, sql, params, many, context)
+
+
+def _install(connection, **kwargs):
+    # Connections are per thread, so the recorder goes on each one as it is
+    # opened; queries find the request they belong to through _recording,
+    # which sync_to_async and async_to_sync carry into their threads.
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+connection_created.connect(_install)
+
+
+class Stats:
+    """Process-wide histograms per URL name."""
+
+    metrics = {
+        "wall_ms": MILLISECOND_BOUNDS,
+        "sql_ms": MILLISECOND_BOUNDS,
+        "sql_queries": (0, 1, 2, 3, 5, 10, 20, 50, 100),
+        "template_ms": MILLISECOND_BOUNDS,
+        "response_bytes": BYTE_BOUNDS,
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.last_logged = time.monotonic()
+
+    def record(self, name, values):
+        with self.lock:
+            histograms = self.views.get(name)
+            if histograms is None:
+                histograms = self.views[name] = {metric: Histogram(bounds) for metric, bounds in self.metrics.items()}
+            for metric, value in values.items():
+                if value is not None:
+                    histograms[metric].observe(value)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: {metric: histogram.snapshot() for metric, histogram in histograms.items()}
+                for name, histograms in sorted(self.views.items())
+            }
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+    def maybe_log(self, interval):
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_logged < interval:
+                return
+            self.last_logged = now
+        logger.info(json.dumps(self.snapshot(), sort_keys=True))
+
+
+stats = Stats()
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        recording = _recording.get()
+        if recording is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            recording.template_time += time.perf_counter() - start
+            recording.templates += 1
+
+
+class TimedTemplates(DjangoTemplates):
+    """
+    The Django template backend, timing every top-level render made while
+    a request is being recorded by PerformanceMiddleware. Includes and
+    extends are rendered inside it and count towards the same time.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+class PerformanceMiddleware:
+    """
+    Record wall time, SQL query count and time, template render time and
+    response size for a sample of requests (settings.PERFORMANCE_SAMPLE_RATE,
+    0 to 1). Sampled responses carry a Server-Timing header and feed the
+    per-URL-name histograms served by the performance view; when
+    settings.PERFORMANCE_LOG_INTERVAL is set they are also logged that
+    often, in seconds. Unsampled requests pay for one random() call.
+    Queries are counted in whichever thread runs them on the request's
+    behalf. Works in both sync and async stacks.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        for alias in connections:
+            _install(connections[alias])
+
+    def sampled(self):
+        rate = getattr(settings, "PERFORMANCE_SAMPLE_RATE", 0.1)
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        recording = Recording()
+        token = _recording.set(recording)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _recording.reset(token)
+        return self.finish(request, response, recording, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        recording = Recording()
+        token = _recording.set(recording)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recording.reset(token)
+        return self.finish(request, response, recording, time.perf_counter() - start)
+
+    def finish(self, request, response, recording, wall):
+        size = None if response.streaming else len(response.content)
+        response["Server-Timing"] = ", ".join([
+            f"total;dur={wall * 1000:.1f}",
+            f'db;dur={recording.queries.duration * 1000:.1f};desc="{recording.queries.count} queries"',
+            f"template;dur={recording.template_time * 1000:.1f}",
+        ])
+
+        match = request.resolver_match
+        stats.record(match.view_name if match else "<unresolved>", {
+            "wall_ms": wall * 1000,
+            "sql_ms": recording.queries.duration * 1000,
+            "sql_queries": recording.queries.count,
+            "template_ms": recording.template_time * 1000 if recording.templates else None,
+            "response_bytes": size,
+        })
+
+        interval = getattr(settings, "PERFORMANCE_LOG_INTERVAL", None)
+        if interval:
+            stats.maybe_log(interval)
+        return response
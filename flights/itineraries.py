@@ -0,0 +1,47 @@
+from django.db.models import Prefetch
+
+from .models import Flight, Passenger
+
+# Most passengers returned by one batch request.
+MAX_BATCH = 500
+
+
+def itinerary_queryset():
+    """
+    Passengers with their booked flights and both airports prefetched into
+    ``passenger.itinerary``: two queries however many passengers are loaded.
+    """
+    flights = Flight.objects.select_related("origin", "destination").order_by("departure", "id")
+    return Passenger.objects.prefetch_related(Prefetch("flights", queryset=flights, to_attr="itinerary"))
+
+
+def _airport(airport):
+    return {"id": airport.id, "code": airport.code, "city": airport.city}
+
+
+def describe(passenger):
+    return {
+        "passenger": {"id": passenger.id, "first": passenger.first, "last": passenger.last},
+        "flights": [
+            {
+                "id": flight.id,
+                "origin": _airport(flight.origin),
+                "destination": _airport(flight.destination),
+                "duration": flight.duration,
+                "departure": flight.departure,
+                "arrival": flight.arrival,
+            }
+            for flight in passenger.itinerary
+        ],
+        "total_duration": sum(flight.duration for flight in passenger.itinerary),
+    }
+
+
+def itineraries(passenger_ids):
+    """Return ``(itineraries, missing_ids)`` for up to MAX_BATCH passenger ids."""
+    passenger_ids = list(dict.fromkeys(passenger_ids))
+    found = {passenger.id: passenger for passenger in itinerary_queryset().filter(pk__in=passenger_ids)}
+    return (
+        [describe(found[pk]) for pk in passenger_ids if pk in found],
+        [pk for pk in passenger_ids if pk not in found],
+    )
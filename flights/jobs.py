@@ -0,0 +1,144 @@
+import os
+import socket
+import threading
+import traceback
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Airport, Job
+
+# Registered task functions by name; see task() below.
+TASKS = {}
+
+# SQLite has a single writer: tasks in one process take turns there rather
+# than time out waiting for each other's write lock.
+_sqlite_writer = threading.Lock()
+
+HOST = socket.gethostname()
+
+
+def task(func=None, *, name=None):
+    """
+    Register a function as a background task under its own name (or
+    ``name``). Tasks take JSON-serialisable keyword arguments and return a
+    JSON-serialisable result; each attempt runs in its own transaction, so
+    a failed attempt leaves nothing behind for the retry to trip over.
+    """
+    def register(func):
+        TASKS[name or func.__name__] = func
+        return func
+    return register(func) if func else register
+
+
+def enqueue(name, max_attempts=3, delay=0, **arguments):
+    if name not in TASKS:
+        raise KeyError(f"Unknown task {name!r}.")
+    return Job.objects.create(
+        task=name, arguments=arguments, max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def backoff(attempts):
+    # Exponential: JOB_RETRY_BACKOFF seconds after the first failure,
+    # doubling after each later one, capped at JOB_RETRY_BACKOFF_MAX.
+    base, cap = settings.JOB_RETRY_BACKOFF, settings.JOB_RETRY_BACKOFF_MAX
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap))
+
+
+def claim():
+    """
+    Mark the next due job as running and return it, or None when nothing
+    is due. The conditional UPDATE lets any number of worker threads and
+    processes poll the same table: only one of them wins each job.
+    """
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.QUEUED, run_after__lte=now).order_by("run_after", "id")
+    for job_id in due.values_list("id", flat=True)[:10]:
+        claimed = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, started_at=now, attempts=F("attempts") + 1, worker=f"{HOST}:{os.getpid()}",
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def requeue_stale():
+    """
+    Queue again the jobs left running by a worker that died mid-task. On
+    this host a job counts as abandoned as soon as its process is gone and
+    never while it is alive, however long it takes; jobs claimed on other
+    hosts only after JOB_TIMEOUT seconds, which must therefore exceed the
+    longest task when workers run on several hosts.
+    """
+    running = Job.objects.filter(status=Job.RUNNING)
+    local = running.filter(worker__startswith=f"{HOST}:")
+    dead = [
+        job_id for job_id, worker in local.values_list("id", "worker")
+        if not _alive(int(worker.rpartition(":")[2]))
+    ]
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_TIMEOUT)
+    requeued = running.filter(pk__in=dead).update(status=Job.QUEUED)
+    requeued += running.exclude(worker__startswith=f"{HOST}:").filter(started_at__lt=cutoff).update(status=Job.QUEUED)
+    return requeued
+
+
+def run(job):
+    """Run a claimed job once, then record its result or schedule a retry."""
+    try:
+        func = TASKS[job.task]
+        with _sqlite_writer if connection.vendor == "sqlite" else nullcontext(), transaction.atomic():
+            # Writing first takes SQLite's write lock before the task reads
+            # anything; a transaction that reads first fails at its first
+            # write if another connection has written in between.
+            Job.objects.filter(pk=job.pk).update(started_at=timezone.now())
+            result = func(**job.arguments)
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.task in TASKS and job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + backoff(job.attempts)
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = Job.SUCCEEDED
+        job.result = result
+        job.error = ""
+        job.finished_at = timezone.now()
+    job.save(update_fields=["status", "run_after", "result", "error", "finished_at"])
+    return job
+
+
+def run_pending():
+    """Run due jobs in this thread until none are left; returns how many ran."""
+    count = 0
+    while (job := claim()) is not None:
+        run(job)
+        count += 1
+    return count
+
+
+@task
+def delete_airport(airport_id):
+    # Cascades to every departure, arrival and their bookings.
+    airport = Airport.objects.filter(pk=airport_id).first()
+    if airport is None:
+        return {"deleted": 0}
+    deleted, by_model = airport.delete()
+    return {"deleted": deleted, "by_model": by_model}
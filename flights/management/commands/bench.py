@@ -0,0 +1,199 @@
+import json
+import random
+import string
+import subprocess
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from flights.bench import Recorder, dump, scratch_database
+from flights.models import Airport, Flight, Passenger
+from flights.pagination import encode_cursor
+from flights.synthetic import seed
+
+
+class Dataset:
+    def __init__(self):
+        self.flights = list(Flight.objects.values_list("id", flat=True))
+        # Keyset cursors for the timetable-ordered flight list and API.
+        self.schedule = list(Flight.objects.values_list("departure", "id"))
+        self.airports = list(Airport.objects.values_list("id", flat=True))
+        self.codes = list(Airport.objects.values_list("code", flat=True))
+        self.passengers = list(Passenger.objects.values_list("id", flat=True))
+
+
+def _pages(total, per_page=3):
+    return max(1, -(-total // per_page))
+
+
+def flight_list(request, rng, data):
+    request("get", reverse("index"), {"page": rng.randint(1, _pages(len(data.flights)))})
+
+
+def flight_list_cursor(request, rng, data):
+    request("get", reverse("index"), {"after": encode_cursor(rng.choice(data.schedule))})
+
+
+def airport_list(request, rng, data):
+    request("get", reverse("airports"), {"page": rng.randint(1, _pages(len(data.airports)))})
+
+
+def passenger_list(request, rng, data):
+    request("get", reverse("passengers"), {"page": rng.randint(1, _pages(len(data.passengers)))})
+
+
+def flight_detail(request, rng, data):
+    request("get", reverse("flight", args=(rng.choice(data.flights),)))
+
+
+def api_flights(request, rng, data):
+    request("get", reverse("api_flights"), {"after": encode_cursor(rng.choice(data.schedule)), "limit": 100})
+
+
+def timetable(request, rng, data):
+    departure, _ = rng.choice(data.schedule)
+    request("get", reverse("api_flights"), {
+        "origin": rng.choice(data.codes),
+        "departs_from": departure.isoformat(),
+        "departs_until": (departure + timedelta(hours=6)).isoformat(),
+    })
+
+
+def book_unbook(request, rng, data):
+    flight_id = rng.choice(data.flights)
+    passenger = {"passenger": rng.choice(data.passengers)}
+    request("post", reverse("book", args=(flight_id,)), passenger)
+    request("post", reverse("unbook", args=(flight_id,)), passenger)
+
+
+def passenger_crud(request, rng, data):
+    # Form validation only accepts letters.
+    last = "Bench" + "".join(rng.choices(string.ascii_lowercase, k=8))
+    request("post", reverse("create_passenger"), {"first": "Anna", "last": last})
+    passenger_id = Passenger.objects.filter(last=last).values_list("id", flat=True).last()
+    request("get", reverse("update_passenger", args=(passenger_id,)))
+    request("post", reverse("update_passenger", args=(passenger_id,)), {"first": "Maria", "last": last})
+    request("get", reverse("delete_passenger", args=(passenger_id,)))
+
+
+def admin_changelist(model):
+    def scenario(request, rng, data):
+        request("get", reverse(f"admin:flights_{model}_changelist"))
+    return scenario
+
+
+SCENARIOS = {
+    "flight_list": flight_list,
+    "flight_list_cursor": flight_list_cursor,
+    "airport_list": airport_list,
+    "passenger_list": passenger_list,
+    "flight_detail": flight_detail,
+    "api_flights": api_flights,
+    "timetable": timetable,
+    "book_unbook": book_unbook,
+    "passenger_crud": passenger_crud,
+    "admin_flights": admin_changelist("flight"),
+    "admin_passengers": admin_changelist("passenger"),
+    "admin_airports": admin_changelist("airport"),
+}
+
+# Latency and query counts where lower is better, throughput where higher is.
+COMPARED = [("latency", "p50_ms"), ("latency", "p95_ms"), ("latency", "p99_ms"), ("latency", "per_second"), ("queries", "mean")]
+
+
+def compare(baseline, current):
+    """Relative change of the headline numbers of every scenario in both reports."""
+    changes = {}
+    for name, result in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        changes[name] = {}
+        for section, metric in COMPARED:
+            old, new = before.get(section, {}).get(metric), result[section].get(metric)
+            if old and new is not None:
+                changes[name][metric] = {"before": old, "after": new, "change": f"{(new - old) / old:+.1%}"}
+    return changes
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database with a synthetic airline and run scripted "
+        "scenarios through the test client, reporting latency percentiles, "
+        "throughput and query counts as JSON. Save a report with --output and "
+        "pass it to --compare on a later commit to see the differences."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--airports", type=int, default=1000)
+        parser.add_argument("--flights", type=int, default=100000)
+        parser.add_argument("--passengers", type=int, default=100000)
+        parser.add_argument("--bookings", type=int, default=200000)
+        parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenario names.")
+        parser.add_argument("--iterations", type=int, default=200, help="Measured runs per scenario.")
+        parser.add_argument("--warmup", type=int, default=10, help="Unmeasured runs per scenario.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for the data and the scenarios.")
+        parser.add_argument("--output", help="Also write the report to this file.")
+        parser.add_argument("--compare", help="Report from an earlier run to compare against.")
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options["scenarios"].split(",") if name.strip()]
+        unknown = [name for name in names if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(unknown)}. Choose from {', '.join(SCENARIOS)}.")
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as handle:
+                baseline = json.load(handle)
+
+        with scratch_database(), override_settings(ALLOWED_HOSTS=["testserver"]):
+            start = time.perf_counter()
+            sizes = seed(
+                airports=options["airports"], flights=options["flights"],
+                passengers=options["passengers"], bookings=options["bookings"],
+                random_seed=options["seed"], progress=self.progress,
+            )
+            self.stderr.write(f"seeded in {time.perf_counter() - start:.1f}s")
+            cache.clear()
+
+            client = Client()
+            client.force_login(User.objects.create_superuser("bench", password="bench"))
+            data = Dataset()
+            scenarios = {}
+            for name in names:
+                rng = random.Random(options["seed"])
+                for _ in range(options["warmup"]):
+                    SCENARIOS[name](Recorder(client), rng, data)
+                recorder = Recorder(client)
+                for _ in range(options["iterations"]):
+                    SCENARIOS[name](recorder, rng, data)
+                scenarios[name] = recorder.report()
+                self.stderr.write(f"{name}: p50 {scenarios[name]['latency']['p50_ms']}ms")
+
+        report = {"commit": _commit(), "dataset": sizes, "iterations": options["iterations"], "scenarios": scenarios}
+        if baseline is not None:
+            report["comparison"] = {"baseline": baseline.get("commit"), "scenarios": compare(baseline, report)}
+        if options["output"]:
+            with open(options["output"], "w") as handle:
+                handle.write(dump(report))
+        self.stdout.write(dump(report))
+
+    def progress(self, stage, done, total):
+        if done == total:
+            self.stderr.write(f"seeded {done} {stage}")
@@ -0,0 +1,90 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from flights.bench import Recorder, dump, scratch_database
+
+PASSWORD = "bench-password"
+SESSION_ENGINES = ["db", "cached_db", "cache", "signed_cookies"]
+
+
+def _integers(value, name):
+    try:
+        return [int(part) for part in value.split(",")]
+    except ValueError:
+        raise CommandError(f"--{name} must be a comma separated list of integers.")
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure login throughput for several PBKDF2 iteration counts, the cost "
+        "of a failed-login storm with and without rate limiting, and "
+        "authenticated page throughput for each session engine."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", default="600000,100000,20000", help="PBKDF2 iteration counts to compare.")
+        parser.add_argument("--logins", type=int, default=20, help="Logins measured per iteration count.")
+        parser.add_argument("--attempts", type=int, default=50, help="Failed logins in the storm.")
+        parser.add_argument("--requests", type=int, default=300, help="Authenticated page views per session engine.")
+
+    def handle(self, *args, **options):
+        iteration_counts = _integers(options["iterations"], "iterations")
+        results = {}
+        with scratch_database(), override_settings(ALLOWED_HOSTS=["testserver"]):
+            users = User.objects.bulk_create([
+                User(username=f"bench{i}", password=make_password(PASSWORD)) for i in range(options["logins"])
+            ])
+            results["login"] = {
+                str(count): self.logins(users, count) for count in iteration_counts
+            }
+            results["failed_login_storm"] = {
+                "limited": self.storm(options["attempts"], limited=True),
+                "unlimited": self.storm(options["attempts"], limited=False),
+            }
+            results["authenticated_page"] = {
+                engine: self.pages(users[0], engine, options["requests"]) for engine in SESSION_ENGINES
+            }
+        self.stdout.write(dump(results))
+
+    def login(self, recorder, username, password=PASSWORD):
+        recorder.client = Client()
+        return recorder("post", reverse("login"), {"username": username, "password": password})
+
+    def logins(self, users, iterations):
+        with override_settings(PASSWORD_HASH_ITERATIONS=iterations):
+            # The first login rewrites each stored hash with the new count.
+            rehash = Recorder(None)
+            for user in users:
+                self.login(rehash, user.username)
+            recorder = Recorder(None)
+            for user in users:
+                self.login(recorder, user.username)
+        self.stderr.write(f"{iterations} iterations: login p50 {recorder.report()['latency']['p50_ms']}ms")
+        return {"first_login": rehash.report(), "login": recorder.report()}
+
+    def storm(self, attempts, limited):
+        cache.clear()
+        # Attackers hit hashes made with the configured count.
+        User.objects.update(password=make_password(PASSWORD))
+        limit = None if limited else (10 ** 9, 10 ** 9, 300)
+        with override_settings(**({"LOGIN_RATE_LIMIT": limit} if limit else {})):
+            recorder = Recorder(None)
+            for attempt in range(attempts):
+                self.login(recorder, f"bench{attempt % 5}", password="wrong")
+        return recorder.report()
+
+    def pages(self, user, engine, requests):
+        cache.clear()
+        with override_settings(SESSION_ENGINE=f"django.contrib.sessions.backends.{engine}"):
+            client = Client()
+            # Reloaded: the session hash must match the current password hash.
+            client.force_login(User.objects.get(pk=user.pk))
+            recorder = Recorder(client)
+            for _ in range(requests):
+                recorder("get", reverse("airports"))
+        self.stderr.write(f"{engine} sessions: p50 {recorder.report()['latency']['p50_ms']}ms")
+        return recorder.report()
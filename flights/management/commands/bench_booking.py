@@ -0,0 +1,95 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from flights.bench import Timer, dump, scratch_database
+from flights.booking import book_passengers
+from flights.models import Airport, Flight, Passenger
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure booking throughput with N concurrent clients on a scratch copy "
+        "of the configured database and check the flight is never overbooked. "
+        "Point DATABASES at PostgreSQL to compare it with SQLite."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", default="1,4,16", help="Comma separated client counts to run.")
+        parser.add_argument("--bookings", type=int, default=2000, help="Booking attempts per run.")
+        parser.add_argument("--capacity", type=int, default=1500, help="Seats on the benchmark flight.")
+
+    def handle(self, *args, **options):
+        try:
+            client_counts = [int(value) for value in options["clients"].split(",")]
+        except ValueError:
+            raise CommandError("--clients must be a comma separated list of integers.")
+
+        with scratch_database():
+            waw = Airport.objects.create(code="WAW", city="Warsaw")
+            jfk = Airport.objects.create(code="JFK", city="NewYork")
+            passengers = Passenger.objects.bulk_create(
+                [Passenger(first="Bench", last=f"Client{i}") for i in range(options["bookings"])]
+            )
+            passenger_ids = [passenger.pk for passenger in passengers]
+
+            results = {"vendor": connection.vendor, "runs": []}
+            for clients in client_counts:
+                flight = Flight.objects.create(
+                    origin=waw, destination=jfk, duration=600, capacity=options["capacity"],
+                )
+                results["runs"].append(self.run(flight, passenger_ids, clients))
+
+        self.stdout.write(dump(results))
+
+    def run(self, flight, passenger_ids, clients):
+        timer = Timer()
+        outcome = {"booked": 0, "full": 0, "retries": 0}
+        lock = threading.Lock()
+
+        def client(ids):
+            try:
+                for pk in ids:
+                    while True:
+                        try:
+                            with timer.measure():
+                                result = book_passengers(flight, [pk])
+                            break
+                        except OperationalError:
+                            with lock:
+                                outcome["retries"] += 1
+                    with lock:
+                        outcome["booked"] += len(result.changed)
+                        outcome["full"] += len(result.full)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=client, args=(passenger_ids[offset::clients],))
+            for offset in range(clients)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        flight.refresh_from_db()
+        rows = flight.passengers.count()
+        if rows != flight.seats_booked or rows > flight.capacity:
+            raise CommandError(
+                f"Flight {flight.pk} is inconsistent: {rows} bookings, "
+                f"{flight.seats_booked} counted, capacity {flight.capacity}."
+            )
+
+        return {
+            "clients": clients,
+            "capacity": flight.capacity,
+            "seats_booked": flight.seats_booked,
+            "elapsed_s": round(elapsed, 3),
+            **outcome,
+            "latency": timer.summary(elapsed),
+        }
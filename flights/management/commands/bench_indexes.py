@@ -0,0 +1,134 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+from django.db.models.functions import Lower
+
+from flights.bench import dump, scratch_database
+from flights.models import Airport, Flight, Passenger
+from flights.synthetic import LAST_NAMES, seed
+
+
+def _baseline_fields():
+    # The column definitions from before the lookup indexes were added.
+    code = models.CharField(max_length=3)
+    code.set_attributes_from_name("code")
+    code.model = Airport
+    origin = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name="+")
+    origin.set_attributes_from_name("origin")
+    origin.model = Flight
+    return [
+        (Airport, Airport._meta.get_field("code"), code),
+        (Flight, Flight._meta.get_field("origin"), origin),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database with synthetic data and compare the query plans "
+        "and timings of the hot lookups without and with the lookup indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--airports", type=int, default=1000)
+        parser.add_argument("--flights", type=int, default=200000)
+        parser.add_argument("--passengers", type=int, default=200000)
+        parser.add_argument("--bookings", type=int, default=200000)
+        parser.add_argument("--repeat", type=int, default=20, help="Runs per lookup; the median is reported.")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            seed(
+                airports=options["airports"], flights=options["flights"],
+                passengers=options["passengers"], bookings=options["bookings"],
+                progress=self.progress,
+            )
+            with connection.cursor() as cursor:
+                if connection.vendor == "sqlite":
+                    cursor.execute("ANALYZE")
+
+            lookups = self.lookups()
+            self.drop_indexes()
+            before = self.measure(lookups, options["repeat"])
+            self.restore_indexes()
+            after = self.measure(lookups, options["repeat"])
+
+        self.stdout.write(dump({
+            "vendor": connection.vendor,
+            "lookups": {
+                name: {"before": before[name], "after": after[name]} for name in lookups
+            },
+        }))
+
+    def progress(self, stage, done, total):
+        if done == total:
+            self.stderr.write(f"seeded {done} {stage}")
+
+    def lookups(self):
+        rng = random.Random(1)
+        airport = Airport.objects.order_by("?").values_list("id", "code").first()
+        flight = Flight.objects.order_by("?").values_list("origin_id", "destination_id").first()
+        last = rng.choice(LAST_NAMES)
+        prefix = last[:3].lower()
+        return {
+            "airport by code": lambda: list(Airport.objects.filter(code=airport[1])),
+            "flights on route": lambda: list(Flight.objects.filter(origin_id=flight[0], destination_id=flight[1])),
+            "departures board": lambda: list(Flight.objects.filter(origin_id=airport[0]).order_by("id")[:50]),
+            "passenger by name": lambda: list(Passenger.objects.filter(last=last, first="Anna")[:50]),
+            "passenger name prefix": lambda: list(
+                Passenger.objects.alias(last_lower=Lower("last"))
+                .filter(last_lower__gte=prefix, last_lower__lt=prefix + "\uffff")
+                .order_by("last_lower")[:20]
+            ),
+        }
+
+    def drop_indexes(self):
+        # Altering a field rebuilds the whole table on SQLite, recreating the
+        # Meta indexes, so the fields go first and the indexes after.
+        with connection.schema_editor() as editor:
+            for model, current, baseline in _baseline_fields():
+                editor.alter_field(model, current, baseline)
+        with connection.schema_editor() as editor:
+            for model in (Flight, Passenger):
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+
+    def restore_indexes(self):
+        with connection.schema_editor() as editor:
+            for model, current, baseline in _baseline_fields():
+                editor.alter_field(model, baseline, current)
+        with connection.schema_editor() as editor, connection.cursor() as cursor:
+            for model in (Flight, Passenger):
+                existing = connection.introspection.get_constraints(cursor, model._meta.db_table)
+                for index in model._meta.indexes:
+                    if index.name not in existing:
+                        editor.add_index(model, index)
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    def measure(self, lookups, repeat):
+        results = {}
+        for name, lookup in lookups.items():
+            with connection.execute_wrapper(self.capture):
+                self.captured = []
+                lookup()
+            sql, params = self.captured[0]
+            with connection.cursor() as cursor:
+                prefix = connection.ops.explain_query_prefix()
+                cursor.execute(f"{prefix} {sql}", params)
+                plan = [" ".join(str(part) for part in row) for row in cursor.fetchall()]
+
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                lookup()
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            results[name] = {"plan": plan, "median_ms": round(timings[len(timings) // 2] * 1000, 3)}
+        return results
+
+    def capture(self, execute, sql, params, many, context):
+        self.captured.append((sql, params))
+        return execute(sql, params, many, context)
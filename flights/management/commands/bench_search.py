@@ -0,0 +1,117 @@
+import itertools
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from flights.bench import dump, scratch_database
+from flights.models import Airport, Passenger, SearchTerm
+from flights.search import find, rebuild_terms
+from flights.synthetic import seed
+
+BATCH_SIZE = 10000
+SYLLABLES = ["ko", "wal", "ski", "no", "wak", "mar", "tin", "ez", "sil", "va", "ber", "gen", "ro", "ssi", "lu", "ka", "dem", "ir"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Grow a passenger table with a realistic spread of names in a scratch "
+        "database and time searches at each size: exact, prefix and "
+        "misspelled surnames, full names, airport cities, and a LIKE scan for "
+        "comparison. Searches go through the term vocabulary and the name "
+        "indexes, so their time should not grow with the table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma separated passenger counts.")
+        parser.add_argument("--names", type=int, default=20000, help="Distinct surnames.")
+        parser.add_argument("--repeat", type=int, default=50, help="Runs per search; the median is reported.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(value) for value in options["sizes"].split(","))
+        except ValueError:
+            raise CommandError("--sizes must be a comma separated list of integers.")
+
+        # Surnames of three or four syllables, used with Zipf-like
+        # frequencies: a few very common names and a long tail.
+        combinations = itertools.chain(
+            itertools.product(SYLLABLES, repeat=3), itertools.product(SYLLABLES, repeat=4),
+        )
+        self.surnames = ["".join(parts).capitalize() for parts in itertools.islice(combinations, options["names"])]
+        self.weights = [1 / rank for rank in range(1, len(self.surnames) + 1)]
+        self.first_names = [name.capitalize() for name in SYLLABLES[:12]]
+
+        results = {}
+        with scratch_database():
+            seed(airports=1000, flights=0, passengers=0, bookings=0)
+            rng = random.Random(0)
+            total = 0
+            for size in sizes:
+                total = self.grow(rng, total, size)
+                rebuild_terms()
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+                results[size] = self.measure(self.searches(), options["repeat"])
+                self.stderr.write(f"{size} passengers: " + ", ".join(
+                    f"{name} {result['median_ms']}ms" for name, result in results[size].items()
+                ))
+            terms = SearchTerm.objects.count()
+
+        self.stdout.write(dump({"vendor": connection.vendor, "terms": terms, "sizes": results}))
+
+    def grow(self, rng, total, size):
+        while total < size:
+            count = min(BATCH_SIZE, size - total)
+            lasts = rng.choices(self.surnames, self.weights, k=count)
+            with transaction.atomic():
+                Passenger.objects.bulk_create(
+                    [Passenger(first=rng.choice(self.first_names), last=last) for last in lasts]
+                )
+            total += count
+        return total
+
+    def searches(self):
+        common, rare = self.surnames[0], self.surnames[len(self.surnames) // 2]
+        # Two letters swapped in the middle of the name.
+        middle = len(rare) // 2
+        typo = rare[:middle - 1] + rare[middle] + rare[middle - 1] + rare[middle + 1:]
+        city = Airport.objects.order_by("id").values_list("city", flat=True)[500]
+        return {
+            "exact surname": lambda: find(common),
+            "rare surname": lambda: find(rare),
+            "surname prefix": lambda: find(rare[:5]),
+            "misspelled surname": lambda: find(typo),
+            "full name": lambda: find(f"{self.first_names[0]} {rare}"),
+            "misspelled full name": lambda: find(f"{self.first_names[0]} {typo}"),
+            "misspelled city": lambda: find(city[:2] + city[3:], passengers=False),
+            "no match": lambda: find("qqqqqq xxxxxx"),
+            "like scan": lambda: list(Passenger.objects.filter(last__icontains=typo[1:5])[:10]),
+        }
+
+    def measure(self, searches, repeat):
+        results = {}
+        for name, search in searches.items():
+            with connection.execute_wrapper(self.capture):
+                self.captured = []
+                found = search()
+            if isinstance(found, dict):
+                found = [row for rows in found.values() for row in rows]
+
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                search()
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            results[name] = {
+                "queries": len(self.captured),
+                "results": len(found),
+                "median_ms": round(timings[len(timings) // 2] * 1000, 3),
+            }
+        return results
+
+    def capture(self, execute, sql, params, many, context):
+        self.captured.append(sql)
+        return execute(sql, params, many, context)
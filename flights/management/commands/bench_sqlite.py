@@ -0,0 +1,109 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test import override_settings
+
+from flights.bench import Timer, dump, scratch_database
+from flights.booking import book_passengers, unbook_passengers
+from flights.models import Airport, Flight, Passenger
+from flights.synthetic import seed
+
+# Django's defaults: rollback journal, full sync, the sqlite3 module's
+# five second busy timeout.
+PROFILES = {
+    "default": {"journal_mode": "delete", "synchronous": "full"},
+    "tuned": settings.SQLITE_PRAGMAS,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare SQLite throughput under concurrent readers and writers with "
+        "Django's default connection settings and with SQLITE_PRAGMAS (WAL, "
+        "relaxed sync, busy timeout, mmap). Each profile gets its own scratch "
+        "database file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", default="1,8,32", help="Comma separated thread counts to run.")
+        parser.add_argument("--duration", type=float, default=5.0, help="Seconds per run.")
+        parser.add_argument("--writes", type=float, default=0.2, help="Share of operations that write.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("bench_sqlite needs the SQLite database profile.")
+        try:
+            client_counts = [int(value) for value in options["clients"].split(",")]
+        except ValueError:
+            raise CommandError("--clients must be a comma separated list of integers.")
+
+        results = {}
+        for name, pragmas in PROFILES.items():
+            with override_settings(SQLITE_PRAGMAS=pragmas), scratch_database():
+                seed(airports=100, flights=2000, passengers=5000, bookings=10000)
+                with connection.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    journal = cursor.fetchone()[0]
+                results[name] = {
+                    "journal_mode": journal,
+                    "runs": [self.run(clients, options["duration"], options["writes"]) for clients in client_counts],
+                }
+                self.stderr.write(f"{name}: " + ", ".join(
+                    f"{run['clients']} clients {run['per_second']} ops/s" for run in results[name]["runs"]
+                ))
+
+        self.stdout.write(dump(results))
+
+    def run(self, clients, duration, write_share):
+        flights = list(Flight.objects.values_list("id", flat=True))
+        passengers = list(Passenger.objects.values_list("id", flat=True))
+        airports = list(Airport.objects.values_list("id", flat=True))
+        reads, writes = Timer(), Timer()
+        errors = {"locked": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def client(number):
+            rng = random.Random(number)
+            try:
+                while time.perf_counter() < deadline:
+                    try:
+                        if rng.random() >= write_share:
+                            with reads.measure():
+                                flight = Flight.objects.select_related("origin", "destination").get(pk=rng.choice(flights))
+                                list(flight.passengers.all())
+                        elif rng.random() < 0.8:
+                            flight = Flight(pk=rng.choice(flights))
+                            passenger = rng.choice(passengers)
+                            with writes.measure():
+                                book_passengers(flight, [passenger])
+                                unbook_passengers(flight, [passenger])
+                        else:
+                            origin, destination = rng.sample(airports, 2)
+                            with writes.measure():
+                                Flight.objects.create(origin_id=origin, destination_id=destination, duration=300)
+                    except OperationalError:
+                        with lock:
+                            errors["locked"] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        return {
+            "clients": clients,
+            "per_second": round((len(reads.samples) + len(writes.samples)) / elapsed, 1),
+            "reads": reads.summary(elapsed),
+            "writes": writes.summary(elapsed),
+            "errors": errors,
+        }
@@ -0,0 +1,126 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from flights.bench import dump, scratch_database
+from flights.models import Airport, Flight, arrival_time
+from flights.pagination import CursorPaginator, encode_cursor
+from flights.synthetic import seed
+
+DAYS = 90
+BATCH_SIZE = 10000
+PAGE = 50
+
+
+class Command(BaseCommand):
+    help = (
+        "Grow a timetable in a scratch database step by step and time the "
+        "date-window lookups at each size: departures and arrivals of one "
+        "airport in a six hour window, keyset pages on (departure, id), and "
+        "an OFFSET page for comparison. Index range scans should stay flat "
+        "as the table grows; the OFFSET page should not."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma separated flight counts.")
+        parser.add_argument("--airports", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=50, help="Runs per lookup; the median is reported.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(value) for value in options["sizes"].split(","))
+        except ValueError:
+            raise CommandError("--sizes must be a comma separated list of integers.")
+
+        results = {}
+        with scratch_database():
+            seed(airports=options["airports"], flights=0, passengers=0, bookings=0)
+            self.airports = list(Airport.objects.values_list("id", flat=True))
+            self.start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            rng = random.Random(0)
+            total = 0
+            for size in sizes:
+                total = self.grow(rng, total, size)
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+                results[size] = self.measure(self.lookups(random.Random(size)), options["repeat"])
+                self.stderr.write(f"{size} flights: " + ", ".join(
+                    f"{name} {result['median_ms']}ms" for name, result in results[size].items()
+                ))
+
+        self.stdout.write(dump({"vendor": connection.vendor, "sizes": results}))
+
+    def grow(self, rng, total, size):
+        while total < size:
+            batch = []
+            for _ in range(min(BATCH_SIZE, size - total)):
+                origin, destination = rng.sample(self.airports, 2)
+                duration = rng.randint(30, 900)
+                departure = self.start + timedelta(minutes=5 * rng.randrange(DAYS * 24 * 12))
+                batch.append(Flight(
+                    origin_id=origin, destination_id=destination, duration=duration,
+                    departure=departure, arrival=arrival_time(departure, duration),
+                ))
+            with transaction.atomic():
+                Flight.objects.bulk_create(batch)
+            total += len(batch)
+        return total
+
+    def lookups(self, rng):
+        airport = rng.choice(self.airports)
+        window_start = self.start + timedelta(hours=rng.randrange(DAYS * 24))
+        window_end = window_start + timedelta(hours=6)
+        departures = Flight.objects.filter(origin_id=airport)
+        # Cursors from the middle of the timetable and of the airport's
+        # departures, computed before anything is timed.
+        offset = Flight.objects.count() // 2
+        middle = Flight.objects.order_by("departure", "id").values_list("departure", "id")[offset]
+        first = departures.filter(departure__gte=window_start).order_by("departure", "id")
+        airport_cursor = encode_cursor(first.values_list("departure", "id").first() or middle)
+        cursor = encode_cursor(middle)
+        return {
+            "departures in window": lambda: list(
+                departures.filter(departure__gte=window_start, departure__lt=window_end).order_by("departure", "id")
+            ),
+            "arrivals in window": lambda: list(
+                Flight.objects.filter(destination_id=airport, arrival__gte=window_start, arrival__lt=window_end)
+                .order_by("arrival", "id")
+            ),
+            "airport keyset page": lambda: list(
+                CursorPaginator(departures, PAGE, ("departure", "id")).page(after=airport_cursor)
+            ),
+            "timetable keyset page": lambda: list(
+                CursorPaginator(Flight.objects.all(), PAGE, ("departure", "id")).page(after=cursor)
+            ),
+            "timetable offset page": lambda: list(
+                Flight.objects.order_by("departure", "id")[offset:offset + PAGE]
+            ),
+        }
+
+    def measure(self, lookups, repeat):
+        results = {}
+        for name, lookup in lookups.items():
+            with connection.execute_wrapper(self.capture):
+                self.captured = []
+                lookup()
+            sql, params = self.captured[-1]
+            with connection.cursor() as cursor:
+                cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+                plan = [" ".join(str(part) for part in row) for row in cursor.fetchall()]
+
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                lookup()
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            results[name] = {"plan": plan, "median_ms": round(timings[len(timings) // 2] * 1000, 3)}
+        return results
+
+    def capture(self, execute, sql, params, many, context):
+        self.captured.append((sql, params))
+        return execute(sql, params, many, context)
@@ -0,0 +1,46 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flights.transfer import DATASETS, write_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream airports, flights, passengers or bookings to CSV or NDJSON. Rows "
+        "are read with a chunked iterator so memory use stays flat; the output "
+        "can be loaded back with import_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("path", nargs="?", default="-", help="Output file, or - for standard output.")
+        parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension.")
+        parser.add_argument("--fields", help="Comma separated subset of columns.")
+
+    def handle(self, *args, **options):
+        dataset = DATASETS[options["dataset"]]
+        path = options["path"]
+        fmt = options["format"] or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+
+        fieldnames = dataset.fieldnames
+        if options["fields"]:
+            fieldnames = [name.strip() for name in options["fields"].split(",") if name.strip()]
+            unknown = set(fieldnames) - set(dataset.fieldnames)
+            if unknown:
+                raise CommandError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+
+        stream = sys.stdout if path == "-" else open(path, "w", newline="", encoding="utf-8")
+        start = time.perf_counter()
+        count = 0
+        try:
+            for count in write_rows(stream, fmt, fieldnames, dataset.rows(fieldnames)):
+                if count % 100000 == 0:
+                    self.stderr.write(f"{options['dataset']}: {count} rows written")
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        elapsed = time.perf_counter() - start
+        self.stderr.write(f"{options['dataset']}: {count} rows in {elapsed:.1f}s")
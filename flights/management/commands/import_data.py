@@ -0,0 +1,126 @@
+import os
+import sys
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DatabaseError, connection, transaction
+
+from flights.analytics import refresh_stats
+from flights.boards import invalidate_boards
+from flights.fragments import DEPENDENCIES, invalidate_fragments
+from flights.routing import route_index
+from flights.search import rebuild_terms
+from flights.transfer import DATASETS, RowError, batches, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk load airports, flights, passengers or bookings from CSV or NDJSON. "
+        "Flights and passengers are written with executemany INSERT/UPDATE "
+        "statements, airports and bookings with bulk_create/bulk_update, "
+        "--batch-size rows per statement, and committed in transaction batches; "
+        "after each commit the number of consumed rows is saved to a checkpoint "
+        "file so that --resume can continue after a failure."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("path", help="Input file, or - for standard input.")
+        parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per INSERT/UPDATE statement.")
+        parser.add_argument("--commit-every", type=int, default=20000, help="Rows per transaction.")
+        parser.add_argument("--checkpoint", help="Checkpoint file (default: <path>.checkpoint).")
+        parser.add_argument("--resume", action="store_true", help="Skip the rows recorded in the checkpoint.")
+
+    def handle(self, *args, **options):
+        if isinstance(caches["default"], LocMemCache):
+            self.stderr.write(
+                "The default cache is local to this process: web processes will keep serving their cached "
+                "boards, lists and routes. Share one cache (DJANGO_CACHE_DIR) between them."
+            )
+        path = options["path"]
+        fmt = options["format"] or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+        checkpoint = options["checkpoint"] or (None if path == "-" else f"{path}.checkpoint")
+
+        skip = 0
+        if options["resume"]:
+            if not checkpoint or not os.path.exists(checkpoint):
+                raise CommandError("Nothing to resume: no checkpoint file found.")
+            with open(checkpoint) as handle:
+                skip = int(handle.read().strip() or 0)
+
+        importer = DATASETS[options["dataset"]].importer(options["batch_size"])
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        totals = {"created": 0, "updated": 0, "skipped": 0, "errors": 0}
+        consumed = skip
+        start = time.perf_counter()
+
+        try:
+            rows = read_rows(stream, fmt)
+            for _ in range(skip):
+                next(rows, None)
+
+            for batch in batches(rows, options["commit_every"]):
+                items, lines = [], []
+                for line, row in batch:
+                    try:
+                        if isinstance(row, RowError):
+                            raise row
+                        items.append(importer.parse(row))
+                        lines.append(line)
+                    except RowError as exc:
+                        totals["errors"] += 1
+                        self.stderr.write(f"line {line}: {exc}")
+
+                importer.rejected = []
+                try:
+                    with transaction.atomic():
+                        created, updated, skipped = importer.save(items) if items else (0, 0, 0)
+                except DatabaseError as exc:
+                    raise CommandError(
+                        f"Batch starting at line {batch[0][0]} failed: {exc}. "
+                        f"{consumed} rows were committed; fix the input and rerun with --resume."
+                    )
+                for index, exc in importer.rejected:
+                    totals["errors"] += 1
+                    self.stderr.write(f"line {lines[index]}: {exc}")
+
+                consumed += len(batch)
+                totals["created"] += created
+                totals["updated"] += updated
+                totals["skipped"] += skipped
+                if checkpoint:
+                    with open(checkpoint, "w") as handle:
+                        handle.write(str(consumed))
+
+                elapsed = time.perf_counter() - start
+                self.stderr.write(
+                    f"{options['dataset']}: {consumed} rows read, {totals['created']} created, "
+                    f"{totals['updated']} updated ({(consumed - skip) / elapsed:.0f} rows/s)"
+                )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            self.after_import(importer)
+
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(", ".join(f"{count} {name}" for name, count in totals.items()))
+
+    def after_import(self, importer):
+        # Bulk writes bypass model signals: reset what they would maintain.
+        # These only reach the web processes through the shared cache: the
+        # route index version and the board and list versions live there.
+        route_index.reset()
+        invalidate_boards(importer.touched_airports)
+        invalidate_fragments(DEPENDENCIES)
+        refresh_stats()
+        if importer.searchable:
+            rebuild_terms()
+        if importer.model is not None:
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [importer.model]):
+                    cursor.execute(sql)
@@ -0,0 +1,96 @@
+import http.client
+import itertools
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flights.bench import Timer, dump
+
+
+def _target(value):
+    name, _, url = value.rpartition("=")
+    url = urlsplit(url)
+    if url.scheme not in ("http", "https") or not url.hostname:
+        raise CommandError(f"Not an http(s) URL: {value}")
+    return name or value, url
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test one or more running servers and report requests per second "
+        "and latency percentiles for each. To compare the WSGI and ASGI entry "
+        "points on one box, start both with the same number of workers, e.g. "
+        "`gunicorn tin.wsgi -w 4 -b 127.0.0.1:8000` and "
+        "`uvicorn tin.asgi:application --workers 4 --port 8001`, then run "
+        "`loadtest wsgi=http://127.0.0.1:8000/flights/ asgi=http://127.0.0.1:8001/flights/async/`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("targets", nargs="+", metavar="[name=]url")
+        parser.add_argument("--concurrency", type=int, default=64, help="Concurrent keep-alive connections.")
+        parser.add_argument("--requests", type=int, default=5000, help="Requests per target.")
+        parser.add_argument("--warmup", type=int, default=100, help="Unmeasured requests sent first.")
+        parser.add_argument("--cookie", default="", help="Cookie header, e.g. a sessionid for login-only pages.")
+
+    def handle(self, *args, **options):
+        targets = [_target(value) for value in options["targets"]]
+        results = {}
+        for name, url in targets:
+            self.run(url, options["warmup"], options["concurrency"], options)
+            results[name] = self.run(url, options["requests"], options["concurrency"], options)
+            self.stderr.write(f"{name}: {results[name]['latency'].get('per_second')} req/s")
+
+        self.stdout.write(dump({
+            "concurrency": options["concurrency"],
+            "requests": options["requests"],
+            "targets": results,
+        }))
+
+    def run(self, url, total, concurrency, options):
+        timer = Timer()
+        statuses = Counter()
+        errors = Counter()
+        tickets = itertools.count()
+        lock = threading.Lock()
+        path = url.path or "/"
+        if url.query:
+            path += f"?{url.query}"
+        headers = {"Cookie": options["cookie"]} if options["cookie"] else {}
+        connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+
+        def client():
+            connection = connection_class(url.hostname, url.port, timeout=30)
+            # itertools.count is atomic under the GIL, so workers can share it.
+            while next(tickets) < total:
+                started = time.perf_counter()
+                try:
+                    connection.request("GET", path, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException) as exc:
+                    connection.close()
+                    with lock:
+                        errors[type(exc).__name__] += 1
+                    continue
+                duration = time.perf_counter() - started
+                with lock:
+                    timer.samples.append(duration)
+                    statuses[response.status] += 1
+            connection.close()
+
+        workers = [threading.Thread(target=client) for _ in range(min(concurrency, max(total, 1)))]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        return {
+            "latency": timer.summary(elapsed),
+            "statuses": {str(status): count for status, count in sorted(statuses.items())},
+            "errors": dict(errors),
+        }
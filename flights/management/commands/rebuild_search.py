@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from flights.search import BATCH_SIZE, rebuild_terms
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the search vocabulary (and through it the full-text index) "
+        "from airports and passengers. Saves and deletes keep it up to date "
+        "as they happen; run this after raw SQL or other out-of-band changes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        terms = rebuild_terms(batch_size=options["batch_size"])
+        self.stdout.write(f"Indexed {terms} search terms in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from flights.boards import invalidate_boards
+from flights.counters import BATCH_SIZE, recount
+from flights.fragments import DEPENDENCIES, invalidate_fragments
+from flights.models import Airport, Flight, Passenger
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild Flight.seats_booked and Passenger.flight_count from the "
+        "bookings table in primary key batches, writing only the rows that "
+        "drifted. Bookings and unbookings keep both counters up to date as "
+        "they happen; run this after raw SQL or other out-of-band changes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        fixed = {model: recount(model, batch_size=options["batch_size"]) for model in (Flight, Passenger)}
+        if any(fixed.values()):
+            invalidate_boards(Airport.objects.values_list("id", flat=True))
+            invalidate_fragments(DEPENDENCIES)
+        self.stdout.write(
+            f"Corrected {fixed[Flight]} flights and {fixed[Passenger]} passengers "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from flights.analytics import refresh_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the RouteStats and AirportStats summary tables from flights. "
+        "Flight changes refresh their own rows as they happen; run this on a "
+        "schedule (e.g. every few minutes from cron) to bring passenger totals "
+        "up to date with bookings."
+    )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = refresh_stats()
+        self.stdout.write(
+            f"{counts['routes']} routes, {counts['airports']} airports in {time.perf_counter() - start:.2f}s"
+        )
@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from flights.jobs import claim, requeue_stale, run
+from flights.models import Job
+
+# Seconds between looks for jobs abandoned by dead workers.
+REQUEUE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs with a pool of worker threads. Jobs are "
+        "claimed with a conditional UPDATE, so several run_jobs processes can "
+        "share the queue for process-level parallelism."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Worker threads.")
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Exit once no job is due instead of polling.")
+
+    def handle(self, *args, **options):
+        if isinstance(caches["default"], LocMemCache):
+            self.stderr.write(
+                "The default cache is local to this process: web processes will not see the board, "
+                "list and route invalidations of jobs. Share one cache (DJANGO_CACHE_DIR) between them."
+            )
+        stop = threading.Event()
+        lock = threading.Lock()
+        next_requeue = [0.0]
+
+        def requeue():
+            with lock:
+                if time.monotonic() < next_requeue[0]:
+                    return
+                next_requeue[0] = time.monotonic() + REQUEUE_INTERVAL
+                requeued = requeue_stale()
+                if requeued:
+                    self.stderr.write(f"Requeued {requeued} stale jobs.")
+
+        def work():
+            try:
+                while not stop.is_set():
+                    try:
+                        requeue()
+                        job = claim()
+                    except OperationalError:
+                        # SQLite's write lock stayed busy; try again later.
+                        job = None
+                    if job is None:
+                        if options["once"]:
+                            return
+                        stop.wait(options["poll"])
+                        continue
+                    job = run(job)
+                    with lock:
+                        self.report(job)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = [pool.submit(work) for _ in range(options["workers"])]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                # Running jobs finish; nothing new is claimed.
+                stop.set()
+
+    def report(self, job):
+        if job.status == Job.SUCCEEDED:
+            self.stdout.write(f"{job}: {job.result}")
+        elif job.status == Job.QUEUED:
+            self.stderr.write(f"{job}: attempt {job.attempts} failed, retrying at {job.run_after:%H:%M:%S}")
+        else:
+            self.stderr.write(f"{job}: failed after {job.attempts} attempts\n{job.error}")
@@ -0,0 +1,76 @@
+import csv
+
+from .models import Passenger
+
+CHUNK_SIZE = 2000
+CSV_HEADER = ["flight", "origin", "destination", "departure", "passenger", "first", "last"]
+
+
+class _Echo:
+    # File-like object for csv.writer that hands each row back instead of
+    # buffering it.
+    def write(self, value):
+        return value
+
+
+def _bookings(flights):
+    return (
+        Passenger.flights.through.objects.filter(flight__in=flights.values("id"))
+        .order_by("flight_id", "passenger__last", "passenger__first", "passenger_id")
+        .values_list("flight_id", "passenger_id", "passenger__first", "passenger__last")
+    )
+
+
+def _manifests(flights):
+    """
+    Yield ``(flight, bookings)`` for every flight, where bookings is an
+    iterator over that flight's ``(passenger_id, first, last)`` rows. Both
+    queries are read in chunks, ordered by flight, and merged as they go,
+    so memory use does not depend on the number of flights or passengers.
+    Bookings of flights missing from the second query, deleted in between,
+    are skipped.
+    """
+    flights = flights.select_related("origin", "destination").order_by("id")
+    bookings = _bookings(flights).iterator(chunk_size=CHUNK_SIZE)
+    pending = next(bookings, None)
+
+    for flight in flights.iterator(chunk_size=CHUNK_SIZE):
+        while pending is not None and pending[0] < flight.id:
+            pending = next(bookings, None)
+
+        def rows():
+            nonlocal pending
+            while pending is not None and pending[0] == flight.id:
+                yield pending[1:]
+                pending = next(bookings, None)
+        yield flight, rows()
+
+
+def csv_manifest(flights):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for flight, rows in _manifests(flights):
+        for passenger_id, first, last in rows:
+            yield writer.writerow([
+                flight.id, flight.origin.code, flight.destination.code, flight.departure.isoformat(),
+                passenger_id, first, last,
+            ])
+
+
+def text_manifest(flights):
+    for flight, rows in _manifests(flights):
+        yield (
+            f"Flight {flight.id}: {flight.origin} to {flight.destination}, "
+            f"departs {flight.departure:%Y-%m-%d %H:%M}, "
+            f"{flight.duration} min, {flight.seats_booked}/{flight.capacity} seats\n"
+        )
+        count = 0
+        for count, (passenger_id, first, last) in enumerate(rows, start=1):
+            yield f"{count:>6}. {last}, {first} ({passenger_id})\n"
+        yield f"Total: {count} passengers\n\n"
+
+
+FORMATS = {
+    "csv": (csv_manifest, "text/csv"),
+    "txt": (text_manifest, "text/plain; charset=utf-8"),
+}
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:01
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='passenger',
+            index=models.Index(django.db.models.functions.text.Lower('last'), django.db.models.functions.text.Lower('first'), name='passenger_last_first_lower'),
+        ),
+        migrations.AddIndex(
+            model_name='passenger',
+            index=models.Index(django.db.models.functions.text.Lower('first'), name='passenger_first_lower'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:02
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_booked_seats(apps, schema_editor):
+    # Two set-based UPDATEs: the counts, then room for flights already
+    # booked beyond the default capacity.
+    Flight = apps.get_model("flights", "Flight")
+    through = apps.get_model("flights", "Passenger").flights.through
+    booked = through.objects.filter(flight_id=OuterRef("pk")).order_by().values("flight_id").annotate(total=Count("id"))
+    Flight.objects.update(seats_booked=Coalesce(Subquery(booked.values("total")), 0))
+    Flight.objects.filter(capacity__lt=F("seats_booked")).update(capacity=F("seats_booked"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0002_passenger_name_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='capacity',
+            field=models.PositiveIntegerField(default=180),
+        ),
+        migrations.AddField(
+            model_name='flight',
+            name='seats_booked',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_booked_seats, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='flight',
+            constraint=models.CheckConstraint(check=models.Q(('seats_booked__lte', models.F('capacity'))), name='flight_not_overbooked'),
+        ),
+    ]
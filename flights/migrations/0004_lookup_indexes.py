@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:07
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+import django.db.models.deletion
+
+
+def merge_duplicate_codes(apps, schema_editor):
+    # Airports sharing a code are merged into the oldest of them, flights
+    # included, so that the unique constraint below can be added.
+    Airport = apps.get_model("flights", "Airport")
+    Flight = apps.get_model("flights", "Flight")
+    duplicates = Airport.objects.values("code").annotate(total=Count("id"), keep=Min("id")).filter(total__gt=1)
+    for row in duplicates:
+        others = Airport.objects.filter(code=row["code"]).exclude(pk=row["keep"])
+        Flight.objects.filter(origin__in=others).update(origin_id=row["keep"])
+        Flight.objects.filter(destination__in=others).update(destination_id=row["keep"])
+        others.delete()
+    if schema_editor.connection.vendor == "postgresql":
+        # Deferred foreign key checks would otherwise block the ALTER TABLE.
+        schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0003_flight_capacity'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='airport',
+            name='code',
+            field=models.CharField(max_length=3, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['origin', 'destination'], name='flight_route'),
+        ),
+        migrations.AlterField(
+            model_name='flight',
+            name='origin',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='departures', to='flights.airport'),
+        ),
+        migrations.AddIndex(
+            model_name='passenger',
+            index=models.Index(fields=['last', 'first'], name='passenger_name'),
+        ),
+    ]
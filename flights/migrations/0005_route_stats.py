@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0004_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AirportStats',
+            fields=[
+                ('airport', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='flights.airport')),
+                ('departures', models.PositiveIntegerField()),
+                ('arrivals', models.PositiveIntegerField()),
+                ('passengers_departing', models.PositiveIntegerField()),
+                ('passengers_arriving', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RouteStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('flights', models.PositiveIntegerField()),
+                ('average_duration', models.FloatField()),
+                ('passengers', models.PositiveIntegerField()),
+                ('updated_at', models.DateTimeField()),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flights.airport')),
+                ('origin', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='flights.airport')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-passengers'], name='route_stats_passengers'), models.Index(fields=['-flights'], name='route_stats_flights')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='routestats',
+            constraint=models.UniqueConstraint(fields=('origin', 'destination'), name='route_stats_route'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:41
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def fill_arrivals(apps, schema_editor):
+    # Existing flights all get the migration time as their departure; one
+    # UPDATE per distinct duration derives the arrivals.
+    Flight = apps.get_model("flights", "Flight")
+    for duration in Flight.objects.order_by().values_list("duration", flat=True).distinct():
+        Flight.objects.filter(duration=duration).update(arrival=F("departure") + timedelta(minutes=duration))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0006_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='departure',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='flight',
+            name='arrival',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_arrivals, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='flight',
+            name='destination',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='arrivals', to='flights.airport'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['origin', 'departure', 'id'], name='flight_origin_departure'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['destination', 'arrival', 'id'], name='flight_destination_arrival'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['departure', 'id'], name='flight_departure'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_flights(apps, schema_editor):
+    Passenger = apps.get_model("flights", "Passenger")
+    through = Passenger.flights.through
+    booked = through.objects.filter(passenger_id=OuterRef("pk")).order_by().values("passenger_id").annotate(total=Count("id"))
+    Passenger.objects.update(flight_count=Coalesce(Subquery(booked.values("total")), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0007_flight_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='passenger',
+            name='flight_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_flights, migrations.RunPython.noop),
+    ]
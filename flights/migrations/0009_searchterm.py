@@ -0,0 +1,99 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:10
+
+from collections import Counter
+
+from django.db import OperationalError, migrations, models
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+# External content FTS5 table over flights_searchterm, kept in step by
+# triggers. The trigram tokenizer needs SQLite 3.34; without it search
+# falls back to prefix matching.
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE flights_searchterm_fts USING fts5("
+    "term, content='flights_searchterm', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER flights_searchterm_fts_insert AFTER INSERT ON flights_searchterm BEGIN "
+    "INSERT INTO flights_searchterm_fts(rowid, term) VALUES (new.id, new.term); END",
+    "CREATE TRIGGER flights_searchterm_fts_delete AFTER DELETE ON flights_searchterm BEGIN "
+    "INSERT INTO flights_searchterm_fts(flights_searchterm_fts, rowid, term) VALUES ('delete', old.id, old.term); END",
+    "CREATE TRIGGER flights_searchterm_fts_update AFTER UPDATE OF term ON flights_searchterm BEGIN "
+    "INSERT INTO flights_searchterm_fts(flights_searchterm_fts, rowid, term) VALUES ('delete', old.id, old.term); "
+    "INSERT INTO flights_searchterm_fts(rowid, term) VALUES (new.id, new.term); END",
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS flights_searchterm_fts_insert",
+    "DROP TRIGGER IF EXISTS flights_searchterm_fts_delete",
+    "DROP TRIGGER IF EXISTS flights_searchterm_fts_update",
+    "DROP TABLE IF EXISTS flights_searchterm_fts",
+]
+POSTGRESQL_INDEX = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX searchterm_trigram ON flights_searchterm USING gin (term gin_trgm_ops)",
+]
+POSTGRESQL_DROP = ["DROP INDEX IF EXISTS searchterm_trigram"]
+
+
+def _execute(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        try:
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(term, tokenize='trigram')")
+                cursor.execute("DROP TABLE temp.fts5_probe")
+        except OperationalError:
+            return
+        _execute(schema_editor, SQLITE_INDEX)
+    elif vendor == "postgresql":
+        _execute(schema_editor, POSTGRESQL_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        _execute(schema_editor, SQLITE_DROP)
+    elif vendor == "postgresql":
+        _execute(schema_editor, POSTGRESQL_DROP)
+
+
+def fill_terms(apps, schema_editor):
+    SearchTerm = apps.get_model("flights", "SearchTerm")
+    terms = {}
+    sources = (("Airport", "code", "airports"), ("Airport", "city", "airports"),
+               ("Passenger", "first", "first_names"), ("Passenger", "last", "last_names"))
+    for model, field, counter in sources:
+        rows = apps.get_model("flights", model).objects.order_by().values_list(Lower(field)).annotate(total=Count("pk"))
+        for term, total in rows:
+            if term:
+                counts = terms.setdefault(term, Counter())
+                counts[counter] += total
+    SearchTerm.objects.bulk_create(
+        [SearchTerm(term=term, **counts) for term, counts in terms.items()],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0008_passenger_flight_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, unique=True)),
+                ('airports', models.PositiveIntegerField(default=0)),
+                ('first_names', models.PositiveIntegerField(default=0)),
+                ('last_names', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(fill_terms, migrations.RunPython.noop),
+    ]
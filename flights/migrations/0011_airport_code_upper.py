@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:02
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+from django.db.models.functions import Upper
+
+
+def uppercase_codes(apps, schema_editor):
+    # Airports whose codes differ only in case are merged into the oldest of
+    # them, flights included, before every code is upper-cased. Summaries of
+    # merged airports go with them; refresh_stats rebuilds the survivors'.
+    Airport = apps.get_model("flights", "Airport")
+    Flight = apps.get_model("flights", "Flight")
+    duplicates = (
+        Airport.objects.annotate(upper=Upper("code")).values("upper")
+        .annotate(total=Count("id"), keep=Min("id")).filter(total__gt=1)
+    )
+    for row in duplicates:
+        others = Airport.objects.filter(code__iexact=row["upper"]).exclude(pk=row["keep"])
+        Flight.objects.filter(origin__in=others).update(origin_id=row["keep"])
+        Flight.objects.filter(destination__in=others).update(destination_id=row["keep"])
+        others.delete()
+    Airport.objects.exclude(code=Upper("code")).update(code=Upper("code"))
+    if schema_editor.connection.vendor == "postgresql":
+        # Deferred foreign key checks would otherwise block the ALTER TABLE.
+        schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flights', '0010_job_worker'),
+    ]
+
+    operations = [
+        migrations.RunPython(uppercase_codes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='airport',
+            constraint=models.CheckConstraint(check=models.Q(('code', Upper('code'))), name='airport_code_upper', violation_error_message='Airport codes must be upper case.'),
+        ),
+    ]
@@ -1,17 +1,82 @@
+from datetime import timedelta
+
 from django.db import models
+from django.db.models.functions import Lower, Upper
+from django.utils import timezone
+
+
+def arrival_time(departure, duration):
+    return departure + timedelta(minutes=duration)
+
+
+def _without_counter(instance, kwargs, counter):
+    # Regular saves of a stored row leave the booking counter alone: it is
+    # only moved with F() updates, and writing back the value loaded with
+    # the row would undo bookings made since.
+    if kwargs.get("update_fields") is None and not kwargs.get("force_insert") and not instance._state.adding:
+        kwargs["update_fields"] = [
+            field.name for field in instance._meta.concrete_fields
+            if not field.primary_key and field.name != counter
+        ]
+    return kwargs
+
 
 # Create your models here.
 class Airport(models.Model):
-    code = models.CharField(max_length=3)
+    # Upper case only, so that the unique constraint is case-insensitive.
+    code = models.CharField(max_length=3, unique=True)
     city = models.CharField(max_length=64)
 
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(code=Upper("code")), name="airport_code_upper",
+                violation_error_message="Airport codes must be upper case.",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.city} ({self.code})"
 
 class Flight(models.Model):
-    origin = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name="departures")
-    destination = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name="arrivals")
+    # Both airports lead composite indexes below instead of having their own.
+    origin = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name="departures", db_index=False)
+    destination = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name="arrivals", db_index=False)
     duration = models.IntegerField()
+    capacity = models.PositiveIntegerField(default=180)
+    seats_booked = models.PositiveIntegerField(default=0, editable=False)
+    departure = models.DateTimeField(default=timezone.now)
+    # Derived from departure and duration (minutes) in save().
+    arrival = models.DateTimeField(editable=False)
+
+    class Meta:
+        # Timetables are read in (departure, id) order, for one airport or
+        # all of them; the trailing id keeps keyset pages on the index.
+        indexes = [
+            models.Index(fields=["origin", "destination"], name="flight_route"),
+            models.Index(fields=["origin", "departure", "id"], name="flight_origin_departure"),
+            models.Index(fields=["destination", "arrival", "id"], name="flight_destination_arrival"),
+            models.Index(fields=["departure", "id"], name="flight_departure"),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(seats_booked__lte=models.F("capacity")), name="flight_not_overbooked"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.arrival = arrival_time(self.departure, self.duration)
+        kwargs = _without_counter(self, kwargs, "seats_booked")
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "arrival"}
+        super().save(*args, **kwargs)
+
+    @property
+    def seats_available(self):
+        return max(self.capacity - self.seats_booked, 0)
+
+    @property
+    def load_factor(self):
+        # Percent of seats booked, from the counter.
+        return round(100 * self.seats_booked / self.capacity) if self.capacity else 0
 
     def __str__(self):
         return f"{self.id}: {self.origin} to {self.destination}"
@@ -20,6 +85,94 @@ class Passenger(models.Model):
     first = models.CharField(max_length=64)
     last = models.CharField(max_length=64)
     flights = models.ManyToManyField(Flight, blank=True, related_name="passengers")
+    # Bookings of this passenger, maintained like Flight.seats_booked.
+    flight_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(Lower("last"), Lower("first"), name="passenger_last_first_lower"),
+            models.Index(Lower("first"), name="passenger_first_lower"),
+            models.Index(fields=["last", "first"], name="passenger_name"),
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **_without_counter(self, kwargs, "flight_count"))
+
+    def __str__(self):
+        return f"{self.first} {self.last}"
+
+# Summary tables kept up to date by flights.analytics; dashboards read
+# these instead of aggregating flights and bookings per request.
+class RouteStats(models.Model):
+    origin = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name="+", db_index=False)
+    destination = models.ForeignKey(Airport, on_delete=models.CASCADE, related_name="+")
+    flights = models.PositiveIntegerField()
+    average_duration = models.FloatField()
+    passengers = models.PositiveIntegerField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["origin", "destination"], name="route_stats_route"),
+        ]
+        indexes = [
+            models.Index(fields=["-passengers"], name="route_stats_passengers"),
+            models.Index(fields=["-flights"], name="route_stats_flights"),
+        ]
+
+    def __str__(self):
+        return f"{self.origin} to {self.destination}"
+
+class AirportStats(models.Model):
+    airport = models.OneToOneField(Airport, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    departures = models.PositiveIntegerField()
+    arrivals = models.PositiveIntegerField()
+    passengers_departing = models.PositiveIntegerField()
+    passengers_arriving = models.PositiveIntegerField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return str(self.airport)
+
+# Work queued by flights.jobs and run by the run_jobs command.
+class Job(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUSES = [(QUEUED, "Queued"), (RUNNING, "Running"), (SUCCEEDED, "Succeeded"), (FAILED, "Failed")]
+
+    task = models.CharField(max_length=64)
+    arguments = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField()
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # host:pid of the process running the job, for requeue_stale().
+    worker = models.CharField(max_length=128, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="job_pending"),
+        ]
+
+    def __str__(self):
+        return f"{self.id}: {self.task} ({self.status})"
+
+# Lower-cased airport codes, cities and passenger names with how often each
+# is used as which, maintained by flights.signals. flights.search matches
+# query words against this vocabulary (through a full-text or trigram index
+# where the database has one) and then looks rows up by exact name.
+class SearchTerm(models.Model):
+    term = models.CharField(max_length=64, unique=True)
+    airports = models.PositiveIntegerField(default=0)
+    first_names = models.PositiveIntegerField(default=0)
+    last_names = models.PositiveIntegerField(default=0)
 
     def __str__(self):
-        return f"{self.first} {self.last}"
\ No newline at end of file
+        return self.term
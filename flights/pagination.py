@@ -0,0 +1,286 @@
+import base64
+import datetime
+import json
+
+from asgiref.sync import sync_to_async
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # Full precision: DjangoJSONEncoder drops microseconds, and a truncated
+    # timestamp would repeat rows at the edge of a page.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values):
+    data = json.dumps(list(values), cls=CursorEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor(token)
+
+    # Only scalars can be compared with the ordering columns.
+    if not isinstance(values, list) or not all(
+        value is None or isinstance(value, (str, int, float)) for value in values
+    ):
+        raise InvalidCursor(token)
+
+    return values
+
+
+def approximate_count(queryset):
+    """
+    Cheap row estimate for an unfiltered table: planner statistics on
+    PostgreSQL, the highest primary key elsewhere. Returns None when the
+    queryset is filtered and no estimate can be made without counting.
+    """
+    if queryset.query.where:
+        return None
+
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE relname = %s",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return int(row[0])
+
+    return queryset.model._default_manager.using(queryset.db).aggregate(top=Max("pk"))["top"] or 0
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator for large unfiltered tables, counting with approximate_count()
+    instead of COUNT(*). Filtered querysets are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = approximate_count(self.object_list)
+        return super().count if estimate is None else estimate
+
+
+class CursorPage:
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def count(self):
+        return self.paginator.count
+
+    @property
+    def count_is_exact(self):
+        return self.paginator.exact_count
+
+
+class CursorPaginator:
+    """
+    Keyset pagination over a stable ordering. Each page is fetched with a
+    range condition on the ordering columns instead of an OFFSET, so a deep
+    page costs the same as the first one. The ordering has to end with a
+    unique column (the primary key by default) to break ties.
+    """
+
+    def __init__(self, object_list, per_page, ordering=("id",), exact_count=False):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.exact_count = exact_count
+        self._count = None
+
+    @property
+    def count(self):
+        if self._count is None:
+            if self.exact_count:
+                self._count = self.object_list.count()
+            else:
+                self._count = approximate_count(self.object_list)
+        return self._count
+
+    def _fields(self):
+        return [(name.lstrip("-"), name.startswith("-")) for name in self.ordering]
+
+    def _key(self, obj):
+        if isinstance(obj, dict):
+            return [obj[name] for name, _ in self._fields()]
+        return [getattr(obj, name) for name, _ in self._fields()]
+
+    def _coerce(self, values):
+        # A well-formed cursor can still carry values of the wrong type for
+        # its columns; convert them the way a form field would, so that they
+        # fail here instead of inside the lookup.
+        opts = self.object_list.model._meta
+        coerced = []
+        for value, (name, _) in zip(values, self._fields()):
+            field = opts.get_field(name)
+            try:
+                value = field.to_python(value)
+                if value is not None:
+                    field.run_validators(value)
+            except (TypeError, ValueError, OverflowError, ValidationError):
+                raise InvalidCursor(values)
+            coerced.append(value)
+        return coerced
+
+    def _keyset(self, values, backwards):
+        fields = self._fields()
+        if len(values) != len(fields):
+            raise InvalidCursor(values)
+        values = self._coerce(values)
+
+        condition = Q()
+        for position, (name, descending) in enumerate(fields):
+            lookup = "lt" if descending != backwards else "gt"
+            clause = Q(**{f"{name}__{lookup}": values[position]})
+            for earlier, (previous, _) in enumerate(fields[:position]):
+                clause &= Q(**{previous: values[earlier]})
+            condition |= clause
+        # The OR above alone leaves the database scanning the index up to the
+        # cursor; bounding the leading column as well turns it into a seek.
+        name, descending = fields[0]
+        lookup = "lte" if descending != backwards else "gte"
+        return Q(**{f"{name}__{lookup}": values[0]}) & condition
+
+    def _order(self, backwards):
+        if not backwards:
+            return self.ordering
+        return tuple(name[1:] if name.startswith("-") else f"-{name}" for name in self.ordering)
+
+    def _query(self, after, before):
+        backwards = before is not None and after is None
+        queryset = self.object_list.order_by(*self._order(backwards))
+
+        token = before if backwards else after
+        if token:
+            queryset = queryset.filter(self._keyset(decode_cursor(token), backwards))
+        return queryset[:self.per_page + 1], backwards, token
+
+    def _page(self, rows, backwards, token):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if (has_more and not backwards) or (token and backwards):
+                next_cursor = encode_cursor(self._key(rows[-1]))
+            if (has_more and backwards) or (token and not backwards):
+                previous_cursor = encode_cursor(self._key(rows[0]))
+
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def page(self, after=None, before=None):
+        queryset, backwards, token = self._query(after, before)
+        return self._page(list(queryset), backwards, token)
+
+    async def apage(self, after=None, before=None):
+        """
+        Async variant of page(). The count is resolved up front as well, so
+        that templates never touch the database from the event loop.
+        """
+        queryset, backwards, token = self._query(after, before)
+        page = self._page([row async for row in queryset], backwards, token)
+        if self._count is None:
+            if self.exact_count:
+                self._count = await self.object_list.acount()
+            else:
+                self._count = await sync_to_async(approximate_count)(self.object_list)
+        return page
+
+
+def paginate(request, object_list, per_page, ordering=("id",)):
+    """
+    Paginate a list view. Plain ``?page=`` requests keep using Django's
+    Paginator; passing ``?after=`` or ``?before=`` (even empty) switches to
+    keyset pagination, where ``?count=1`` asks for an exact total.
+    """
+    if "after" in request.GET or "before" in request.GET:
+        paginator = CursorPaginator(
+            object_list, per_page, ordering,
+            exact_count=request.GET.get("count") == "1",
+        )
+        try:
+            return paginator.page(after=request.GET.get("after"), before=request.GET.get("before"))
+        except (InvalidCursor, ValueError, ValidationError):
+            return paginator.page()
+
+    page = request.GET.get('page', 1)
+
+    paginator = Paginator(object_list.order_by(*ordering), per_page)
+    try:
+        return paginator.page(page)
+    except PageNotAnInteger:
+        return paginator.page(1)
+    except EmptyPage:
+        return paginator.page(paginator.num_pages)
+
+
+async def apaginate(request, object_list, per_page, ordering=("id",)):
+    """
+    Async counterpart of paginate() for views served under ASGI. The page
+    returned is fully evaluated.
+    """
+    if "after" in request.GET or "before" in request.GET:
+        paginator = CursorPaginator(
+            object_list, per_page, ordering,
+            exact_count=request.GET.get("count") == "1",
+        )
+        try:
+            return await paginator.apage(after=request.GET.get("after"), before=request.GET.get("before"))
+        except (InvalidCursor, ValueError, ValidationError):
+            return await paginator.apage()
+
+    paginator = Paginator(object_list.order_by(*ordering), per_page)
+    # Paginator.count is a cached_property; filling it in here keeps page()
+    # from issuing a synchronous COUNT.
+    paginator.count = await paginator.object_list.acount()
+    try:
+        page = paginator.page(request.GET.get('page', 1))
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+    page.object_list = [obj async for obj in page.object_list]
+    return page
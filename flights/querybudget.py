@@ -0,0 +1,82 @@
+import functools
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    """Execute wrapper counting the queries that pass through it and their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.duration += elapsed
+                self.count += 1
+
+    def install(self, stack):
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+
+def query_budget(limit):
+    """
+    Declare how many SQL queries a view may run, template rendering
+    included. Going over the budget is logged, or raises
+    QueryBudgetExceeded when settings.QUERY_BUDGET_STRICT is on (tests).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with ExitStack() as stack:
+                counter = QueryCounter().install(stack)
+                response = view(request, *args, **kwargs)
+
+            if counter.count > limit:
+                message = (
+                    f"{view.__module__}.{view.__name__} ran {counter.count} queries "
+                    f"(budget {limit}) for {request.path}"
+                )
+                if getattr(settings, "QUERY_BUDGET_STRICT", False):
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+
+            return response
+
+        wrapper.query_budget = limit
+        return wrapper
+
+    return decorator
+
+
+class StrictQueryBudgetRunner(DiscoverRunner):
+    """Test runner turning QUERY_BUDGET_STRICT on for the whole suite."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.saved_query_budget_strict = settings.QUERY_BUDGET_STRICT
+        settings.QUERY_BUDGET_STRICT = True
+
+    def teardown_test_environment(self, **kwargs):
+        settings.QUERY_BUDGET_STRICT = self.saved_query_budget_strict
+        super().teardown_test_environment(**kwargs)
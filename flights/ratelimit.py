@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _client_ip(request):
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def _keys(request, username):
+    ip = _client_ip(request)
+    limit, per_ip_limit, window = settings.LOGIN_RATE_LIMIT
+    return [
+        (f"flights:login:user:{ip}:{username.lower()}", limit, window),
+        (f"flights:login:ip:{ip}", per_ip_limit, window),
+    ]
+
+
+def login_blocked(request, username):
+    """
+    Whether failed logins for this username from this address, or from the
+    address overall, have reached settings.LOGIN_RATE_LIMIT
+    ``(per_username, per_address, window_seconds)`` within the window.
+    Blocked attempts are rejected before any password is hashed.
+    """
+    keys = _keys(request, username)
+    counts = cache.get_many([key for key, _, _ in keys])
+    return any(counts.get(key, 0) >= limit for key, limit, _ in keys)
+
+
+def login_failed(request, username):
+    # Fixed windows: the counter expires a window after the first failure.
+    for key, _, window in _keys(request, username):
+        cache.add(key, 0, timeout=window)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=window)
+
+
+def login_succeeded(request, username):
+    cache.delete(_keys(request, username)[0][0])
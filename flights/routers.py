@@ -0,0 +1,32 @@
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class ReplicaRouter:
+    """
+    Send reads to a random replica (every database alias other than the
+    default) and writes to the primary. Reads made inside a transaction on
+    the primary stay there, so read-modify-write code such as
+    flights.booking sees its own writes and the rows it has locked.
+    """
+
+    def replicas(self):
+        return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+    def db_for_read(self, model, **hints):
+        replicas = self.replicas()
+        if not replicas or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
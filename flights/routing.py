@@ -0,0 +1,282 @@
+import bisect
+import heapq
+import itertools
+import threading
+from collections import OrderedDict, defaultdict, deque
+
+from django.core.cache import cache
+
+from .models import Airport, Flight
+
+DEFAULT_MAX_LEGS = 4
+
+# Counter bumped by every process that changes flights, so that the others
+# know their index is behind. Shared as far as the cache is.
+VERSION_KEY = "flights:routes:version"
+
+
+def _shared_version():
+    cache.add(VERSION_KEY, 0, timeout=None)
+    return cache.get(VERSION_KEY)
+
+
+def _bump_version():
+    cache.add(VERSION_KEY, 0, timeout=None)
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        # Evicted in between.
+        cache.add(VERSION_KEY, 1, timeout=None)
+        return None
+
+
+class RouteIndex:
+    """
+    In-memory adjacency index over Flight rows used by the route search.
+
+    The index is built lazily from the database and then kept up to date
+    flight by flight from model signals. Every process keeps its own copy
+    and bumps a version counter in the cache with each change; a search
+    that finds the counter moved on by another process (a worker, an
+    import, another web process) rebuilds first. Writes that bypass signals
+    (bulk_create, queryset.update) must call reset().
+    """
+
+    def __init__(self, distance_cache_size=256):
+        self._lock = threading.RLock()
+        self._distance_cache_size = distance_cache_size
+        self._clear()
+
+    def _clear(self):
+        self._built = False
+        self._version = None
+        self._flights = {}
+        self._routes = defaultdict(list)
+        self._outgoing = defaultdict(set)
+        self._incoming = defaultdict(dict)
+        self._distances = OrderedDict()
+
+    def reset(self):
+        # Here and in every other process sharing the cache.
+        with self._lock:
+            self._clear()
+            _bump_version()
+
+    def _ensure_built(self):
+        # Read before the flights: a change committed while they are read
+        # moves the counter past it and triggers another rebuild.
+        version = _shared_version()
+        if self._built and version == self._version:
+            return
+        self._clear()
+        rows = Flight.objects.values_list("id", "origin_id", "destination_id", "duration")
+        for flight_id, origin_id, destination_id, duration in rows.iterator(chunk_size=10000):
+            self._insert(flight_id, origin_id, destination_id, duration)
+        self._built = True
+        self._version = version
+
+    def _changed(self):
+        # This process is current only if nobody else changed flights since
+        # its last look; otherwise the next search rebuilds.
+        version = _bump_version()
+        if self._built and version is not None and version == self._version + 1:
+            self._version = version
+        else:
+            self._clear()
+
+    def _insert(self, flight_id, origin_id, destination_id, duration):
+        self._flights[flight_id] = (origin_id, destination_id, duration)
+        route = self._routes[origin_id, destination_id]
+        bisect.insort(route, (duration, flight_id))
+        self._outgoing[origin_id].add(destination_id)
+        self._incoming[destination_id][origin_id] = route[0][0]
+
+    def _discard(self, flight_id):
+        origin_id, destination_id, duration = self._flights.pop(flight_id)
+        route = self._routes[origin_id, destination_id]
+        route.remove((duration, flight_id))
+        if route:
+            self._incoming[destination_id][origin_id] = route[0][0]
+        else:
+            del self._routes[origin_id, destination_id]
+            self._outgoing[origin_id].discard(destination_id)
+            del self._incoming[destination_id][origin_id]
+
+    def update(self, flight):
+        with self._lock:
+            if self._built:
+                if flight.pk in self._flights:
+                    self._discard(flight.pk)
+                self._insert(flight.pk, flight.origin_id, flight.destination_id, flight.duration)
+                self._distances.clear()
+            self._changed()
+
+    def remove(self, flight_id):
+        with self._lock:
+            if self._built and flight_id in self._flights:
+                self._discard(flight_id)
+                self._distances.clear()
+            self._changed()
+
+    def _distances_to(self, destinations):
+        # Reverse Dijkstra (shortest remaining duration) and reverse BFS
+        # (fewest remaining legs) from the destinations. Both are admissible
+        # lower bounds that let the forward search skip hopeless branches.
+        key = frozenset(destinations)
+        if key in self._distances:
+            self._distances.move_to_end(key)
+            return self._distances[key]
+
+        duration = {airport: 0 for airport in destinations}
+        heap = [(0, airport) for airport in destinations]
+        while heap:
+            cost, airport = heapq.heappop(heap)
+            if cost > duration[airport]:
+                continue
+            for origin, shortest in self._incoming[airport].items():
+                candidate = cost + shortest
+                if candidate < duration.get(origin, candidate + 1):
+                    duration[origin] = candidate
+                    heapq.heappush(heap, (candidate, origin))
+
+        legs = {airport: 0 for airport in destinations}
+        queue = deque(destinations)
+        while queue:
+            airport = queue.popleft()
+            for origin in self._incoming[airport]:
+                if origin not in legs:
+                    legs[origin] = legs[airport] + 1
+                    queue.append(origin)
+
+        self._distances[key] = (duration, legs)
+        if len(self._distances) > self._distance_cache_size:
+            self._distances.popitem(last=False)
+        return duration, legs
+
+    def _cost(self, flights):
+        return sum(self._flights[flight_id][2] for flight_id in flights)
+
+    def _fastest(self, origin, destination, banned):
+        for duration, flight_id in self._routes[origin, destination]:
+            if flight_id not in banned:
+                return duration, flight_id
+        return None
+
+    def _spur(self, starts, root, destinations, max_legs, remaining, hops, banned=frozenset()):
+        # A* for the fastest loop-free itinerary continuing the root
+        # (flights, airports) from any of ``starts``, without taking a
+        # banned flight out of the spur airport. Labels are whole paths and
+        # are not merged per airport: two paths to one airport may rule out
+        # different continuations.
+        root_flights, root_airports = root
+        cost, legs = self._cost(root_flights), len(root_flights)
+        avoid = set(root_airports)
+        counter = itertools.count()
+        heap = [
+            (cost + remaining[start], cost, next(counter), start, root_flights, root_airports + (start,))
+            for start in starts if start in remaining
+        ]
+        heapq.heapify(heap)
+        while heap:
+            _, cost, _, airport, flights, airports = heapq.heappop(heap)
+            legs = len(flights)
+            if flights and airport in destinations:
+                return cost, flights, airports
+            if legs >= max_legs:
+                continue
+
+            spur = legs == len(root_flights)
+            for destination in self._outgoing[airport]:
+                if destination in avoid or destination in airports or destination not in remaining:
+                    continue
+                if legs + 1 + hops[destination] > max_legs:
+                    continue
+                fastest = self._fastest(airport, destination, banned if spur else ())
+                if fastest is None:
+                    continue
+                duration, flight_id = fastest
+                total = cost + duration
+                heapq.heappush(heap, (
+                    total + remaining[destination], total, next(counter), destination,
+                    flights + (flight_id,), airports + (destination,),
+                ))
+        return None
+
+    def search(self, origins, destinations, k=3, max_legs=DEFAULT_MAX_LEGS):
+        """
+        Return up to ``k`` fastest loop-free itineraries from any of the
+        ``origins`` to any of the ``destinations`` (airport ids), fastest
+        first. Each one is a ``(total_duration, legs)`` tuple where a leg is
+        ``(flight_id, origin_id, destination_id, duration)``.
+
+        Yen's algorithm over flights, with a virtual start airport linked
+        to every origin: each found itinerary is branched at every airport
+        along it, taking the fastest continuation that differs from the
+        itineraries already found with the same prefix.
+        """
+        with self._lock:
+            self._ensure_built()
+            origins, destinations = set(origins), set(destinations)
+            remaining, hops = self._distances_to(destinations)
+
+            def spur(starts, root=((), ()), banned=frozenset()):
+                return self._spur(starts, root, destinations, max_legs, remaining, hops, banned)
+
+            found = []
+            first = spur(origins)
+            candidates = [first] if first else []
+            seen = {first[1]} if first else set()
+            while candidates and len(found) < k:
+                path = heapq.heappop(candidates)
+                found.append(path)
+                _, flights, airports = path
+
+                # Branch at the virtual start: any origin not used so far.
+                branches = [spur(origins - {other[2][0] for other in found})]
+                for position in range(len(flights)):
+                    root = (flights[:position], airports[:position])
+                    banned = {
+                        other[1][position] for other in found
+                        if other[1][:position] == root[0] and other[2][:position + 1] == airports[:position + 1]
+                    }
+                    branches.append(spur([airports[position]], root, banned))
+                for branch in branches:
+                    if branch and branch[1] not in seen:
+                        seen.add(branch[1])
+                        heapq.heappush(candidates, branch)
+
+            return [(cost, [(flight_id, *self._flights[flight_id]) for flight_id in flights]) for cost, flights, _ in found]
+
+    def describe(self, results):
+        """
+        Expand search results into JSON-friendly itineraries, leaving out
+        any whose flights or airports have been deleted since the index
+        last saw them.
+        """
+        airport_ids = {airport_id for _, legs in results for leg in legs for airport_id in leg[1:3]}
+        airports = {airport.id: airport for airport in Airport.objects.filter(pk__in=airport_ids)}
+        flight_ids = {leg[0] for _, legs in results for leg in legs}
+        existing = set(Flight.objects.filter(pk__in=flight_ids).values_list("id", flat=True))
+        results = [
+            (total, legs) for total, legs in results
+            if all(leg[0] in existing and leg[1] in airports and leg[2] in airports for leg in legs)
+        ]
+
+        return [
+            {
+                "duration": total,
+                "legs": [
+                    {
+                        "flight": flight_id,
+                        "origin": airports[origin_id].code,
+                        "destination": airports[destination_id].code,
+                        "duration": duration,
+                    }
+                    for flight_id, origin_id, destination_id, duration in legs
+                ],
+            }
+            for total, legs in results
+        ]
+
+
+route_index = RouteIndex()
@@ -0,0 +1,42 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+# Query parameter prefix -> Flight field it bounds. ``<prefix>_from`` is
+# inclusive and ``<prefix>_until`` exclusive.
+WINDOWS = {"departs": "departure", "arrives": "arrival"}
+WINDOW_PARAMS = ("date", *(f"{prefix}_{end}" for prefix in WINDOWS for end in ("from", "until")))
+
+
+def parse_moment(value, name="value"):
+    # Dates mean midnight; times without an offset are in the current zone.
+    try:
+        moment = parse_datetime(value)
+        if moment is None and (day := parse_date(value)) is not None:
+            moment = datetime.combine(day, time.min)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ValueError(f"{name} must be an ISO 8601 date or date and time.")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def in_window(queryset, params):
+    """
+    Filter flights by the time window parameters: ``date`` for departures
+    on one day, ``departs_from``/``departs_until`` and
+    ``arrives_from``/``arrives_until`` for arbitrary ranges. Together with
+    an origin (or destination) filter each becomes a range scan on the
+    (origin, departure) or (destination, arrival) index. Raises ValueError
+    for unparseable values.
+    """
+    if params.get("date"):
+        day = parse_moment(params["date"], "date")
+        queryset = queryset.filter(departure__gte=day, departure__lt=day + timedelta(days=1))
+    for prefix, field in WINDOWS.items():
+        if params.get(f"{prefix}_from"):
+            queryset = queryset.filter(**{f"{field}__gte": parse_moment(params[f"{prefix}_from"], f"{prefix}_from")})
+        if params.get(f"{prefix}_until"):
+            queryset = queryset.filter(**{f"{field}__lt": parse_moment(params[f"{prefix}_until"], f"{prefix}_until")})
+    return queryset
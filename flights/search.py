@@ -0,0 +1,225 @@
+from collections import Counter, namedtuple
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Lower
+
+from .models import Airport, Passenger, SearchTerm
+
+# Model -> field whose lower-cased values make up the search vocabulary ->
+# SearchTerm counter of its uses.
+SOURCES = {
+    Airport: {"code": "airports", "city": "airports"},
+    Passenger: {"first": "first_names", "last": "last_names"},
+}
+COUNTERS = ("airports", "first_names", "last_names")
+# Fuzzy matches below this trigram similarity are dropped.
+SIMILARITY = 0.3
+# Vocabulary terms considered per query word, and the best of them looked
+# up as passenger names.
+CANDIDATES = 50
+NAME_TERMS = 5
+# Every query word costs a few index lookups, so queries are capped.
+MAX_WORDS = 5
+MAX_QUERY_LENGTH = 100
+BATCH_SIZE = 5000
+
+
+def _name_prefix(field, prefix):
+    # A range over the lower-cased column can use the functional indexes on
+    # Passenger, unlike LIKE/istartswith.
+    prefix = prefix.lower()
+    return Q(**{f"{field}_lower__gte": prefix, f"{field}_lower__lt": prefix + "\uffff"})
+
+
+def search_by_name(queryset, terms):
+    """
+    Narrow a Passenger queryset to names starting with the given terms: one
+    term matches either name, two match first and last name in either order.
+    The queryset gains ``first_lower``/``last_lower`` aliases to order by.
+    """
+    queryset = queryset.alias(first_lower=Lower("first"), last_lower=Lower("last"))
+    if len(terms) == 1:
+        return queryset.filter(_name_prefix("first", terms[0]) | _name_prefix("last", terms[0]))
+    return queryset.filter(
+        (_name_prefix("first", terms[0]) & _name_prefix("last", terms[-1]))
+        | (_name_prefix("last", terms[0]) & _name_prefix("first", terms[-1]))
+    )
+
+
+def terms_of(model, values):
+    """Count ``(counter, term)`` uses of one row's searchable field values."""
+    return Counter(
+        (counter, value.lower()) for counter, value in zip(SOURCES[model].values(), values) if value
+    )
+
+
+def update_terms(added, removed):
+    """Apply Counters of ``(counter, term)`` uses gained and lost."""
+    with transaction.atomic():
+        if added:
+            SearchTerm.objects.bulk_create([SearchTerm(term=term) for _, term in added], ignore_conflicts=True)
+        for (counter, term), total in added.items():
+            SearchTerm.objects.filter(term=term).update(**{counter: F(counter) + total})
+        for (counter, term), total in removed.items():
+            SearchTerm.objects.filter(term=term, **{f"{counter}__gte": total}).update(**{counter: F(counter) - total})
+        if removed:
+            unused = {counter: 0 for counter in COUNTERS}
+            SearchTerm.objects.filter(term__in={term for _, term in removed}, **unused).delete()
+
+
+def _lock_terms():
+    # Keeps update_terms() out until the rebuild commits. On PostgreSQL the
+    # lock waits for signal updates in flight, so the recount below sees
+    # them committed; on SQLite the first write takes the database lock.
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("LOCK TABLE flights_searchterm IN EXCLUSIVE MODE")
+
+
+def rebuild_terms(batch_size=BATCH_SIZE):
+    """
+    Recount the vocabulary from airports and passengers, for bulk writes
+    that bypass the signals. Returns the number of terms. Counting happens
+    under the table lock, so term updates made meanwhile by the signals are
+    neither lost nor counted twice.
+    """
+    with transaction.atomic():
+        _lock_terms()
+        SearchTerm.objects.all().delete()
+        terms = {}
+        for model, fields in SOURCES.items():
+            for field, counter in fields.items():
+                rows = model.objects.order_by().values_list(Lower(field)).annotate(total=Count("pk"))
+                for term, total in rows:
+                    if term:
+                        terms.setdefault(term, Counter())[counter] += total
+        SearchTerm.objects.bulk_create(
+            [SearchTerm(term=term, **counts) for term, counts in terms.items()],
+            batch_size=batch_size,
+        )
+    return len(terms)
+
+
+def _trigrams(word):
+    # Padded like pg_trgm, so that word starts weigh more than word ends.
+    padded = f"  {word} "
+    return {padded[start:start + 3] for start in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    a, b = _trigrams(a), _trigrams(b)
+    return len(a & b) / len(a | b)
+
+
+Match = namedtuple("Match", ["term", "score", *COUNTERS])
+
+
+def _indexed_candidates(word):
+    # Terms sharing trigrams with the word, from the SQLite FTS5 table or
+    # the pg_trgm index. Other databases only get prefix matches.
+    columns = ", ".join(("term", *COUNTERS))
+    if connection.vendor == "sqlite" and len(word) >= 3:
+        match = " OR ".join('"{}"'.format(word[start:start + 3].replace('"', '""')) for start in range(len(word) - 2))
+        sql = (
+            f"SELECT {columns} FROM flights_searchterm WHERE id IN ("
+            "SELECT rowid FROM flights_searchterm_fts WHERE flights_searchterm_fts MATCH %s ORDER BY rank LIMIT %s)"
+        )
+        params = [match, CANDIDATES]
+    elif connection.vendor == "postgresql":
+        sql = f"SELECT {columns} FROM flights_searchterm WHERE term %% %s ORDER BY similarity(term, %s) DESC LIMIT %s"
+        params = [word, word, CANDIDATES]
+    else:
+        return []
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+    except OperationalError:
+        # SQLite without the trigram tokenizer: no index was created.
+        return []
+
+
+def match_terms(word):
+    """
+    Rank vocabulary terms for one query word, best first, as Match tuples:
+    the word itself scores 2, words it starts 1 plus their similarity, and
+    typos their trigram similarity to the word.
+    """
+    word = word.lower()
+    prefixed = SearchTerm.objects.filter(term__gte=word, term__lt=word + "\uffff").order_by("term")
+    candidates = {*prefixed.values_list("term", *COUNTERS)[:CANDIDATES], *_indexed_candidates(word)}
+    matches = []
+    for term, *counts in candidates:
+        score = similarity(word, term) + term.startswith(word)
+        if score >= SIMILARITY:
+            matches.append(Match(term, round(score, 3), *counts))
+    return sorted(matches, key=lambda match: (-match.score, match.term))
+
+
+def find_airports(ranked, limit):
+    # Codes and cities equal to a matched term; airports matching more of
+    # the query words rank higher.
+    scores = [{match.term: match.score for match in matches if match.airports} for matches in ranked]
+    terms = {term for word in scores for term in word}
+    if not terms:
+        return []
+    airports = Airport.objects.alias(city_lower=Lower("city")).filter(
+        Q(code__in=[term.upper() for term in terms if len(term) <= 3]) | Q(city_lower__in=terms)
+    )
+    results = []
+    for airport in airports.values("id", "code", "city"):
+        own = (airport["code"].lower(), airport["city"].lower())
+        score = sum(max(word.get(term, 0) for term in own) for word in scores)
+        results.append({**airport, "score": round(score, 3)})
+    results.sort(key=lambda airport: (-airport["score"], airport["code"]))
+    return results[:limit]
+
+
+def find_passengers(ranked, limit):
+    """
+    Passengers whose names equal matched terms, best matches first. With
+    two or more words the first and last are tried as a full name in either
+    order before any word is tried as a single name. Only terms in use as
+    that kind of name are looked up, each as an equality range on the
+    functional name indexes, so the cost depends on ``limit`` rather than
+    on how many passengers share a name.
+    """
+    firsts = [[match for match in matches if match.first_names][:NAME_TERMS] for matches in ranked]
+    lasts = [[match for match in matches if match.last_names][:NAME_TERMS] for matches in ranked]
+    lookups = []
+    if len(ranked) > 1:
+        lookups += [
+            (first.score + last.score, {"first_lower": first.term, "last_lower": last.term}, ("id",))
+            for first_word, last_word in ((0, -1), (-1, 0))
+            for first in firsts[first_word]
+            for last in lasts[last_word]
+        ]
+    for word in range(len(ranked)):
+        lookups += [(match.score, {"last_lower": match.term}, ("first_lower", "id")) for match in lasts[word]]
+        lookups += [(match.score, {"first_lower": match.term}, ("id",)) for match in firsts[word]]
+    lookups.sort(key=lambda lookup: -lookup[0])
+
+    queryset = Passenger.objects.alias(first_lower=Lower("first"), last_lower=Lower("last"))
+    results, seen = [], set()
+    for score, lookup, ordering in lookups:
+        for passenger in queryset.filter(**lookup).order_by(*ordering).values("id", "first", "last")[:limit]:
+            if passenger["id"] not in seen:
+                seen.add(passenger["id"])
+                results.append({**passenger, "name": f"{passenger['first']} {passenger['last']}", "score": score})
+        if len(results) >= limit:
+            break
+    return results[:limit]
+
+
+def find(query, limit=10, passengers=True):
+    """
+    Airports (and passengers, unless ``passengers`` is false) matching a
+    free text query, with prefix and typo tolerant matching per word. Only
+    the first MAX_WORDS words of the first MAX_QUERY_LENGTH characters count.
+    """
+    ranked = [match_terms(word) for word in query[:MAX_QUERY_LENGTH].split()[:MAX_WORDS]]
+    results = {"airports": find_airports(ranked, limit)}
+    if passengers:
+        results["passengers"] = find_passengers(ranked, limit)
+    return results
@@ -0,0 +1,223 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .analytics import refresh_airports, refresh_routes
+from .boards import invalidate_boards
+from .fragments import invalidate_fragments, lists_showing
+from .models import Airport, Flight, Passenger
+from .routing import route_index
+from .search import SOURCES, terms_of, update_terms
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, "SQLITE_PRAGMAS", {}).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+@receiver(post_save, sender=Flight)
+def index_flight(sender, instance, **kwargs):
+    transaction.on_commit(lambda: route_index.update(instance))
+
+
+@receiver(post_delete, sender=Flight)
+def unindex_flight(sender, instance, **kwargs):
+    flight_id = instance.pk
+    transaction.on_commit(lambda: route_index.remove(flight_id))
+
+
+@receiver(pre_save, sender=Flight)
+def remember_flight_airports(sender, instance, **kwargs):
+    # An updated flight may have moved away from airports whose boards list it.
+    instance._previous_airports = ()
+    if instance.pk:
+        instance._previous_airports = tuple(
+            Flight.objects.filter(pk=instance.pk).values_list("origin_id", "destination_id").first() or ()
+        )
+
+
+@receiver(post_save, sender=Flight)
+@receiver(post_delete, sender=Flight)
+def invalidate_flight_boards(sender, instance, **kwargs):
+    airport_ids = {instance.origin_id, instance.destination_id, *getattr(instance, "_previous_airports", ())}
+    transaction.on_commit(lambda: invalidate_boards(airport_ids))
+
+
+class _PendingStats:
+    # Routes and airports whose summaries one transaction changed, refreshed
+    # together when it commits.
+    def __init__(self):
+        self.routes = set()
+        self.airport_ids = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        refresh_routes(self.routes)
+        refresh_airports(self.airport_ids)
+
+
+def _pending_stats(using):
+    # The set of the current transaction (savepoint), registered with
+    # on_commit when its first flight changes. A rollback drops the
+    # callback, so a set is only reused while its callback is still queued
+    # at the current savepoint.
+    connection = transaction.get_connection(using)
+    savepoints = set(connection.savepoint_ids)
+    pending = getattr(connection, "pending_flight_stats", None)
+    if pending is None or pending.done or not any(
+        func is pending and sids == savepoints for sids, func, _ in connection.run_on_commit
+    ):
+        pending = connection.pending_flight_stats = _PendingStats()
+        transaction.on_commit(pending, using=using)
+    return pending
+
+
+@receiver(post_save, sender=Flight)
+@receiver(post_delete, sender=Flight)
+def refresh_flight_stats(sender, instance, using, **kwargs):
+    # Passenger totals change with every booking and are left to the
+    # scheduled refresh_stats command; routes and flight counts follow here,
+    # once per transaction however many flights it saves or deletes.
+    routes = {(instance.origin_id, instance.destination_id)}
+    previous = getattr(instance, "_previous_airports", ())
+    if previous:
+        routes.add(previous)
+    airport_ids = {airport_id for route in routes for airport_id in route}
+
+    if not transaction.get_connection(using).in_atomic_block:
+        refresh_routes(routes)
+        refresh_airports(airport_ids)
+        return
+    pending = _pending_stats(using)
+    pending.routes |= routes
+    pending.airport_ids |= airport_ids
+
+
+@receiver(post_save, sender=Airport)
+@receiver(post_delete, sender=Airport)
+def invalidate_airport_boards(sender, instance, created=False, **kwargs):
+    # Boards of connected airports show this airport's code and city.
+    airport_ids = {instance.pk}
+    if not created and kwargs["signal"] is post_save:
+        airport_ids.update(instance.departures.values_list("destination_id", flat=True).distinct())
+        airport_ids.update(instance.arrivals.values_list("origin_id", flat=True).distinct())
+    transaction.on_commit(lambda: invalidate_boards(airport_ids))
+
+
+def _airports(flights):
+    return {airport_id for route in flights.values_list("origin_id", "destination_id") for airport_id in route}
+
+
+@receiver(m2m_changed, sender=Passenger.flights.through)
+def count_bookings(sender, instance, action, reverse, pk_set, **kwargs):
+    # Keeps Flight.seats_booked and Passenger.flight_count right for
+    # bookings made through the ORM relation (admin, forms). flights.booking
+    # writes the through table directly and maintains the counters itself.
+    own, other = ("flight_id", "passenger_id") if reverse else ("passenger_id", "flight_id")
+
+    if action in ("pre_remove", "pre_clear"):
+        rows = sender.objects.filter(**{own: instance.pk})
+        if pk_set is not None:
+            rows = rows.filter(**{f"{other}__in": pk_set})
+        instance._unbooked = list(rows.values_list(other, flat=True))
+        return
+
+    if action == "post_add":
+        changed, step = list(pk_set), 1
+    elif action in ("post_remove", "post_clear"):
+        changed, step = instance.__dict__.pop("_unbooked", []), -1
+    else:
+        return
+
+    if not changed:
+        return
+    flights, passengers = ([instance.pk], changed) if reverse else (changed, [instance.pk])
+    Flight.objects.filter(pk__in=flights).update(seats_booked=F("seats_booked") + step * len(passengers))
+    Passenger.objects.filter(pk__in=passengers).update(flight_count=F("flight_count") + step * len(flights))
+
+    # Boards show the load of every flight listed.
+    airport_ids = _airports(Flight.objects.filter(pk__in=flights))
+    transaction.on_commit(lambda: invalidate_boards(airport_ids))
+
+
+@receiver(pre_delete, sender=Flight)
+@receiver(pre_delete, sender=Passenger)
+def release_bookings(sender, instance, **kwargs):
+    # Deleting a flight or passenger removes its bookings without any
+    # m2m_changed signal; the counters on the other side go down here, in
+    # the deleting transaction, while the bookings can still be joined.
+    booked = lists_showing(Passenger.flights.through)
+    if sender is Flight:
+        if Passenger.objects.filter(flights=instance).update(flight_count=F("flight_count") - 1):
+            transaction.on_commit(lambda: invalidate_fragments(booked))
+        return
+
+    flights = Flight.objects.filter(passengers=instance)
+    airport_ids = _airports(flights)
+    if not airport_ids:
+        return
+    flights.update(seats_booked=F("seats_booked") - 1)
+
+    def invalidate():
+        invalidate_boards(airport_ids)
+        invalidate_fragments(booked)
+    transaction.on_commit(invalidate)
+
+
+@receiver(pre_save, sender=Airport)
+@receiver(pre_save, sender=Passenger)
+def remember_search_terms(sender, instance, update_fields=None, **kwargs):
+    # None when the save cannot change a searchable field.
+    fields = list(SOURCES[sender])
+    instance._previous_terms = None
+    if update_fields is not None and not set(update_fields) & set(fields):
+        return
+    previous = sender.objects.filter(pk=instance.pk).values_list(*fields).first() if instance.pk else None
+    instance._previous_terms = terms_of(sender, previous or ())
+
+
+@receiver(post_save, sender=Airport)
+@receiver(post_save, sender=Passenger)
+def index_search_terms(sender, instance, **kwargs):
+    previous = instance.__dict__.pop("_previous_terms", None)
+    if previous is None:
+        return
+    current = terms_of(sender, [getattr(instance, field) for field in SOURCES[sender]])
+    if current != previous:
+        update_terms(current - previous, previous - current)
+
+
+@receiver(post_delete, sender=Airport)
+@receiver(post_delete, sender=Passenger)
+def unindex_search_terms(sender, instance, **kwargs):
+    update_terms({}, terms_of(sender, [getattr(instance, field) for field in SOURCES[sender]]))
+
+
+@receiver(post_save, sender=Airport)
+@receiver(post_delete, sender=Airport)
+@receiver(post_save, sender=Flight)
+@receiver(post_delete, sender=Flight)
+@receiver(post_save, sender=Passenger)
+@receiver(post_delete, sender=Passenger)
+@receiver(m2m_changed, sender=Passenger.flights.through)
+def invalidate_list_fragments(sender, **kwargs):
+    # Bookings (m2m_changed) reach the flight and passenger lists because
+    # both show booking counters and list the through model in DEPENDENCIES.
+    if kwargs.get("action", "post_").startswith("pre_"):
+        return
+    names = lists_showing(sender)
+    if not names:
+        return
+    # Once right away, so later reads in this transaction see the change,
+    # and again at commit in case another request cached the old rows in
+    # between.
+    invalidate_fragments(names)
+    transaction.on_commit(lambda: invalidate_fragments(names))
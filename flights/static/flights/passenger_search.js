@@ -0,0 +1,42 @@
+(function () {
+    const input = document.getElementById("passenger-search");
+    const select = document.getElementById("passenger-results");
+    if (!input || !select) {
+        return;
+    }
+
+    let timer = null;
+    let controller = null;
+
+    function show(results) {
+        select.replaceChildren(...results.map(function (passenger) {
+            const option = document.createElement("option");
+            option.value = passenger.id;
+            option.textContent = passenger.name;
+            return option;
+        }));
+    }
+
+    function search() {
+        const query = input.value.trim();
+        if (controller) {
+            controller.abort();
+        }
+        if (!query) {
+            show([]);
+            return;
+        }
+
+        controller = new AbortController();
+        const url = input.dataset.url + "?q=" + encodeURIComponent(query);
+        fetch(url, {signal: controller.signal, credentials: "same-origin"})
+            .then(function (response) { return response.json(); })
+            .then(function (data) { show(data.results || []); })
+            .catch(function () {});
+    }
+
+    input.addEventListener("input", function () {
+        clearTimeout(timer);
+        timer = setTimeout(search, 200);
+    });
+})();
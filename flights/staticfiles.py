@@ -0,0 +1,176 @@
+import gzip
+import mimetypes
+import os
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content-Encoding -> file suffix, in order of preference.
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+# Formats that are compressed already.
+SKIP_COMPRESSION = {
+    ".br", ".gz", ".zip", ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".woff", ".woff2", ".mp4", ".webm",
+}
+# Variants saving less than this share of the original are not kept.
+MIN_SAVING = 0.05
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage (content-hashed file names) that also writes a gzip
+    and, when the brotli package is installed, a brotli variant next to
+    every collected file that compresses, for StaticFilesMiddleware to serve
+    without compressing per request.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted({*paths, *self.hashed_files.values()}):
+            for compressed in self.compress(name):
+                yield name, compressed, True
+
+    def compress(self, name):
+        if os.path.splitext(name)[1].lower() in SKIP_COMPRESSION:
+            return
+        with self.open(name) as original:
+            data = original.read()
+        variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(data)
+        for suffix, compressed in variants.items():
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            if len(compressed) <= len(data) * (1 - MIN_SAVING):
+                self._save(name + suffix, ContentFile(compressed))
+                yield name + suffix
+
+
+def _accepted(header):
+    # Codings listed in Accept-Encoding with a non-zero quality.
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        params = params.strip().lower()
+        try:
+            quality = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            quality = 1.0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFile:
+    def __init__(self, path, immutable):
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.content_type.startswith("text/") or self.content_type in ("application/javascript", "application/json"):
+            self.content_type += "; charset=utf-8"
+        self.cache_control = IMMUTABLE if immutable else f"public, max-age={getattr(settings, 'STATIC_MAX_AGE', 60)}"
+        # Encoding (None for the original) -> (path, size, ETag).
+        self.variants = {}
+        for encoding, suffix in (*ENCODINGS.items(), (None, "")):
+            if os.path.isfile(path + suffix):
+                stat = os.stat(path + suffix)
+                self.variants[encoding] = (path + suffix, stat.st_size, f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"')
+        self.last_modified = http_date(os.stat(path).st_mtime)
+
+    def variant(self, accept_encoding):
+        accepted = _accepted(accept_encoding)
+        for encoding in ENCODINGS:
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding, self.variants[encoding]
+        return None, self.variants[None]
+
+
+class StaticFilesMiddleware:
+    """
+    Serve files collected into settings.STATIC_ROOT under STATIC_URL ahead
+    of URL resolution. The directory is indexed once per process; each
+    request picks the brotli or gzip variant the client accepts, answers
+    If-None-Match with 304 and streams the file otherwise. Names listed in
+    the staticfiles manifest carry a content hash and are cached as
+    immutable for a year; other files for settings.STATIC_MAX_AGE seconds.
+    Unused when STATIC_ROOT has not been collected. Works in both sync and
+    async stacks; serving a file never touches the database.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        root = settings.STATIC_ROOT
+        if not root or not os.path.isdir(root):
+            raise MiddlewareNotUsed
+        self.prefix = urlsplit(settings.STATIC_URL).path
+        self.files = self.index(root)
+
+    def index(self, root):
+        # Empty without a manifest: nothing is treated as immutable.
+        hashed = set(ManifestStaticFilesStorage(location=root).hashed_files.values())
+
+        files = {}
+        for directory, _, names in os.walk(root):
+            for filename in names:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, root).replace(os.sep, "/")
+                stem, suffix = os.path.splitext(name)
+                if suffix in ENCODINGS.values() and os.path.isfile(os.path.join(root, stem)):
+                    continue
+                files[self.prefix + name] = StaticFile(path, name in hashed)
+        return files
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.serve(request)
+        return self.get_response(request) if response is None else response
+
+    async def __acall__(self, request):
+        response = self.serve(request)
+        return await self.get_response(request) if response is None else response
+
+    def serve(self, request):
+        # The response for a collected file, None for any other request.
+        static = self.files.get(request.path) if request.method in ("GET", "HEAD") else None
+        if static is None:
+            return None
+
+        encoding, (path, size, etag) = static.variant(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        headers = {"Cache-Control": static.cache_control, "ETag": etag, "Last-Modified": static.last_modified}
+        if len(static.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+            response = HttpResponseNotModified()
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+        if request.method == "HEAD":
+            response = HttpResponse(content_type=static.content_type)
+        else:
+            response = FileResponse(open(path, "rb"), content_type=static.content_type)
+            response.headers.pop("Content-Disposition", None)
+        response["Content-Length"] = size
+        if encoding:
+            response["Content-Encoding"] = encoding
+        for header, value in headers.items():
+            response[header] = value
+        return response
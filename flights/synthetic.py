@@ -0,0 +1,100 @@
+import itertools
+import random
+import string
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import refresh_stats
+from .counters import recount
+from .fragments import DEPENDENCIES, invalidate_fragments
+from .models import Airport, Flight, Passenger, arrival_time
+from .routing import route_index
+from .search import rebuild_terms
+
+FIRST_NAMES = [
+    "Anna", "Piotr", "Maria", "Jan", "Katarzyna", "Tomasz", "Ewa", "Adam", "Olivia",
+    "Liam", "Emma", "Noah", "Sofia", "Lucas", "Mia", "Hugo", "Alice", "Marco",
+]
+LAST_NAMES = [
+    "Nowak", "Kowalski", "Wisniewski", "Smith", "Johnson", "Brown", "Garcia", "Muller",
+    "Rossi", "Dubois", "Jensen", "Silva", "Novak", "Kim", "Tanaka", "Haddad",
+]
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def seed(airports=1000, flights=100000, passengers=100000, bookings=200000,
+         batch_size=5000, random_seed=0, progress=None, days=90):
+    """
+    Fill the database with a reproducible synthetic airline using bulk
+    inserts only. Flights depart over ``days`` days from today and
+    ``bookings`` is spread evenly over the passengers, each of whom books
+    distinct flights. Returns the number of rows created per model.
+    """
+    rng = random.Random(random_seed)
+    start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    progress = progress or (lambda stage, done, total: None)
+
+    codes = ("".join(letters) for letters in itertools.product(string.ascii_uppercase, repeat=3))
+    Airport.objects.bulk_create(
+        [Airport(code=code, city=f"{code.capitalize()}ville") for code in itertools.islice(codes, airports)],
+        batch_size=batch_size,
+    )
+    airport_ids = list(Airport.objects.order_by("id").values_list("id", flat=True))
+    progress("airports", len(airport_ids), airports)
+
+    def make_flight():
+        origin, destination = rng.sample(airport_ids, 2)
+        duration = rng.randint(30, 900)
+        # Five minute slots; bulk_create skips save(), so arrival is set here.
+        departure = start + timedelta(minutes=5 * rng.randrange(days * 24 * 12))
+        return Flight(
+            origin_id=origin, destination_id=destination, duration=duration, capacity=1000,
+            departure=departure, arrival=arrival_time(departure, duration),
+        )
+
+    done = 0
+    for batch in _batches((make_flight() for _ in range(flights)), batch_size):
+        Flight.objects.bulk_create(batch)
+        done += len(batch)
+        progress("flights", done, flights)
+
+    done = 0
+    people = (Passenger(first=rng.choice(FIRST_NAMES), last=rng.choice(LAST_NAMES)) for _ in range(passengers))
+    for batch in _batches(people, batch_size):
+        Passenger.objects.bulk_create(batch)
+        done += len(batch)
+        progress("passengers", done, passengers)
+
+    through = Passenger.flights.through
+    flight_ids = list(Flight.objects.order_by("id").values_list("id", flat=True))
+    passenger_ids = Passenger.objects.order_by("id").values_list("id", flat=True)
+    per_passenger, extra = divmod(bookings, max(passengers, 1))
+
+    def make_bookings():
+        for position, passenger_id in enumerate(passenger_ids.iterator(chunk_size=batch_size)):
+            count = min(per_passenger + (position < extra), len(flight_ids))
+            for flight_id in rng.sample(flight_ids, count):
+                yield through(passenger_id=passenger_id, flight_id=flight_id)
+
+    done = 0
+    for batch in _batches(make_bookings(), batch_size):
+        with transaction.atomic():
+            through.objects.bulk_create(batch)
+        done += len(batch)
+        progress("bookings", done, bookings)
+
+    recount(Flight)
+    recount(Passenger)
+    rebuild_terms()
+    route_index.reset()
+    invalidate_fragments(DEPENDENCIES)
+    refresh_stats()
+
+    return {"airports": len(airport_ids), "flights": flights, "passengers": passengers, "bookings": done}
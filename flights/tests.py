@@ -1,3 +1,1363 @@
-from django.test import TestCase
+import base64
+import gzip
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.templatetags.static import static
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+from . import manifests
+
+from .boards import board_key
+from .booking import book_passengers, unbook_passengers
+from .forms import AirportForm
+from .fragments import fragment_key
+from .instrumentation import PerformanceMiddleware, stats
+from .jobs import HOST, TASKS, enqueue, requeue_stale, run_pending, task
+from .models import Airport, AirportStats, Flight, Job, Passenger, RouteStats, SearchTerm
+from .pagination import CursorPaginator, InvalidCursor, decode_cursor, encode_cursor
+from .querybudget import QueryBudgetExceeded, query_budget
+from .routers import ReplicaRouter
+from .routing import RouteIndex, route_index
+from .search import find, rebuild_terms
+from .staticfiles import StaticFilesMiddleware
+from .transfer import FlightImporter
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.waw = Airport.objects.create(code="WAW", city="Warsaw")
+        cls.jfk = Airport.objects.create(code="JFK", city="NewYork")
+        cls.flights = [
+            Flight.objects.create(origin=cls.waw, destination=cls.jfk, duration=600 + i)
+            for i in range(7)
+        ]
+
+    def test_walks_forward_and_backward(self):
+        paginator = CursorPaginator(Flight.objects.all(), 3)
+
+        first = paginator.page(after="")
+        self.assertEqual([f.id for f in first], [f.id for f in self.flights[:3]])
+        self.assertFalse(first.has_previous())
+
+        second = paginator.page(after=first.next_cursor)
+        self.assertEqual([f.id for f in second], [f.id for f in self.flights[3:6]])
+
+        back = paginator.page(before=second.previous_cursor)
+        self.assertEqual([f.id for f in back], [f.id for f in first])
+
+        last = paginator.page(before="")
+        self.assertEqual([f.id for f in last], [f.id for f in self.flights[4:]])
+        self.assertFalse(last.has_next())
+
+    def test_descending_composite_ordering(self):
+        paginator = CursorPaginator(Flight.objects.all(), 4, ordering=("-duration", "id"))
+
+        first = paginator.page(after="")
+        second = paginator.page(after=first.next_cursor)
+        durations = [f.duration for f in first] + [f.duration for f in second]
+        self.assertEqual(durations, sorted((f.duration for f in self.flights), reverse=True))
+
+    def test_index_supports_both_modes(self):
+        response = self.client.get(reverse("index"), {"page": 3})
+        self.assertEqual(len(response.context["flights"]), 1)
+
+        response = self.client.get(reverse("index"), {"after": "garbage", "count": "1"})
+        self.assertTrue(response.context["flights"].is_cursor)
+        self.assertContains(response, "Rekordów: 7.")
+
+    def test_non_scalar_cursors_are_invalid(self):
+        for values in ([[1]], [{}], [{"id": 1}]):
+            token = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(token)
+            self.assertEqual(self.client.get(reverse("index"), {"after": token}).status_code, 200)
+
+    def test_mistyped_cursors_are_invalid(self):
+        User.objects.create_user("agent", password="secret")
+        self.client.login(username="agent", password="secret")
+        paginator = CursorPaginator(Flight.objects.all(), 3, ordering=("departure", "id"))
+        for values in ([1e308, 1], [True, 1], ["2024-01-01T00:00:00", 1e308], ["soon", 1]):
+            token = encode_cursor(values)
+            with self.assertRaises(InvalidCursor):
+                paginator.page(after=token)
+            self.assertEqual(self.client.get(reverse("index"), {"after": token}).status_code, 200)
+            self.assertEqual(self.client.get(reverse("api_flights"), {"after": token}).status_code, 400)
+
+    def test_passengers_cursor_mode(self):
+        User.objects.create_user("agent", password="secret")
+        self.client.login(username="agent", password="secret")
+        for name in ("Ann", "Bob", "Cid", "Dan"):
+            Passenger.objects.create(first=name, last="Smith")
+
+        response = self.client.get(reverse("passengers"), {"before": ""})
+        self.assertEqual([p.first for p in response.context["passengers"]], ["Bob", "Cid", "Dan"])
+
+
+# Strict mode comes from the test runner, for every view under test.
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("agent", password="secret")
+        waw = Airport.objects.create(code="WAW", city="Warsaw")
+        jfk = Airport.objects.create(code="JFK", city="NewYork")
+        cls.flight = Flight.objects.create(origin=waw, destination=jfk, duration=600)
+        for i in range(3):
+            Flight.objects.create(origin=jfk, destination=waw, duration=500 + i)
+        for i in range(10):
+            Passenger.objects.create(first="Ann", last="Smith").flights.add(cls.flight)
+            Passenger.objects.create(first="Bob", last="Jones")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_flight_list_is_not_n_plus_one(self):
+        with self.assertNumQueries(4):
+            self.client.get(reverse("index"))
+
+    def test_flight_detail_query_count_is_fixed(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("flight", args=(self.flight.id,)))
+        self.assertEqual(len(response.context["passengers"]), 10)
+
+    def test_budget_raises_in_strict_mode(self):
+        @query_budget(1)
+        def wasteful(request):
+            list(Airport.objects.all())
+            list(Flight.objects.all())
+            return HttpResponse()
+
+        with self.assertRaises(QueryBudgetExceeded):
+            wasteful(RequestFactory().get("/"))
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("agent", password="secret")
+        waw = Airport.objects.create(code="WAW", city="Warsaw")
+        jfk = Airport.objects.create(code="JFK", city="NewYork")
+        cls.flight = Flight.objects.create(origin=waw, destination=jfk, duration=600)
+        for i in range(4):
+            Flight.objects.create(origin=jfk, destination=waw, duration=500 + i)
+        Passenger.objects.create(first="Ann", last="Smith").flights.add(cls.flight)
+
+    async def test_index_paginates_like_sync_view(self):
+        response = await self.async_client.get(reverse("async_index"), {"page": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["flights"]), 2)
+        self.assertEqual(response.context["flights"].paginator.count, 5)
+
+    async def test_index_cursor_mode(self):
+        response = await self.async_client.get(reverse("async_index"), {"after": ""})
+        page = response.context["flights"]
+        self.assertTrue(page.has_next())
+        self.assertEqual(page.count, 5)
+
+    async def test_flight_detail(self):
+        response = await self.async_client.get(reverse("async_flight", args=(self.flight.id,)))
+        self.assertContains(response, "Ann Smith")
+        missing = await self.async_client.get(reverse("async_flight", args=(999,)))
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_passengers_requires_login(self):
+        response = await self.async_client.get(reverse("async_passengers"))
+        self.assertRedirects(response, reverse("login"), fetch_redirect_response=False)
+
+        await sync_to_async(self.async_client.force_login)(self.user)
+        response = await self.async_client.get(reverse("async_passengers"))
+        self.assertContains(response, "Ann Smith")
+
+
+@override_settings(PERFORMANCE_SAMPLE_RATE=1)
+class PerformanceMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", password="secret", is_staff=True)
+        waw = Airport.objects.create(code="WAW", city="Warsaw")
+        jfk = Airport.objects.create(code="JFK", city="NewYork")
+        Flight.objects.create(origin=waw, destination=jfk, duration=600)
+
+    def setUp(self):
+        cache.clear()
+        stats.reset()
+
+    def test_server_timing_and_histograms(self):
+        response = self.client.get(reverse("index"))
+        timing = response["Server-Timing"]
+        self.assertIn("total;dur=", timing)
+        self.assertIn('queries"', timing)
+        self.assertIn("template;dur=", timing)
+
+        index = stats.snapshot()["index"]
+        self.assertEqual(index["wall_ms"]["count"], 1)
+        self.assertEqual(index["template_ms"]["count"], 1)
+        self.assertEqual(index["response_bytes"]["count"], 1)
+        self.assertGreater(index["sql_queries"]["mean"], 0)
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        response = self.client.get(reverse("index"))
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(stats.snapshot(), {})
+
+    def test_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse("performance")).status_code, 403)
+        self.client.force_login(self.staff)
+        self.client.get(reverse("airports"))
+        data = self.client.get(reverse("performance")).json()
+        self.assertIn("airports", data)
+
+    async def test_async_requests_are_recorded(self):
+        response = await self.async_client.get(reverse("async_index"))
+        self.assertIn('queries"', response["Server-Timing"])
+        self.assertGreater(stats.snapshot()["async_index"]["sql_queries"]["mean"], 0)
+
+    async def test_queries_in_other_threads_are_counted(self):
+        def query():
+            connection.cursor().execute("SELECT 1")
+            connection.close()
+
+        async def view(request):
+            await sync_to_async(query, thread_sensitive=False)()
+            return HttpResponse()
+
+        middleware = PerformanceMiddleware(view)
+        response = await middleware(RequestFactory().get("/"))
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("agent", password="secret")
+        cls.waw = Airport.objects.create(code="WAW", city="Warsaw")
+        cls.jfk = Airport.objects.create(code="JFK", city="NewYork")
+        Flight.objects.create(origin=cls.waw, destination=cls.jfk, duration=600)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_page_skips_list_queries(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse("index"))
+        # Only the session and user lookups remain.
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("index"))
+        self.assertContains(response, "Warsaw (WAW) to NewYork (JFK)")
+
+    def test_changes_invalidate_dependent_lists(self):
+        self.client.get(reverse("index"))
+        self.client.get(reverse("airports"))
+        self.waw.city = "Modlin"
+        self.waw.save()
+        self.assertContains(self.client.get(reverse("index")), "Modlin (WAW)")
+        self.assertContains(self.client.get(reverse("airports")), "Modlin")
+
+    def test_orm_bookings_invalidate_passenger_list(self):
+        self.client.force_login(self.user)
+        passenger = Passenger.objects.create(first="Ann", last="Smith")
+        self.assertContains(self.client.get(reverse("passengers")), "(0 flights)")
+        passenger.flights.add(Flight.objects.get())
+        self.assertContains(self.client.get(reverse("passengers")), "(1 flights)")
+
+    def test_key_varies_by_page_and_visibility(self):
+        for i in range(3):
+            Flight.objects.create(origin=self.jfk, destination=self.waw, duration=500 + i)
+        self.assertContains(self.client.get(reverse("index"), {"page": 2}), "Strona 2 z 2")
+        self.assertContains(self.client.get(reverse("index"), {"page": 1}), "Strona 1 z 2")
+
+        factory = RequestFactory()
+        anonymous = factory.get("/")
+        anonymous.user = AnonymousUser()
+        signed_in = factory.get("/")
+        signed_in.user = self.user
+        self.assertNotEqual(fragment_key(anonymous, "flights"), fragment_key(signed_in, "flights"))
+
+
+class AdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", password="secret")
+        cls.waw = Airport.objects.create(code="WAW", city="Warsaw")
+        cls.jfk = Airport.objects.create(code="JFK", city="NewYork")
+        cls.lhr = Airport.objects.create(code="LHR", city="London")
+        cls.flights = [Flight.objects.create(origin=cls.waw, destination=cls.jfk, duration=600 + i) for i in range(5)]
+        cls.back = Flight.objects.create(origin=cls.lhr, destination=cls.waw, duration=150)
+        Passenger.objects.create(first="Ann", last="Smith")
+        Passenger.objects.create(first="Bob", last="Jones")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_flight_changelist_query_count_does_not_grow_with_rows(self):
+        url = reverse("admin:flights_flight_changelist")
+        self.client.get(url)
+        # Session, user, approximate count and one joined page query.
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertContains(response, "Warsaw (WAW)")
+
+    def test_indexed_searches(self):
+        response = self.client.get(reverse("admin:flights_flight_changelist"), {"q": "lhr-waw"})
+        self.assertEqual(list(response.context["cl"].result_list), [self.back])
+
+        response = self.client.get(reverse("admin:flights_passenger_changelist"), {"q": "smi"})
+        self.assertEqual([p.last for p in response.context["cl"].result_list], ["Smith"])
+
+        response = self.client.get(reverse("admin:autocomplete"), {
+            "app_label": "flights", "model_name": "passenger", "field_name": "flights", "term": "LHR",
+        })
+        self.assertEqual([int(r["id"]) for r in response.json()["results"]], [self.back.id])
+
+    def test_reassign_airport_action(self):
+        route_index.search([self.waw.id], [self.jfk.id])
+        moved = [flight.id for flight in self.flights[:3]]
+        data = {"action": "reassign_airport", "_selected_action": moved + [self.back.id]}
+        url = reverse("admin:flights_flight_changelist")
+
+        response = self.client.post(url, data)
+        self.assertContains(response, "4 flights")
+
+        response = self.client.post(url, {**data, "apply": "1", "side": "destination", "code": "lhr"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Flight.objects.filter(pk__in=moved, destination=self.lhr).count(), 3)
+        self.assertEqual(Flight.objects.get(pk=self.back.id).destination, self.waw)
+        self.assertEqual(len(route_index.search([self.waw.id], [self.lhr.id], k=5)), 3)
+
+    def test_passenger_change_refuses_full_flights(self):
+        ann = Passenger.objects.get(first="Ann")
+        full = self.flights[0]
+        full.capacity = 0
+        full.save()
+        url = reverse("admin:flights_passenger_change", args=(ann.id,))
+        data = {"first": "Ann", "last": "Smith", "flights": [full.id, self.back.id]}
+
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f"No seats left on flight {full.id}.")
+        self.assertFalse(ann.flights.exists())
+
+        response = self.client.post(url, {**data, "flights": [self.back.id]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Flight.objects.get(pk=self.back.id).seats_booked, 1)
+
+
+class DatabaseProfileTests(TestCase):
+    def test_sqlite_pragmas_applied_on_connect(self):
+        # Neither is SQLite's default (FULL and DEFAULT).
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA temp_store")
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_replica_router(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Flight), "default")
+
+        router.replicas = lambda: ["replica1"]
+        # Test cases run inside a transaction, which pins reads to the primary.
+        self.assertEqual(router.db_for_read(Flight), "default")
+        with mock.patch.object(connection, "in_atomic_block", False):
+            self.assertEqual(router.db_for_read(Flight), "replica1")
+        self.assertEqual(router.db_for_write(Flight), "default")
+        self.assertFalse(router.allow_migrate("replica1", "flights"))
+
+
+class ItineraryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("agent", password="secret")
+        waw = Airport.objects.create(code="WAW", city="Warsaw")
+        jfk = Airport.objects.create(code="JFK", city="NewYork")
+        lhr = Airport.objects.create(code="LHR", city="London")
+        cls.ann = Passenger.objects.create(first="Ann", last="Smith")
+        cls.bob = Passenger.objects.create(first="Bob", last="Jones")
+        cls.ann.flights.add(
+            Flight.objects.create(origin=waw, destination=lhr, duration=150),
+            Flight.objects.create(origin=lhr, destination=jfk, duration=480),
+        )
+        cls.bob.flights.add(Flight.objects.create(origin=jfk, destination=waw, duration=540))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_json_itinerary(self):
+        with self.assertNumQueries(4):
+            data = self.client.get(reverse("itinerary_json", args=(self.ann.id,))).json()
+        self.assertEqual([f["origin"]["code"] for f in data["flights"]], ["WAW", "LHR"])
+        self.assertEqual(data["total_duration"], 630)
+
+    def test_page_requires_login(self):
+        self.assertContains(self.client.get(reverse("itinerary", args=(self.ann.id,))), "630 minutes")
+        self.client.logout()
+        response = self.client.get(reverse("itinerary", args=(self.ann.id,)))
+        self.assertRedirects(response, reverse("login"), fetch_redirect_response=False)
+
+    def test_batch_query_count_is_constant(self):
+        ids = f"{self.bob.id},{self.ann.id},999"
+        with self.assertNumQueries(4):
+            data = self.client.get(reverse("itinerary_batch"), {"ids": ids}).json()
+        self.assertEqual([i["passenger"]["first"] for i in data["itineraries"]], ["Bob", "Ann"])
+        self.assertEqual(data["missing"], [999])
+        self.assertEqual(self.client.get(reverse("itinerary_batch"), {"ids": "x"}).status_code, 400)
+
+
+class ManifestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("agent", password="secret")
+        waw = Airport.objects.create(code="WAW", city="Warsaw")
+        jfk = Airport.objects.create(code="JFK", city="NewYork")
+        cls.first = Flight.objects.create(origin=waw, destination=jfk, duration=600)
+        cls.empty = Flight.objects.create(origin=waw, destination=jfk, duration=610)
+        cls.last = Flight.objects.create(origin=jfk, destination=waw, duration=540)
+        for first, last in [("Ann", "Smith"), ("Bob", "Jones"), ("Eve", "Brown")]:
+            Passenger.objects.create(first=first, last=last).flights.add(cls.first, cls.last)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_manifest(self):
+        lines = self.read(self.client.get(reverse("manifest", args=(self.first.id,)))).splitlines()
+        self.assertEqual(lines[0], "flight,origin,destination,departure,passenger,first,last")
+        self.assertEqual([line.split(",")[-1] for line in lines[1:]], ["Brown", "Jones", "Smith"])
+
+    def test_batch_text_manifest_merges_flights(self):
+        ids = f"{self.last.id},{self.empty.id},{self.first.id}"
+        text = self.read(self.client.get(reverse("manifests"), {"ids": ids, "format": "txt"}))
+        blocks = text.strip().split("\n\n")
+        self.assertEqual(len(blocks), 3)
+        self.assertIn("Total: 3 passengers", blocks[0])
+        self.assertIn("Total: 0 passengers", blocks[1])
+        self.assertIn("1. Brown, Eve", blocks[2])
+
+        by_origin = self.read(self.client.get(reverse("manifests"), {"origin": "jfk"}))
+        self.assertEqual(len(by_origin.splitlines()), 4)
+
+    def test_manifests_for_a_day(self):
+        day = timezone.localdate(self.first.departure).isoformat()
+        lines = self.read(self.client.get(reverse("manifests"), {"date": day})).splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(self.client.get(reverse("manifests"), {"date": "soon"}).status_code, 400)
+
+    def test_flight_deleted_between_queries(self):
+        bookings = manifests._bookings
+        flight_id = self.first.id
+
+        class Snapshot:
+            # Reads the bookings, then deletes a flight before the flights
+            # query runs.
+            def __init__(self, flights):
+                self.queryset = bookings(flights)
+
+            def iterator(self, chunk_size):
+                rows = list(self.queryset)
+                Flight.objects.filter(pk=flight_id).delete()
+                return iter(rows)
+
+        with mock.patch.object(manifests, "_bookings", Snapshot):
+            text = "".join(manifests.text_manifest(Flight.objects.all()))
+        blocks = text.strip().split("\n\n")
+        self.assertEqual(len(blocks), 2)
+        self.assertIn("Total: 0 passengers", blocks[0])
+        self.assertIn("Total: 3 passengers", blocks[1])
+
+    def test_errors(self):
+        self.assertEqual(self.client.get(reverse("manifests"), {"ids": "1,x"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("manifest", args=(999,))).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("manifest", args=(self.first.id,))).status_code, 403)
+
+
+class AnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.waw = Airport.objects.create(code="WAW", city="Warsaw")
+        cls.jfk = Airport.objects.create(code="JFK", city="NewYork")
+        cls.lhr = Airport.objects.create(code="LHR", city="London")
+        cls.waw_jfk = [Flight.objects.create(origin=cls.waw, destination=cls.jfk, duration=d) for d in (600, 640)]
+        Flight.objects.create(origin=cls.jfk, destination=cls.lhr, duration=420)
+        for i in range(3):
+            passenger = Passenger.objects.create(first="Ann", last=f"Smith{i}")
+            book_passengers(cls.waw_jfk[i % 2], [passenger.id])
+
+    def test_refresh_stats(self):
+        call_command("refresh_stats", stdout=io.StringIO())
+        route = RouteStats.objects.get(origin=self.waw, destination=self.jfk)
+        self.assertEqual((route.flights, route.average_duration, route.passengers), (2, 620, 3))
+        jfk = AirportStats.objects.get(airport=self.jfk)
+        self.assertEqual((jfk.departures, jfk.arrivals, jfk.passengers_arriving), (1, 2, 3))
+
+    def test_refresh_updates_rows_in_place(self):
+        call_command("refresh_stats", stdout=io.StringIO())
+        before = RouteStats.objects.get(origin=self.waw, destination=self.jfk)
+        Flight.objects.create(origin=self.waw, destination=self.jfk, duration=620)
+        call_command("refresh_stats", stdout=io.StringIO())
+        after = RouteStats.objects.get(origin=self.waw, destination=self.jfk)
+        self.assertEqual((after.id, after.flights), (before.id, 3))
+        self.assertGreater(after.updated_at, before.updated_at)
+
+    def test_flight_changes_refresh_incrementally(self):
+        call_command("refresh_stats", stdout=io.StringIO())
+        flight = Flight.objects.get(origin=self.jfk)
+        with self.captureOnCommitCallbacks(execute=True):
+            flight.destination = self.waw
+            flight.save()
+        self.assertFalse(RouteStats.objects.filter(origin=self.jfk, destination=self.lhr).exists())
+        self.assertEqual(RouteStats.objects.get(origin=self.jfk, destination=self.waw).flights, 1)
+        self.assertEqual(AirportStats.objects.get(airport=self.lhr).arrivals, 0)
+
+    def test_cascades_refresh_once_per_transaction(self):
+        waw, jfk, lhr = self.waw.id, self.jfk.id, self.lhr.id
+        with mock.patch("flights.signals.refresh_routes") as routes, mock.patch("flights.signals.refresh_airports") as airports:
+            with self.captureOnCommitCallbacks(execute=True):
+                Airport.objects.get(pk=jfk).delete()
+        routes.assert_called_once_with({(waw, jfk), (jfk, lhr)})
+        airports.assert_called_once_with({waw, jfk, lhr})
+
+    def test_endpoint_reads_summaries(self):
+        call_command("refresh_stats", stdout=io.StringIO())
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse("analytics"), {"order": "flights"}).json()
+        self.assertEqual([r["origin"]["code"] for r in data["routes"]], ["WAW", "JFK"])
+        self.assertEqual(data["airports"][0]["code"], "WAW")
+
+        data = self.client.get(reverse("analytics"), {"airport": "lhr"}).json()
+        self.assertEqual(len(data["routes"]), 1)
+        self.assertEqual(self.client.get(reverse("analytics"), {"order": "x"}).status_code, 400)
+
+
+class LoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.user = User.objects.create_user("agent", password="secret")
+
+    def login(self, password="secret"):
+        return self.client.post(reverse("login"), {"username": "agent", "password": password})
+
+    def test_changed_iterations_rehash_on_login(self):
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertRedirects(self.login(), reverse("index"), fetch_redirect_response=False)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$2000$"))
+
+    def test_failed_logins_are_rate_limited(self):
+        for _ in range(5):
+            self.assertEqual(self.login("wrong").status_code, 200)
+        with mock.patch("flights.views.authenticate") as authenticate:
+            response = self.login()
+        self.assertEqual(response.status_code, 429)
+        authenticate.assert_not_called()
+
+    def test_success_clears_failures(self):
+        for _ in range(4):
+            self.login("wrong")
+        self.login()
+        self.client.logout()
+        for _ in range(4):
+            self.assertEqual(self.login("wrong").status_code, 200)
+
+
+class JobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("agent", password="secret")
+        cls.waw = Airport.objects.create(code="WAW", city="Warsaw")
+        cls.jfk = Airport.objects.create(code="JFK", city="NewYork")
+        flights = [Flight.objects.create(origin=cls.waw, destination=cls.jfk, duration=600) for _ in range(3)]
+        passenger = Passenger.objects.create(first="Ann", last="Smith")
+        passenger.flights.set(flights)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    @override_settings(JOB_TIMEOUT=60)
+    def test_only_jobs_of_dead_workers_are_requeued(self):
+        long_ago = timezone.now() - timedelta(hours=2)
+        # Running in this process, on a dead process here, and elsewhere.
+        workers = [f"{HOST}:{os.getpid()}", f"{HOST}:{2 ** 30}", "elsewhere:1"]
+        jobs = [
+            Job.objects.create(task="delete_airport", status=Job.RUNNING, run_after=long_ago, started_at=long_ago, worker=worker)
+            for worker in workers
+        ]
+        self.assertEqual(requeue_stale(), 2)
+        self.assertEqual(
+            [Job.objects.get(pk=job.pk).status for job in jobs],
+            [Job.RUNNING, Job.QUEUED, Job.QUEUED],
+        )
+
+    @override_settings(JOB_RETRY_BACKOFF=60)
+    def test_failures_are_retried_with_backoff(self):
+        calls = []
+        self.addCleanup(TASKS.pop, "flaky")
+
+        @task(name="flaky")
+        def flaky(limit):
+            calls.append(len(calls))
+            if len(calls) < limit:
+                raise ValueError("not yet")
+            return len(calls)
+
+        job = enqueue("flaky", max_attempts=3, limit=2)
+        self.assertEqual(run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn("ValueError: not yet", job.error)
+        # Not due again for a minute.
+        self.assertEqual(run_pending(), 0)
+
+        Job.objects.filter(pk=job.pk).update(run_after=job.run_after - timedelta(minutes=1))
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (Job.SUCCEEDED, 2))
+
+        job = enqueue("flaky", max_attempts=1, limit=10)
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_large_airport_delete_is_queued(self):
+        with mock.patch("flights.views.BACKGROUND_DELETE_FLIGHTS", 2):
+            response = self.client.get(reverse("delete_airport", args=(self.waw.id,)))
+        self.assertRedirects(response, reverse("airports"), fetch_redirect_response=False)
+        self.assertTrue(Airport.objects.filter(pk=self.waw.id).exists())
+        job = Job.objects.get(task="delete_airport")
+
+        run_pending()
+        self.assertFalse(Airport.objects.filter(pk=self.waw.id).exists())
+        self.assertFalse(Passenger.flights.through.objects.exists())
+
+        data = self.client.get(reverse("job_status", args=(job.id,))).json()
+        self.assertEqual((data["status"], data["result"]["deleted"]), ("succeeded", 7))
+        self.assertEqual(self.client.get(reverse("job_status", args=(999,))).status_code, 404)
+
+    def test_small_airport_delete_runs_inline(self):
+        self.client.get(reverse("delete_airport", args=(self.jfk.id,)))
+        self.assertFalse(Airport.objects.filter(pk=self.jfk.id).exists())
+        self.assertFalse(Job.objects.exists())
+
+
+class JobWorkerTests(TransactionTestCase):
+    def test_run_jobs_drains_the_queue(self):
+        airport = Airport.objects.create(code="WAW", city="Warsaw")
+        jobs = [enqueue("delete_airport", airport_id=airport.id), enqueue("delete_airport", airport_id=999)]
+        out, err = io.StringIO(), io.StringIO()
+        call_command("run_jobs", "--once", "--workers", "1", stdout=out, stderr=err)
+
+        self.assertFalse(Airport.objects.exists())
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.SUCCEEDED, 1))
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+        # The test settings use the process-local cache.
+        self.assertIn("The default cache is local to this process", err.getvalue())
+
+
+class BookingCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("agent", password="secret")
+        cls.waw = Airport.objects.create(code="WAW", city="Warsaw")
+        cls.jfk = Airport.objects.create(code="JFK", city="NewYork")
+        cls.flights = [Flight.objects.create(origin=cls.waw, destination=cls.jfk, duration=600, capacity=4) for _ in range(2)]
+        cls.passengers = [Passenger.objects.create(first="Ann", last=f"Smith{i}") for i in range(3)]
+
+    def counts(self):
+        return (
+            [flight.seats_booked for flight in Flight.objects.order_by("id")],
+            [passenger.flight_count for passenger in Passenger.objects.order_by("id")],
+        )
+
+    def test_stale_passenger_saves_keep_the_counter(self):
+        ann = Passenger.objects.get(pk=self.passengers[0].pk)
+        book_passengers(self.flights[0], [ann.id])
+        ann.last = "Jones"
+        ann.save()
+        self.assertEqual(Passenger.objects.values_list("last", "flight_count").get(pk=ann.pk), ("Jones", 1))
+
+    def test_booking_service_and_orm_relation_keep_both_counters(self):
+        ann, bob, cid = self.passengers
+        book_passengers(self.flights[0], [ann.id, bob.id])
+        ann.flights.add(self.flights[1])
+        self.flights[1].passengers.add(cid)
+        self.assertEqual(self.counts(), ([2, 2], [2, 1, 1]))
+
+        unbook_passengers(self.flights[0], [bob.id])
+        self.flights[1].passengers.clear()
+        self.assertEqual(self.counts(), ([1, 0], [1, 0, 0]))
+
+    def test_deletes_release_bookings(self):
+        ann, bob, _ = self.passengers
+        book_passengers(self.flights[0], [ann.id, bob.id])
+        book_passengers(self.flights[1], [ann.id])
+        self.flights[1].delete()
+        bob.delete()
+        self.assertEqual(self.counts(), ([1], [1, 0]))
+
+    def test_deleting_a_flight_refreshes_passenger_list(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        book_passengers(self.flights[0], [self.passengers[0].id])
+        self.assertContains(self.client.get(reverse("passengers")), "(1 flights)")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flights[0].delete()
+        self.assertNotContains(self.client.get(reverse("passengers")), "(1 flights)")
+
+    def test_reconcile_rewrites_drifted_rows(self):
+        book_passengers(self.flights[0], [p.id for p in self.passengers])
+        Flight.objects.update(seats_booked=1)
+        Passenger.objects.filter(pk=self.passengers[0].pk).update(flight_count=7)
+        out = io.StringIO()
+        call_command("reconcile_counters", "--batch-size", "1", stdout=out)
+        self.assertIn("Corrected 2 flights and 1 passengers", out.getvalue())
+        self.assertEqual(self.counts(), ([3, 0], [1, 1, 1]))
+
+    def test_lists_show_counters(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse("index")), "(0/4, 0%)")
+        self.client.get(reverse("airport_board_json", args=(self.waw.id,)))
+        with self.captureOnCommitCallbacks(execute=True):
+            book_passengers(self.flights[0], [self.passengers[0].id])
+        self.assertContains(self.client.get(reverse("index")), "(1/4, 25%)")
+        self.assertContains(self.client.get(reverse("passengers")), "(1 flights)")
+        board = self.client.get(reverse("airport_board_json", args=(self.waw.id,))).json()
+        self.assertEqual(board["departures"][0]["load_factor"], 25)
+
+
+class PassengerSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("agent", password="secret")
+        waw = Airport.objects.create(code="WAW", city="Warsaw")
+        jfk = Airport.objects.create(code="JFK", city="NewYork")
+        cls.flight = Flight.objects.create(origin=waw, destination=jfk, duration=600)
+        cls.booked = Passenger.objects.create(first="Anna", last="Nowak")
+        cls.booked.flights.add(cls.flight)
+        cls.anna = Passenger.objects.create(first="Anna", last="Kowalska")
+        cls.andrew = Passenger.objects.create(first="Andrew", last="Smith")
+        cls.nancy = Passenger.objects.create(first="Nancy", last="Annis")
+
+    def search(self, query):
+        response = self.client.get(reverse("search_passengers", args=(self.flight.id,)), {"q": query})
+        return [row["id"] for row in response.json()["results"]]
+
+    def test_requires_login(self):
+        response = self.client.get(reverse("search_passengers", args=(self.flight.id,)), {"q": "an"})
+        self.assertEqual(response.status_code, 403)
+
+    def test_prefix_search_excludes_booked_passengers(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.search("an"), [self.nancy.id, self.anna.id, self.andrew.id])
+        self.assertEqual(self.search("ANN"), [self.nancy.id, self.anna.id])
+        self.assertEqual(self.search("kowalska an"), [self.anna.id])
+        self.assertEqual(self.search(""), [])
+
+
+class FullTextSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("agent", password="secret")
+        cls.waw = Airport.objects.create(code="WAW", city="Warsaw")
+        cls.krk = Airport.objects.create(code="KRK", city="Krakow")
+        cls.anna = Passenger.objects.create(first="Anna", last="Kowalski")
+        cls.jan = Passenger.objects.create(first="Jan", last="Kowalska")
+        cls.ewa = Passenger.objects.create(first="Ewa", last="Nowak")
+
+    def vocabulary(self):
+        return {term: counts for term, *counts in SearchTerm.objects.values_list("term", "airports", "first_names", "last_names")}
+
+    def test_signals_keep_vocabulary_in_step(self):
+        Passenger.objects.create(first="Anna", last="Nowak")
+        Passenger.objects.create(first="Warsaw", last="Anna")
+        self.jan.last = "Nowak"
+        self.jan.save()
+        self.ewa.delete()
+        vocabulary = self.vocabulary()
+        self.assertEqual(vocabulary["anna"], [0, 2, 1])
+        self.assertEqual(vocabulary["nowak"], [0, 0, 2])
+        self.assertEqual(vocabulary["warsaw"], [1, 1, 0])
+        self.assertNotIn("kowalska", vocabulary)
+        self.assertNotIn("ewa", vocabulary)
+        rebuild_terms()
+        self.assertEqual(self.vocabulary(), vocabulary)
+
+    def test_exact_prefix_and_misspelled_names(self):
+        names = lambda query: [p["name"] for p in find(query)["passengers"]]
+        self.assertEqual(names("kowalski"), ["Anna Kowalski", "Jan Kowalska"])
+        self.assertEqual(set(names("Kowalsky")), {"Anna Kowalski", "Jan Kowalska"})
+        self.assertEqual(set(names("kowa")), {"Anna Kowalski", "Jan Kowalska"})
+        self.assertEqual(names("kowalska anna"), ["Anna Kowalski", "Jan Kowalska"])
+        self.assertEqual(names("nowk ewa"), ["Ewa Nowak"])
+        self.assertEqual(names("zzz"), [])
+
+    def test_endpoint_hides_passengers_from_anonymous_users(self):
+        response = self.client.get(reverse("search"), {"q": "warsw"})
+        self.assertEqual([a["code"] for a in response.json()["airports"]], ["WAW"])
+        self.assertNotIn("passengers", response.json())
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("search"), {"q": "krakow kowalski", "limit": 1})
+        self.assertEqual(response.json()["airports"][0]["code"], "KRK")
+        self.assertEqual([p["id"] for p in response.json()["passengers"]], [self.anna.id])
+
+    def test_long_queries_are_refused(self):
+        self.assertEqual(self.client.get(reverse("search"), {"q": "a b c d e f"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("search"), {"q": "a" * 101}).status_code, 400)
+        with self.assertNumQueries(5):
+            find("x " * 50, passengers=False)
+
+
+class StaticFilesTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        storages = {
+            "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+            "staticfiles": {"BACKEND": "flights.staticfiles.CompressedManifestStaticFilesStorage"},
+        }
+        settings = override_settings(STATIC_ROOT=root.name, STORAGES=storages)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command("collectstatic", interactive=False, verbosity=0)
+        self.root = root.name
+
+    def test_hashed_names_are_served_compressed_and_immutable(self):
+        self.assertTrue(os.path.exists(os.path.join(self.root, "flights", "styles.css.gz")))
+        url = static("flights/styles.css")
+        self.assertRegex(url, r"^/static/flights/styles\.[0-9a-f]{12}\.css$")
+        self.assertContains(self.client.get(reverse("login")), url)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="br;q=0, gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        self.assertEqual(response["Content-Type"], "text/css; charset=utf-8")
+        body = gzip.decompress(b"".join(response.streaming_content))
+        with open(os.path.join(self.root, url.removeprefix("/static/")), "rb") as original:
+            self.assertEqual(body, original.read())
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"], HTTP_ACCEPT_ENCODING="gzip").status_code, 304)
+        self.assertNotIn("Content-Encoding", self.client.get(url))
+
+    def test_unhashed_names_are_revalidated(self):
+        response = self.client.get("/static/flights/styles.css")
+        self.assertEqual(response["Cache-Control"], "public, max-age=60")
+        self.assertEqual(self.client.get("/static/flights/missing.css").status_code, 404)
+
+    async def test_runs_natively_under_asgi(self):
+        async def view(request):
+            return HttpResponse("view")
+
+        middleware = StaticFilesMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = await middleware(RequestFactory().get(static("flights/styles.css")))
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        response = await middleware(RequestFactory().get("/static/flights/missing.css"))
+        self.assertEqual(response.content, b"view")
+
+
+class BulkBookingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("agent", password="secret")
+        waw = Airport.objects.create(code="WAW", city="Warsaw")
+        jfk = Airport.objects.create(code="JFK", city="NewYork")
+        cls.flight = Flight.objects.create(origin=waw, destination=jfk, duration=600)
+        cls.passengers = Passenger.objects.bulk_create(
+            [Passenger(first="Ann", last=f"Smith{i}") for i in range(50)]
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def post(self, name, body, content_type="application/json"):
+        return self.client.post(reverse(name, args=(self.flight.id,)), body, content_type=content_type).json()
+
+    def test_books_json_batch_and_reports_rows(self):
+        self.passengers[0].flights.add(self.flight)
+        ids = [p.id for p in self.passengers]
+
+        result = self.post("bulk_book", {"passengers": ids + [ids[1], "x", 999999]})
+
+        self.assertEqual(result["booked"], ids[1:])
+        self.assertEqual([item["row"] for item in result["skipped"]], [1, 51])
+        self.assertEqual([item["row"] for item in result["errors"]], [52, 53])
+        self.assertEqual(self.flight.passengers.count(), 50)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        ids = [p.id for p in self.passengers]
+        with self.assertNumQueries(12):
+            self.post("bulk_book", ids[:5])
+        with self.assertNumQueries(12):
+            self.post("bulk_book", ids[5:])
+
+    def test_unbooks_csv_body(self):
+        self.flight.passengers.add(*self.passengers[:3])
+        body = "passenger\n" + "\n".join(str(p.id) for p in self.passengers[:5])
+
+        result = self.post("bulk_unbook", body, content_type="text/csv")
+
+        self.assertEqual(result["unbooked"], [p.id for p in self.passengers[:3]])
+        self.assertEqual(len(result["skipped"]), 2)
+        self.assertFalse(self.flight.passengers.exists())
+
+
+
+class CapacityTests(TransactionTestCase):
+    def setUp(self):
+        waw = Airport.objects.create(code="WAW", city="Warsaw")
+        jfk = Airport.objects.create(code="JFK", city="NewYork")
+        self.flight = Flight.objects.create(origin=waw, destination=jfk, duration=600, capacity=5)
+        self.passengers = Passenger.objects.bulk_create(
+            [Passenger(first="Ann", last=f"Smith{i}") for i in range(40)]
+        )
+
+    def test_bulk_booking_stops_at_capacity(self):
+        result = book_passengers(self.flight, [p.id for p in self.passengers[:8]])
+
+        self.assertEqual(len(result.changed), 5)
+        self.assertEqual(len(result.full), 3)
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_booked, 5)
+
+    def test_stale_saves_keep_the_counter(self):
+        stale = Flight.objects.get(pk=self.flight.pk)
+        book_passengers(self.flight, [p.id for p in self.passengers[:5]])
+        stale.duration = 610
+        stale.save()
+
+        self.flight.refresh_from_db()
+        self.assertEqual((self.flight.duration, self.flight.seats_booked), (610, 5))
+        self.assertEqual(len(book_passengers(self.flight, [self.passengers[5].id]).full), 1)
+        self.assertEqual(self.flight.passengers.count(), 5)
+
+    def test_concurrent_bookings_never_overbook(self):
+        def client(ids):
+            try:
+                for pk in ids:
+                    book_passengers(self.flight, [pk])
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        errors = []
+
+        threads = [threading.Thread(target=client, args=([p.id for p in self.passengers[i::8]],)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_booked, 5)
+        self.assertEqual(self.flight.passengers.count(), 5)
+
+
+class RouteSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.waw = Airport.objects.create(code="WAW", city="Warsaw")
+        cls.fra = Airport.objects.create(code="FRA", city="Frankfurt")
+        cls.lhr = Airport.objects.create(code="LHR", city="London")
+        cls.jfk = Airport.objects.create(code="JFK", city="NewYork")
+        cls.direct = Flight.objects.create(origin=cls.waw, destination=cls.jfk, duration=600)
+        cls.via_fra = [
+            Flight.objects.create(origin=cls.waw, destination=cls.fra, duration=100),
+            Flight.objects.create(origin=cls.fra, destination=cls.jfk, duration=450),
+        ]
+        cls.via_lhr = [
+            Flight.objects.create(origin=cls.waw, destination=cls.lhr, duration=150),
+            Flight.objects.create(origin=cls.lhr, destination=cls.jfk, duration=470),
+        ]
+        Flight.objects.create(origin=cls.fra, destination=cls.lhr, duration=10)
+
+    def setUp(self):
+        route_index.reset()
+
+    def search(self, **params):
+        response = self.client.get(reverse("routes"), {"from": "waw", "to": "JFK", **params})
+        return [[leg["flight"] for leg in itinerary["legs"]] for itinerary in response.json()["itineraries"]]
+
+    def test_k_fastest_itineraries(self):
+        hop = Flight.objects.get(origin=self.fra, destination=self.lhr)
+        self.assertEqual(self.search(k=4), [
+            [f.id for f in self.via_fra],
+            [self.via_fra[0].id, hop.id, self.via_lhr[1].id],
+            [self.direct.id],
+            [f.id for f in self.via_lhr],
+        ])
+
+    def test_max_legs(self):
+        self.assertEqual(self.search(k=5, max_legs=1), [[self.direct.id]])
+
+    def test_index_follows_flight_changes(self):
+        self.search()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.via_fra[1].delete()
+            self.direct.duration = 500
+            self.direct.save()
+
+        self.assertEqual(self.search(k=1), [[self.direct.id]])
+
+    def test_other_processes_rebuild_after_a_change(self):
+        # A second index stands in for the copy in another process.
+        other = RouteIndex()
+        self.assertEqual(len(other.search([self.waw.id], [self.jfk.id], k=5)), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.via_fra[0].delete()
+        self.assertEqual(len(other.search([self.waw.id], [self.jfk.id], k=5)), 2)
+
+    def test_describe_skips_deleted_flights(self):
+        results = route_index.search([self.waw.id], [self.jfk.id], k=5)
+        # Deleted without running the commit hooks that update the index.
+        self.via_lhr[1].delete()
+        itineraries = route_index.describe(results)
+        self.assertEqual(len(itineraries), 2)
+        self.assertNotIn(self.via_lhr[1].id, [leg["flight"] for itinerary in itineraries for leg in itinerary["legs"]])
+
+    def test_unknown_airport(self):
+        response = self.client.get(reverse("routes"), {"from": "WAW", "to": "XXX"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_matches_brute_force_on_random_graphs(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            airports = range(rng.randint(4, 9))
+            flights = {
+                flight_id: (*rng.sample(airports, 2), rng.randint(1, 20))
+                for flight_id in range(rng.randint(5, 30))
+            }
+            index = RouteIndex()
+            index._built, index._version = True, cache.get("flights:routes:version")
+            for flight_id, (origin, destination, duration) in flights.items():
+                index._insert(flight_id, origin, destination, duration)
+            origins, destinations = set(rng.sample(airports, 2)), set(rng.sample(airports, 2))
+            k, max_legs = rng.randint(1, 8), rng.randint(1, 4)
+
+            # Every simple itinerary that stops at the first destination reached.
+            expected = []
+            def walk(airport, cost, legs, visited):
+                if legs and airport in destinations:
+                    expected.append(cost)
+                    return
+                if len(legs) == max_legs:
+                    return
+                for flight_id, (origin, destination, duration) in flights.items():
+                    if origin == airport and destination not in visited:
+                        walk(destination, cost + duration, legs + (flight_id,), visited | {destination})
+            for origin in origins:
+                walk(origin, 0, (), {origin})
+
+            results = index.search(origins, destinations, k=k, max_legs=max_legs)
+            self.assertEqual([cost for cost, _ in results], sorted(expected)[:k])
+            for cost, legs in results:
+                airports_visited = [legs[0][1]] + [leg[2] for leg in legs]
+                self.assertEqual(len(set(airports_visited)), len(airports_visited))
+                self.assertEqual(cost, sum(leg[3] for leg in legs))
+
+
+class AirportCodeTests(TestCase):
+    def test_codes_are_stored_in_upper_case(self):
+        User.objects.create_user("agent", password="secret")
+        self.client.login(username="agent", password="secret")
+        self.client.post(reverse("create_airport"), {"code": "waw", "city": "Warsaw"})
+        self.assertEqual(Airport.objects.get().code, "WAW")
+
+        form = AirportForm({"code": "Waw", "city": "Modlin"})
+        self.assertFalse(form.is_valid())
+        self.assertIn("code", form.errors)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Airport.objects.create(code="jfk", city="NewYork")
+
+
+class AirportBoardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.waw = Airport.objects.create(code="WAW", city="Warsaw")
+        cls.jfk = Airport.objects.create(code="JFK", city="NewYork")
+        cls.flight = Flight.objects.create(origin=cls.waw, destination=cls.jfk, duration=600)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_board_is_cached_and_supports_conditional_get(self):
+        url = reverse("airport_board_json", args=(self.waw.id,))
+        response = self.client.get(url)
+        self.assertEqual(response.json()["departures"][0]["airport"], "JFK")
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+        cached = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_flight_changes_invalidate_both_airports(self):
+        lhr = Airport.objects.create(code="LHR", city="London")
+        for airport in (self.waw, self.jfk, lhr):
+            self.client.get(reverse("airport_board_json", args=(airport.id,)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flight.destination = lhr
+            self.flight.save()
+
+        self.assertIsNone(cache.get(board_key(self.jfk.id)))
+        self.assertIsNone(cache.get(board_key(lhr.id)))
+        arrivals = self.client.get(reverse("airport_board_json", args=(lhr.id,))).json()["arrivals"]
+        self.assertEqual([entry["flight"] for entry in arrivals], [self.flight.id])
+
+    def test_html_board_and_missing_airport(self):
+        self.assertContains(self.client.get(reverse("airport_board", args=(self.jfk.id,))), "Warsaw (WAW)")
+        self.assertEqual(self.client.get(reverse("airport_board", args=(999,))).status_code, 404)
+
+
+class ScheduleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.waw = Airport.objects.create(code="WAW", city="Warsaw")
+        cls.jfk = Airport.objects.create(code="JFK", city="NewYork")
+        cls.morning = datetime(2026, 10, 19, 6, 30, 0, 123456, tzinfo=dt_timezone.utc)
+
+        def flight(origin, destination, departure):
+            return Flight.objects.create(origin=origin, destination=destination, duration=600, departure=departure)
+
+        # Created out of timetable order; two share a departure to the microsecond.
+        cls.late = flight(cls.waw, cls.jfk, cls.morning + timedelta(hours=5))
+        cls.early = [flight(cls.waw, cls.jfk, cls.morning) for _ in range(2)]
+        cls.evening = flight(cls.waw, cls.jfk, cls.morning + timedelta(hours=12))
+        cls.inbound = flight(cls.jfk, cls.waw, cls.morning + timedelta(hours=1))
+
+    def test_arrival_follows_departure_and_duration(self):
+        self.assertEqual(self.late.arrival, self.morning + timedelta(hours=15))
+        self.late.duration = 60
+        self.late.save(update_fields=["duration"])
+        self.late.refresh_from_db()
+        self.assertEqual(self.late.arrival, self.morning + timedelta(hours=6))
+
+    def test_api_window_in_timetable_order(self):
+        params = {
+            "fields": "id", "origin": "WAW", "limit": 1,
+            "departs_from": "2026-10-19T06:00", "departs_until": "2026-10-19T12:00",
+        }
+        ids, url = [], reverse("api_flights") + "?" + urlencode(params)
+        while url:
+            data = self.client.get(url).json()
+            ids += [row["id"] for row in data["results"]]
+            url = data["next"]
+        self.assertEqual(ids, [self.early[0].id, self.early[1].id, self.late.id])
+
+        data = self.client.get(reverse("api_flights"), {"arrives_until": "2026-10-19T18:00Z"}).json()
+        self.assertEqual([row["id"] for row in data["results"]], [self.early[0].id, self.early[1].id, self.inbound.id])
+        self.assertEqual(self.client.get(reverse("api_flights"), {"date": "tomorrow"}).status_code, 400)
+
+    def test_flight_list_filters_by_origin_and_date(self):
+        response = self.client.get(reverse("index"), {"origin": "jfk", "date": "2026-10-19", "after": ""})
+        self.assertEqual([flight.id for flight in response.context["flights"]], [self.inbound.id])
+        self.assertContains(response, "&amp;origin=jfk&amp;date=2026-10-19")
+        self.assertEqual(self.client.get(reverse("index"), {"date": "19.10.2026"}).status_code, 400)
+
+    def test_board_in_timetable_order(self):
+        data = self.client.get(reverse("airport_board_json", args=(self.waw.id,))).json()
+        self.assertEqual(
+            [entry["flight"] for entry in data["departures"]],
+            [self.early[0].id, self.early[1].id, self.late.id, self.evening.id],
+        )
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.waw = Airport.objects.create(code="WAW", city="Warsaw")
+        cls.jfk = Airport.objects.create(code="JFK", city="NewYork")
+        cls.flights = [
+            Flight.objects.create(origin=cls.waw, destination=cls.jfk, duration=100 * i) for i in range(1, 6)
+        ]
+        Flight.objects.create(origin=cls.jfk, destination=cls.waw, duration=300)
+
+    def test_field_selection_filters_and_cursor_links(self):
+        response = self.client.get(reverse("api_flights"), {
+            "fields": "id,duration", "origin": "waw", "min_duration": 200, "limit": 2,
+        })
+        data = response.json()
+        self.assertEqual(data["results"], [
+            {"id": self.flights[1].id, "duration": 200},
+            {"id": self.flights[2].id, "duration": 300},
+        ])
+
+        data = self.client.get(data["next"]).json()
+        self.assertEqual([row["duration"] for row in data["results"]], [400, 500])
+        self.assertIsNone(data["next"])
+
+    def test_etag_and_errors(self):
+        url = reverse("api_flights_detail", args=(self.flights[0].id,))
+        response = self.client.get(url)
+        self.assertEqual(response.json()["origin"], "WAW")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        self.assertEqual(self.client.get(reverse("api_flights"), {"fields": "secret"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("api_flights"), {"max_duration": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("api_passengers")).status_code, 403)
+
+    def test_ndjson_export_streams_every_row(self):
+        response = self.client.get(reverse("api_airports_export"), {"fields": "code"})
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{"code": "WAW"}, {"code": "JFK"}])
+
+    def test_timestamps_keep_microseconds(self):
+        departure = datetime(2026, 1, 2, 8, 0, 11, 507123, tzinfo=dt_timezone.utc)
+        Flight.objects.filter(pk=self.flights[0].pk).update(departure=departure)
+        expected = "2026-01-02T08:00:11.507123+00:00"
+
+        detail = self.client.get(reverse("api_flights_detail", args=(self.flights[0].id,)), {"fields": "departure"})
+        self.assertEqual(detail.json()["departure"], expected)
+        export = self.client.get(reverse("api_flights_export"), {"fields": "id,departure"})
+        rows = [json.loads(line) for line in b"".join(export.streaming_content).decode().splitlines()]
+        self.assertIn({"id": self.flights[0].id, "departure": expected}, rows)
+
+
+class ImportExportTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as handle:
+            handle.write(text)
+        return path
+
+    def test_round_trip_with_row_errors(self):
+        call_command(
+            "import_data", "airports", self.write("a.csv", "code,city\nwaw,Warsaw\nJFK,NewYork\n"),
+            stdout=io.StringIO(), stderr=io.StringIO(),
+        )
+        flights = self.write("f.ndjson", (
+            '{"origin": "WAW", "destination": "JFK", "duration": 600, "departure": "2026-01-02T08:00Z"}\n'
+            '{"origin": "WAW", "destination": "XXX", "duration": 1}\n'
+            '{"id": 40, "origin": "JFK", "destination": "WAW", "duration": 500, "capacity": 90, "departure": "2026-01-01"}\n'
+        ))
+        stderr = io.StringIO()
+        call_command("import_data", "flights", flights, stdout=io.StringIO(), stderr=stderr)
+
+        self.assertIn("line 2: unknown destination airport XXX", stderr.getvalue())
+        self.assertEqual(Flight.objects.get(pk=40).capacity, 90)
+        self.assertEqual(Flight.objects.get(pk=41).arrival.isoformat(), "2026-01-02T18:00:00+00:00")
+        self.assertEqual(Flight.objects.exclude(pk=40).get().seats_booked, 0)
+
+        out = os.path.join(self.directory.name, "out.csv")
+        call_command("export_data", "flights", out, "--fields", "id,origin,duration", stderr=io.StringIO())
+        with open(out) as handle:
+            self.assertEqual(handle.read().splitlines(), ["id,origin,duration", "40,JFK,500", "41,WAW,600"])
+
+    def test_updates_keep_departures_and_exports_keep_microseconds(self):
+        waw = Airport.objects.create(code="WAW", city="Warsaw")
+        departure = datetime(2026, 1, 2, 8, 0, 0, 123456, tzinfo=dt_timezone.utc)
+        flight = Flight.objects.create(origin=waw, destination=waw, duration=60, departure=departure)
+        path = self.write("f.ndjson", f'{{"id": {flight.id}, "origin": "WAW", "destination": "WAW", "duration": 90}}\n')
+        call_command("import_data", "flights", path, stdout=io.StringIO(), stderr=io.StringIO())
+        flight.refresh_from_db()
+        self.assertEqual((flight.departure, flight.arrival), (departure, departure + timedelta(minutes=90)))
+
+        out = os.path.join(self.directory.name, "out.ndjson")
+        call_command("export_data", "flights", out, "--fields", "id,departure", stderr=io.StringIO())
+        with open(out) as handle:
+            self.assertEqual(json.loads(handle.read())["departure"], "2026-01-02T08:00:00.123456+00:00")
+
+    def test_invalid_codes_are_row_errors_and_moves_touch_old_airports(self):
+        stderr = io.StringIO()
+        path = self.write("a.csv", "code,city\nWAW,Warsaw\nJFK,NewYork\nLHR,London\nLONG,Nowhere\nK1,Nowhere\n")
+        call_command("import_data", "airports", path, stdout=io.StringIO(), stderr=stderr)
+        self.assertIn("line 5: invalid code: 'LONG' is not an airport code", stderr.getvalue())
+        self.assertIn("line 6: invalid code: 'K1' is not an airport code", stderr.getvalue())
+        self.assertEqual(Airport.objects.count(), 3)
+
+        waw, jfk, lhr = (Airport.objects.get(code=code) for code in ("WAW", "JFK", "LHR"))
+        flight = Flight.objects.create(origin=waw, destination=jfk, duration=60)
+        importer = FlightImporter(batch_size=1)
+        importer.save([importer.parse({"id": flight.id, "origin": "LHR", "destination": "WAW", "duration": 60})])
+        self.assertEqual(importer.touched_airports, {waw.id, jfk.id, lhr.id})
+
+    def test_overbooking_rows_are_rejected_without_failing_the_batch(self):
+        waw = Airport.objects.create(code="WAW", city="Warsaw")
+        small = Flight.objects.create(origin=waw, destination=waw, duration=60, capacity=2)
+        other = Flight.objects.create(origin=waw, destination=waw, duration=60)
+        ann, bob, cid = (Passenger.objects.create(first=name, last="Smith") for name in ("Ann", "Bob", "Cid"))
+        small.passengers.add(ann)
+        path = self.write("b.csv", "passenger,flight\n" + "".join(
+            f"{p},{f}\n" for p, f in [
+                (ann.id, small.id), (bob.id, small.id), (cid.id, small.id), (cid.id, other.id), (ann.id, 999),
+            ]
+        ))
+        stderr, stdout = io.StringIO(), io.StringIO()
+        # Small chunks split every IN list.
+        with mock.patch("flights.transfer.CHUNK_SIZE", 1):
+            call_command("import_data", "bookings", path, "--batch-size", "2", stdout=stdout, stderr=stderr)
+
+        self.assertIn(f"line 4: flight {small.id} is full: 2 seats", stderr.getvalue())
+        self.assertEqual(stdout.getvalue().strip(), "2 created, 0 updated, 2 skipped, 1 errors")
+        self.assertEqual(set(small.passengers.all()), {ann, bob})
+        self.assertEqual(set(cid.flights.all()), {other})
+        self.assertEqual(Flight.objects.get(pk=small.id).seats_booked, 2)
+
+        flights = self.write("f.csv", (
+            "id,origin,destination,duration,capacity\n"
+            f"{small.id},WAW,WAW,60,1\n{other.id},WAW,WAW,60,5\n"
+        ))
+        stderr = io.StringIO()
+        call_command("import_data", "flights", flights, stdout=io.StringIO(), stderr=stderr)
+        self.assertIn(f"line 2: capacity 1 of flight {small.id} is below its 2 booked seats", stderr.getvalue())
+        self.assertEqual(Flight.objects.get(pk=small.id).capacity, 2)
+        self.assertEqual(Flight.objects.get(pk=other.id).capacity, 5)
+
+    def test_non_object_lines_and_booking_field_subsets(self):
+        waw = Airport.objects.create(code="WAW", city="Warsaw")
+        flight = Flight.objects.create(origin=waw, destination=waw, duration=60)
+        ann = Passenger.objects.create(first="Ann", last="Smith")
+        path = self.write("b.ndjson", f'[1, 2]\n{{"passenger": {ann.id}, "flight": {flight.id}}}\n')
+        stderr, stdout = io.StringIO(), io.StringIO()
+        call_command("import_data", "bookings", path, stdout=stdout, stderr=stderr)
+        self.assertIn("line 1: expected a JSON object", stderr.getvalue())
+        self.assertEqual(stdout.getvalue().strip(), "1 created, 0 updated, 0 skipped, 1 errors")
+
+        out = os.path.join(self.directory.name, "out.csv")
+        call_command("export_data", "bookings", out, "--fields", "flight", stderr=io.StringIO())
+        with open(out) as handle:
+            self.assertEqual(handle.read().splitlines(), ["flight", str(flight.id)])
+
+    def test_resume_skips_committed_rows(self):
+        path = self.write("p.csv", "first,last\nAnn,Smith\nBob,Jones\nCid,Brown\n")
+        with open(f"{path}.checkpoint", "w") as handle:
+            handle.write("2")
+
+        call_command("import_data", "passengers", path, "--resume", stdout=io.StringIO(), stderr=io.StringIO())
+
+        self.assertEqual(list(Passenger.objects.values_list("first", flat=True)), ["Cid"])
+        self.assertFalse(os.path.exists(f"{path}.checkpoint"))
@@ -0,0 +1,341 @@
+import csv
+import itertools
+import json
+from dataclasses import dataclass
+from typing import Callable
+
+from django.db import connection
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+from .api import RESOURCES
+from .booking import CHUNK_SIZE
+from .counters import recount
+from .models import Airport, Flight, Passenger, arrival_time
+from .pagination import CursorEncoder
+from .schedule import parse_moment
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, row)`` pairs from a CSV or NDJSON stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_number, RowError(f"invalid JSON: {exc}")
+                continue
+            yield line_number, row if isinstance(row, dict) else RowError("expected a JSON object")
+
+
+def write_rows(stream, fmt, fieldnames, rows):
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=fieldnames)
+        writer.writeheader()
+        for count, row in enumerate(rows, start=1):
+            writer.writerow(row)
+            yield count
+        return
+
+    for count, row in enumerate(rows, start=1):
+        stream.write(json.dumps(row, cls=CursorEncoder) + "\n")
+        yield count
+
+
+def _value(row, name, convert=str, required=True):
+    value = row.get(name)
+    if value in (None, ""):
+        if required:
+            raise RowError(f"missing {name}")
+        return None
+    try:
+        return convert(value)
+    except (TypeError, ValueError):
+        raise RowError(f"invalid {name}: {value!r}")
+
+
+def _text(row, name, model):
+    # Checked here so that over-long values become row errors rather than a
+    # DataError failing the whole batch on PostgreSQL.
+    value = _value(row, name)
+    limit = model._meta.get_field(name).max_length
+    if len(value) > limit:
+        raise RowError(f"invalid {name}: longer than {limit} characters")
+    return value
+
+
+def _code(row, name):
+    code = _value(row, name).upper()
+    if not code.isalpha() or len(code) > Airport._meta.get_field("code").max_length:
+        raise RowError(f"invalid {name}: {code!r} is not an airport code")
+    return code
+
+
+def _insert(model, fields, rows, batch_size):
+    # Plain executemany: for wide batches of new rows, building model
+    # instances and compiling bulk_create SQL costs more than the inserts.
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(model._meta.get_field(name).column) for name in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    with connection.cursor() as cursor:
+        for batch in batches(rows, batch_size):
+            cursor.executemany(f"INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})", batch)
+
+
+def _update(model, fields, rows, batch_size):
+    # One prepared UPDATE per row through executemany; bulk_update's CASE
+    # expressions grow with the batch and are far slower on large batches.
+    quote = connection.ops.quote_name
+    assignments = ", ".join(f"{quote(model._meta.get_field(name).column)} = %s" for name in fields)
+    with connection.cursor() as cursor:
+        for batch in batches(rows, batch_size):
+            cursor.executemany(
+                f"UPDATE {quote(model._meta.db_table)} SET {assignments} WHERE {quote(model._meta.pk.column)} = %s",
+                [row[1:] + row[:1] for row in batch],
+            )
+
+
+def _existing(queryset, field, values, *fields):
+    # values_list() of the rows whose ``field`` is in ``values``, with the IN
+    # list split into chunks of CHUNK_SIZE.
+    for chunk in batches(sorted(set(values)), CHUNK_SIZE):
+        yield from queryset.filter(**{f"{field}__in": chunk}).values_list(*fields)
+
+
+def _upsert(model, fields, rows, batch_size, existing=None):
+    """
+    Write ``rows`` (tuples whose first item is the id or None) to ``model``
+    in statements of ``batch_size`` rows: existing ids are updated in place,
+    the rest inserted. ``existing`` may pass the ids known to exist.
+    """
+    if existing is None:
+        ids = [row[0] for row in rows if row[0] is not None]
+        existing = {pk for pk, in _existing(model.objects, "pk", ids, "pk")}
+
+    # Columns missing from the input get their model defaults on insert.
+    omitted = [f for f in model._meta.concrete_fields if not f.primary_key and f.name not in fields]
+    defaults = tuple(f.get_default() for f in omitted)
+    columns = [*fields, *(f.name for f in omitted)]
+    with_id = [row + defaults for row in rows if row[0] is not None and row[0] not in existing]
+    without_id = [row[1:] + defaults for row in rows if row[0] is None]
+    if with_id:
+        _insert(model, ["id", *columns], with_id, batch_size)
+    if without_id:
+        _insert(model, columns, without_id, batch_size)
+    updates = [row for row in rows if row[0] in existing]
+    if updates:
+        _update(model, fields, updates, batch_size)
+    return len(with_id) + len(without_id), len(updates)
+
+
+class Importer:
+    """
+    Turns rows of one dataset into bulk writes. parse() validates a single
+    row and raises RowError for bad input; save() writes a batch of parsed
+    rows and returns ``(created, updated, skipped)`` counts, leaving out
+    items the database would refuse; those are listed in ``rejected`` as
+    ``(index, RowError)`` pairs for the caller to report.
+    """
+
+    # Model whose primary keys may be given explicitly in the input.
+    model = None
+    # Whether the rows feed the search vocabulary.
+    searchable = False
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.touched_airports = set()
+        self.rejected = []
+
+    def parse(self, row):
+        raise NotImplementedError
+
+    def save(self, items):
+        raise NotImplementedError
+
+
+class AirportImporter(Importer):
+    # Airports are matched on their unique code.
+    searchable = True
+
+    def parse(self, row):
+        return _code(row, "code"), _text(row, "city", Airport)
+
+    def save(self, items):
+        rows = dict(items)
+        existing = dict(_existing(Airport.objects, "code", rows, "code", "id"))
+        updates = [Airport(pk=existing[code], code=code, city=city) for code, city in rows.items() if code in existing]
+        creates = [Airport(code=code, city=city) for code, city in rows.items() if code not in existing]
+        Airport.objects.bulk_create(creates, batch_size=self.batch_size)
+        Airport.objects.bulk_update(updates, ["city"], batch_size=self.batch_size)
+        self.touched_airports.update(existing.values())
+        return len(creates), len(updates), len(items) - len(rows)
+
+
+class FlightImporter(Importer):
+    model = Flight
+
+    def __init__(self, batch_size):
+        super().__init__(batch_size)
+        # Airport codes are resolved from memory instead of once per row.
+        self.airports = dict(Airport.objects.values_list("code", "id"))
+
+    def _airport(self, row, name):
+        code = _code(row, name)
+        if code not in self.airports:
+            raise RowError(f"unknown {name} airport {code}")
+        return self.airports[code]
+
+    fields = ["origin", "destination", "duration", "capacity", "departure", "arrival"]
+
+    def parse(self, row):
+        capacity = _value(row, "capacity", int, required=False)
+        return (
+            _value(row, "id", int, required=False),
+            self._airport(row, "origin"),
+            self._airport(row, "destination"),
+            _value(row, "duration", int),
+            Flight._meta.get_field("capacity").default if capacity is None else capacity,
+            _value(row, "departure", parse_moment, required=False),
+        )
+
+    def save(self, items):
+        # Flights updated without a departure keep theirs; only new ones
+        # default to now. The airports updated flights leave need their
+        # boards refreshed too. Capacities below the seats already booked
+        # are rejected.
+        ids = [item[0] for item in items if item[0] is not None]
+        departures, booked = {}, {}
+        for pk, departure, seats_booked, origin_id, destination_id in _existing(
+            Flight.objects, "pk", ids, "pk", "departure", "seats_booked", "origin_id", "destination_id",
+        ):
+            departures[pk] = departure
+            booked[pk] = seats_booked
+            self.touched_airports.update((origin_id, destination_id))
+        now = timezone.now()
+        prepare = Flight._meta.get_field("departure").get_db_prep_save
+        rows = []
+        for index, (pk, origin_id, destination_id, duration, capacity, departure) in enumerate(items):
+            if capacity < booked.get(pk, 0):
+                self.rejected.append((index, RowError(
+                    f"capacity {capacity} of flight {pk} is below its {booked[pk]} booked seats"
+                )))
+                continue
+            departure = departure or departures.get(pk) or now
+            self.touched_airports.update((origin_id, destination_id))
+            # Arrivals are derived, as in Flight.save(); an input arrival is
+            # ignored. Written with raw SQL, so converted for the database here.
+            rows.append((
+                pk, origin_id, destination_id, duration, capacity,
+                prepare(departure, connection), prepare(arrival_time(departure, duration), connection),
+            ))
+        return (*_upsert(Flight, self.fields, rows, self.batch_size, existing=set(departures)), 0)
+
+
+class PassengerImporter(Importer):
+    model = Passenger
+    searchable = True
+
+    fields = ["first", "last"]
+
+    def parse(self, row):
+        return _value(row, "id", int, required=False), _text(row, "first", Passenger), _text(row, "last", Passenger)
+
+    def save(self, items):
+        return (*_upsert(Passenger, self.fields, items, self.batch_size), 0)
+
+
+class BookingImporter(Importer):
+    # Rows are (passenger, flight) id pairs. Pairs naming unknown rows and
+    # bookings that already exist are skipped, and bookings beyond a
+    # flight's capacity rejected; booking counters are recomputed for every
+    # flight and passenger in the batch.
+    def parse(self, row):
+        return _value(row, "passenger", int), _value(row, "flight", int)
+
+    def save(self, items):
+        through = Passenger.flights.through
+        first = {}
+        for index, pair in enumerate(items):
+            first.setdefault(pair, index)
+        passengers = {pk for pk, in _existing(Passenger.objects, "pk", (p for p, _ in first), "pk")}
+        flights = {pk for pk, in _existing(Flight.objects, "pk", (f for _, f in first), "pk")}
+        pairs = [(p, f) for p, f in first if p in passengers and f in flights]
+
+        # Inserted first and trimmed afterwards: whether a pair is a new
+        # booking is only known once the conflicts have been ignored.
+        last = through.objects.aggregate(last=Max("pk"))["last"] or 0
+        through.objects.bulk_create(
+            [through(passenger_id=p, flight_id=f) for p, f in pairs],
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+        new = through.objects.filter(pk__gt=last)
+        overbooked = _existing(
+            Flight.objects.annotate(total=Count("passengers")).filter(total__gt=F("capacity")),
+            "pk", flights, "pk", "capacity", "total",
+        )
+        rejected = []
+        for flight_id, capacity, total in list(overbooked):
+            # The last pairs of the input for that flight give way.
+            excess = list(new.filter(flight_id=flight_id).order_by("-pk").values_list("pk", "passenger_id")[:total - capacity])
+            through.objects.filter(pk__in=[pk for pk, _ in excess]).delete()
+            rejected += [
+                (first[passenger_id, flight_id], RowError(f"flight {flight_id} is full: {capacity} seats"))
+                for _, passenger_id in reversed(excess)
+            ]
+        created = new.count()
+        self.rejected += rejected
+
+        recount(Flight, flights)
+        recount(Passenger, passengers)
+        return created, 0, len(items) - created - len(rejected)
+
+
+def _booking_rows(fieldnames):
+    through = Passenger.flights.through
+    columns = {"passenger": "passenger_id", "flight": "flight_id"}
+    rows = through.objects.order_by("id").values_list(*(columns[field] for field in fieldnames))
+    for values in rows.iterator(chunk_size=5000):
+        yield dict(zip(fieldnames, values))
+
+
+def _resource_rows(name):
+    def rows(fieldnames):
+        resource = RESOURCES[name]
+        paths = [resource.fields[field] for field in fieldnames]
+        queryset = resource.model.objects.order_by(*resource.ordering).values_list(*paths)
+        for values in queryset.iterator(chunk_size=5000):
+            yield dict(zip(fieldnames, values))
+    return rows
+
+
+@dataclass
+class Dataset:
+    importer: type
+    fieldnames: list
+    rows: Callable
+
+
+DATASETS = {
+    "airports": Dataset(AirportImporter, list(RESOURCES["airports"].fields), _resource_rows("airports")),
+    "flights": Dataset(FlightImporter, list(RESOURCES["flights"].fields), _resource_rows("flights")),
+    "passengers": Dataset(PassengerImporter, list(RESOURCES["passengers"].fields), _resource_rows("passengers")),
+    "bookings": Dataset(BookingImporter, ["passenger", "flight"], _booking_rows),
+}
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
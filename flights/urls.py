@@ -1,25 +1,52 @@
 from django.urls import path
 
-from . import views
+from . import api, async_views, views
 
 urlpatterns = [
     path("", views.index, name="index"),
+    path("routes", views.routes, name="routes"),
+    path("analytics", views.analytics, name="analytics"),
+    path("search", views.search, name="search"),
+    path("performance", views.performance, name="performance"),
+    path("jobs/<int:job_id>", views.job_status, name="job_status"),
     path("login", views.login_view, name="login"),
     path("logout", views.logout_view, name="logout"),
     path("registration", views.registration, name="registration"),
     path("airports", views.airports, name="airports"),
     path("passengers", views.passengers, name="passengers"),
     path("<int:flight_id>", views.flight, name="flight"),
+    path("<int:flight_id>/manifest", views.manifest, name="manifest"),
+    path("manifests", views.manifests, name="manifests"),
     path("<int:flight_id>/book", views.book, name="book"),
     path("<int:flight_id>/unbook", views.unbook, name="unbook"),
+    path("<int:flight_id>/book/bulk", views.bulk_book, name="bulk_book"),
+    path("<int:flight_id>/unbook/bulk", views.bulk_unbook, name="bulk_unbook"),
+    path("<int:flight_id>/passengers/search", views.search_passengers, name="search_passengers"),
     path('airports/create/', views.create_airport, name='create_airport'),
+    path('airports/<int:airport_id>/board', views.airport_board, name='airport_board'),
+    path('airports/<int:airport_id>/board.json', views.airport_board_json, name='airport_board_json'),
     path('airports/<int:airport_id>/update/', views.update_airport, name='update_airport'),
     path('airports/<int:airport_id>/delete/', views.delete_airport, name='delete_airport'),
+    path("passengers/itineraries", views.itinerary_batch, name="itinerary_batch"),
+    path("passengers/<int:passenger_id>", views.itinerary, name="itinerary"),
+    path("passengers/<int:passenger_id>/itinerary.json", views.itinerary_json, name="itinerary_json"),
     path('passengers/create/', views.create_passenger, name='create_passenger'),
     path('passengers/<int:passenger_id>/update/', views.update_passenger, name='update_passenger'),
     path('passengers/<int:passenger_id>/delete/', views.delete_passenger, name='delete_passenger'),
     path('create/', views.create_flight, name='create_flight'),
     path('<int:flight_id>/update/', views.update_flight, name='update_flight'),
     path('<int:flight_id>/delete/', views.delete_flight, name='delete_flight'),
-    
+    path("async/", async_views.index, name="async_index"),
+    path("async/airports", async_views.airports, name="async_airports"),
+    path("async/passengers", async_views.passengers, name="async_passengers"),
+    path("async/<int:flight_id>", async_views.flight, name="async_flight"),
+    path("api/v1/", api.index_view, name="api_index"),
+] + [
+    pattern
+    for name in api.RESOURCES
+    for pattern in (
+        path(f"api/v1/{name}", api.list_view, {"name": name}, name=f"api_{name}"),
+        path(f"api/v1/{name}/export", api.export_view, {"name": name}, name=f"api_{name}_export"),
+        path(f"api/v1/{name}/<int:pk>", api.detail_view, {"name": name}, name=f"api_{name}_detail"),
+    )
 ]
\ No newline at end of file
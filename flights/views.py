@@ -1,41 +1,188 @@
+import csv
+import io
+import json
+
+from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import render
-from django.http import HttpResponseRedirect, Http404
+from django.http import HttpResponseBadRequest, HttpResponseRedirect, Http404, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.core.exceptions import ValidationError
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-
-from .models import Flight, Passenger, Airport
+from django.db.models import Exists, OuterRef, Q
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlencode
+from django.views.decorators.http import condition, require_POST
+
+from .boards import get_board
+from .booking import book_passengers, unbook_passengers
+from .models import Flight, Passenger, Airport, AirportStats, Job, RouteStats
+from .instrumentation import stats
+from .manifests import FORMATS as MANIFEST_FORMATS
+from .itineraries import MAX_BATCH, describe, itineraries, itinerary_queryset
+from .fragments import fragment_key
+from .jobs import enqueue
 from .forms import AirportForm, PassengerForm, FlightForm, RegistrationForm
+from .pagination import paginate
+from .querybudget import query_budget
+from .ratelimit import login_blocked, login_failed, login_succeeded
+from .search import MAX_QUERY_LENGTH, MAX_WORDS, find, search_by_name
+from .routing import DEFAULT_MAX_LEGS, route_index
+from .schedule import WINDOW_PARAMS, in_window
+
+
+# Passengers listed on the flight page; the manifest export has them all.
+FLIGHT_PASSENGERS = 100
+MAX_MANIFEST_IDS = 1000
+# Flight list filters, kept in its pagination links, and its timetable order.
+FLIGHT_FILTERS = ("origin", *WINDOW_PARAMS)
+FLIGHT_ORDERING = ("departure", "id")
+# Airports with more flights than this are deleted by a background job.
+BACKGROUND_DELETE_FLIGHTS = 200
 
 
 # Create your views here.
+def flight_list(request):
+    """
+    The filtered flight list and its filters as a suffix for pagination
+    links. Raises ValueError for an invalid time window.
+    """
+    flights = Flight.objects.select_related("origin", "destination")
+    if request.GET.get("origin"):
+        flights = flights.filter(origin__code=request.GET["origin"].upper())
+    filters = urlencode([(key, request.GET[key]) for key in FLIGHT_FILTERS if request.GET.get(key)])
+    return in_window(flights, request.GET), f"&{filters}" if filters else ""
+
+@query_budget(5)
 def index(request):
-    flight_list = Flight.objects.all()
-    page = request.GET.get('page', 1)
-
-    paginator = Paginator(flight_list, 3)
     try:
-        flights_paginated = paginator.page(page)
-    except PageNotAnInteger:
-        flights_paginated = paginator.page(1)
-    except EmptyPage:
-        flights_paginated = paginator.page(paginator.num_pages)
+        flights, filters = flight_list(request)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    # Evaluated only when the cached fragment in the template misses.
+    flights_paginated = SimpleLazyObject(lambda: paginate(request, flights, 3, ordering=FLIGHT_ORDERING))
 
     return render(request, "flights/index.html", {
-        "flights": flights_paginated
+        "flights": flights_paginated,
+        "fragment": fragment_key(request, "flights"),
+        "filters": filters,
+    })
+
+def routes(request):
+    origin = request.GET.get("from", "")
+    destination = request.GET.get("to", "")
+    try:
+        k = max(1, min(int(request.GET.get("k", 3)), 10))
+        max_legs = max(1, min(int(request.GET.get("max_legs", DEFAULT_MAX_LEGS)), 6))
+    except ValueError:
+        return JsonResponse({"error": "k and max_legs must be integers."}, status=400)
+
+    airports = Airport.objects.filter(Q(code__iexact=origin) | Q(code__iexact=destination)).values_list("id", "code")
+    origins = [pk for pk, code in airports if code.upper() == origin.upper()]
+    destinations = [pk for pk, code in airports if code.upper() == destination.upper()]
+    if not origins or not destinations:
+        return JsonResponse({"error": "Unknown origin or destination airport code."}, status=400)
+
+    results = route_index.search(origins, destinations, k=k, max_legs=max_legs)
+    return JsonResponse({
+        "from": origin.upper(),
+        "to": destination.upper(),
+        "itineraries": route_index.describe(results),
+    })
+
+ANALYTICS_ORDERS = {"passengers": "-passengers", "flights": "-flights", "duration": "-average_duration"}
+
+def _airport_summary(airport):
+    return {"id": airport.id, "code": airport.code, "city": airport.city}
+
+@query_budget(3)
+def analytics(request):
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 20)), 100))
+    except ValueError:
+        return JsonResponse({"error": "limit must be an integer."}, status=400)
+    order = request.GET.get("order", "passengers")
+    if order not in ANALYTICS_ORDERS:
+        return JsonResponse({"error": f"order must be one of: {', '.join(ANALYTICS_ORDERS)}."}, status=400)
+
+    routes = RouteStats.objects.select_related("origin", "destination").order_by(ANALYTICS_ORDERS[order], "id")
+    airports = AirportStats.objects.select_related("airport").order_by("-departures", "airport_id")
+    if request.GET.get("airport"):
+        code = request.GET["airport"].upper()
+        routes = routes.filter(Q(origin__code=code) | Q(destination__code=code))
+        airports = airports.filter(airport__code=code)
+
+    return JsonResponse({
+        "routes": [
+            {
+                "origin": _airport_summary(route.origin),
+                "destination": _airport_summary(route.destination),
+                "flights": route.flights,
+                "average_duration": round(route.average_duration, 1),
+                "passengers": route.passengers,
+                "updated_at": route.updated_at,
+            }
+            for route in routes[:limit]
+        ],
+        "airports": [
+            {
+                **_airport_summary(summary.airport),
+                "departures": summary.departures,
+                "arrivals": summary.arrivals,
+                "passengers_departing": summary.passengers_departing,
+                "passengers_arriving": summary.passengers_arriving,
+                "updated_at": summary.updated_at,
+            }
+            for summary in airports[:limit]
+        ],
+    })
+
+def performance(request):
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Staff only."}, status=403)
+    if request.method == "POST" and request.POST.get("reset"):
+        stats.reset()
+    return JsonResponse(stats.snapshot())
+
+def job_status(request, job_id):
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=403)
+    try:
+        job = Job.objects.get(pk=job_id)
+    except Job.DoesNotExist:
+        raise Http404("Job does not exist.")
+
+    return JsonResponse({
+        "id": job.id,
+        "task": job.task,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "run_after": job.run_after,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "result": job.result,
+        # The last line of the traceback names the exception.
+        "error": job.error.strip().splitlines()[-1] if job.error else "",
     })
 
 def login_view(request):
     if request.method == "POST":
         username = request.POST["username"]
         password = request.POST["password"]
+        if login_blocked(request, username):
+            return render(request, "flights/login.html", {
+                "message": "Too many failed login attempts. Try again later."
+            }, status=429)
+
         user = authenticate(request, username=username, password=password)
         if user is not None:
+            login_succeeded(request, username)
             login(request, user)
             return HttpResponseRedirect(reverse("index"))
         else:
+            login_failed(request, username)
             return render (request, "flights/login.html", {
                 "message": "Invalid credentials."
             })
@@ -62,61 +209,176 @@ def registration(request):
         "form": form,
     })
 
+@query_budget(5)
 def airports(request):
     airport_list = Airport.objects.all()
-    page = request.GET.get('page', 1)
-
-    paginator = Paginator(airport_list, 3)
-    try:
-        airports_paginated = paginator.page(page)
-    except PageNotAnInteger:
-        airports_paginated = paginator.page(1)
-    except EmptyPage:
-        airports_paginated = paginator.page(paginator.num_pages)
+    airports_paginated = SimpleLazyObject(lambda: paginate(request, airport_list, 3))
 
     return render(request, "flights/airports.html", {
-        "airports": airports_paginated
+        "airports": airports_paginated,
+        "fragment": fragment_key(request, "airports"),
     })
 
+@query_budget(5)
 def passengers(request):
     if not request.user.is_authenticated:
         return HttpResponseRedirect(reverse("login"))
 
     passenger_list = Passenger.objects.all()
-    page = request.GET.get('page', 1)
-
-    paginator = Paginator(passenger_list, 3)
-    try:
-        passengers_paginated = paginator.page(page)
-    except PageNotAnInteger:
-        passengers_paginated = paginator.page(1)
-    except EmptyPage:
-        passengers_paginated = paginator.page(paginator.num_pages)
+    passengers_paginated = SimpleLazyObject(lambda: paginate(request, passenger_list, 3))
 
     return render(request, "flights/passengers.html", {
-        "passengers": passengers_paginated
+        "passengers": passengers_paginated,
+        "fragment": fragment_key(request, "passengers"),
     })
     
+def _get_itinerary(passenger_id):
+    try:
+        return itinerary_queryset().get(pk=passenger_id)
+    except (Passenger.DoesNotExist, ValueError, ValidationError):
+        raise Http404("Passenger does not exist or invalid passenger_id.")
+
+@query_budget(4)
+def itinerary(request, passenger_id):
+    if not request.user.is_authenticated:
+        return HttpResponseRedirect(reverse("login"))
+
+    passenger = _get_itinerary(passenger_id)
+    return render(request, "flights/itinerary.html", {
+        "passenger": passenger,
+        "total_duration": sum(flight.duration for flight in passenger.itinerary),
+    })
+
+@query_budget(4)
+def itinerary_json(request, passenger_id):
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=403)
+
+    return JsonResponse(describe(_get_itinerary(passenger_id)))
+
+@query_budget(4)
+def itinerary_batch(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=403)
+
+    try:
+        ids = [int(value) for value in request.GET.get("ids", "").split(",") if value.strip()]
+    except ValueError:
+        return JsonResponse({"error": "ids must be a comma separated list of integers."}, status=400)
+    if len(ids) > MAX_BATCH:
+        return JsonResponse({"error": f"At most {MAX_BATCH} ids per request."}, status=400)
+
+    results, missing = itineraries(ids)
+    return JsonResponse({"itineraries": results, "missing": missing})
+
+@query_budget(4)
 def flight(request, flight_id):
     try:
-        flight = Flight.objects.get(pk=flight_id)
+        flight = Flight.objects.select_related("origin", "destination").get(pk=flight_id)
     except (Flight.DoesNotExist, ValueError, ValidationError):
         raise Http404("Flight does not exist or invalid flight_id.")
 
     return render(request, "flights/flight.html", {
         "flight": flight,
-        "passengers": flight.passengers.all(),
-        "non_passengers": Passenger.objects.exclude(flights=flight).all()
+        "passengers": list(flight.passengers.order_by("id")[:FLIGHT_PASSENGERS]),
+        "truncated": flight.seats_booked > FLIGHT_PASSENGERS,
     })
 
+def _manifest_response(request, flights, filename):
+    fmt = request.GET.get("format", "csv")
+    if fmt not in MANIFEST_FORMATS:
+        return JsonResponse({"error": f"format must be one of: {', '.join(MANIFEST_FORMATS)}."}, status=400)
+
+    generate, content_type = MANIFEST_FORMATS[fmt]
+    response = StreamingHttpResponse(generate(flights), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+def manifest(request, flight_id):
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=403)
+
+    flights = Flight.objects.filter(pk=flight_id)
+    if not flights.exists():
+        raise Http404("Flight does not exist or invalid flight_id.")
+    return _manifest_response(request, flights, f"manifest-{flight_id}")
+
+def manifests(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=403)
+
+    # An origin, a time window or both select whole days of flights;
+    # otherwise the flights are given by id.
+    if request.GET.get("origin") or any(request.GET.get(param) for param in WINDOW_PARAMS):
+        flights = Flight.objects.all()
+        if request.GET.get("origin"):
+            flights = flights.filter(origin__code=request.GET["origin"].upper())
+        try:
+            flights = in_window(flights, request.GET)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+    else:
+        try:
+            ids = [int(value) for value in request.GET.get("ids", "").split(",") if value.strip()]
+        except ValueError:
+            return JsonResponse({"error": "ids must be a comma separated list of integers."}, status=400)
+        if not ids or len(ids) > MAX_MANIFEST_IDS:
+            return JsonResponse({"error": f"Pass origin=<code>, a date or 1 to {MAX_MANIFEST_IDS} ids."}, status=400)
+        flights = Flight.objects.filter(pk__in=ids)
+    return _manifest_response(request, flights, "manifests")
+
+@query_budget(3)
+def search_passengers(request, flight_id):
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=403)
+
+    terms = request.GET.get("q", "").split()
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 20)), 50))
+    except ValueError:
+        limit = 20
+
+    if not terms:
+        return JsonResponse({"results": []})
+
+    booked = Passenger.flights.through.objects.filter(flight_id=flight_id, passenger_id=OuterRef("pk"))
+    candidates = search_by_name(Passenger.objects.filter(~Exists(booked)), terms)
+
+    results = candidates.order_by("last_lower", "first_lower", "id").values("id", "first", "last")[:limit]
+    return JsonResponse({
+        "results": [
+            {**passenger, "name": f"{passenger['first']} {passenger['last']}"}
+            for passenger in results
+        ]
+    })
+
+def search(request):
+    # Passengers are only searched for signed in users, as in the views
+    # listing them.
+    query = request.GET.get("q", "")
+    if len(query) > MAX_QUERY_LENGTH or len(query.split()) > MAX_WORDS:
+        return JsonResponse(
+            {"error": f"q is limited to {MAX_WORDS} words and {MAX_QUERY_LENGTH} characters."}, status=400,
+        )
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 10)), 50))
+    except ValueError:
+        limit = 10
+
+    results = find(query, limit, passengers=request.user.is_authenticated)
+    return JsonResponse({"query": query, **results})
+
 def book(request, flight_id):
     if not request.user.is_authenticated:
         raise Http404("You don't have permission to book this passenger.")
 
     if request.method == "POST":
-        flight = Flight.objects.get(pk=flight_id)
-        passenger = Passenger.objects.get(pk=int(request.POST["passenger"]))
-        passenger.flights.add(flight)
+        flight = _get_flight(flight_id)
+        result = book_passengers(flight, [_passenger_id(request)])
+        if result.missing:
+            raise Http404("Passenger does not exist.")
+        if result.full:
+            messages.error(request, "This flight is fully booked.")
         return HttpResponseRedirect(reverse("flight", args=(flight_id,)))
 
 def unbook(request, flight_id):
@@ -124,11 +386,140 @@ def unbook(request, flight_id):
         raise Http404("You don't have permission to unbook this passenger.")
 
     if request.method == "POST":
-        flight = Flight.objects.get(pk=flight_id)
-        passenger = Passenger.objects.get(pk=int(request.POST["passenger"]))
-        passenger.flights.remove(flight)
+        flight = _get_flight(flight_id)
+        result = unbook_passengers(flight, [_passenger_id(request)])
+        if result.missing:
+            raise Http404("Passenger does not exist.")
         return HttpResponseRedirect(reverse("flight", args=(flight_id,)))
 
+def _get_flight(flight_id):
+    try:
+        return Flight.objects.get(pk=flight_id)
+    except (Flight.DoesNotExist, ValueError, ValidationError):
+        raise Http404("Flight does not exist or invalid flight_id.")
+
+def _passenger_id(request):
+    try:
+        return int(request.POST["passenger"])
+    except (KeyError, ValueError):
+        raise Http404("Invalid passenger.")
+
+def _bulk_rows(request):
+    # Accepts a JSON list (or {"passengers": [...]}), a CSV body whose first
+    # column holds passenger ids, or form fields named "passengers" that may
+    # themselves be comma separated.
+    if request.content_type == "application/json":
+        data = json.loads(request.body)
+        if isinstance(data, dict):
+            data = data.get("passengers", [])
+        if not isinstance(data, list):
+            raise ValueError("Expected a list of passenger ids.")
+        return data
+
+    if request.content_type == "text/csv":
+        rows = [row[0].strip() for row in csv.reader(io.StringIO(request.body.decode())) if row and row[0].strip()]
+        if rows and not rows[0].isdigit():
+            rows = rows[1:]
+        return rows
+
+    return [
+        part.strip()
+        for value in request.POST.getlist("passengers")
+        for part in value.split(",")
+        if part.strip()
+    ]
+
+def _bulk_booking(request, flight_id, operation, label):
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=403)
+
+    try:
+        flight = Flight.objects.get(pk=flight_id)
+    except Flight.DoesNotExist:
+        return JsonResponse({"error": "Flight does not exist."}, status=404)
+
+    try:
+        rows = _bulk_rows(request)
+    except (ValueError, UnicodeDecodeError) as exc:
+        return JsonResponse({"error": f"Malformed request body: {exc}"}, status=400)
+
+    passenger_ids, positions, skipped, errors = [], {}, [], []
+    for row, value in enumerate(rows, start=1):
+        try:
+            passenger_id = int(str(value))
+        except ValueError:
+            errors.append({"row": row, "value": value, "error": "Invalid passenger id."})
+            continue
+
+        if passenger_id in positions:
+            skipped.append({"row": row, "passenger": passenger_id, "reason": "Duplicate in request."})
+            continue
+
+        positions[passenger_id] = row
+        passenger_ids.append(passenger_id)
+
+    result = operation(flight, passenger_ids)
+
+    reason = "Already booked." if label == "booked" else "Not booked."
+    skipped += [{"row": positions[pk], "passenger": pk, "reason": reason} for pk in result.unchanged]
+    errors += [{"row": positions[pk], "value": pk, "error": "Passenger does not exist."} for pk in result.missing]
+    errors += [{"row": positions[pk], "value": pk, "error": "Flight is fully booked."} for pk in result.full]
+
+    return JsonResponse({
+        "flight": flight.id,
+        label: result.changed,
+        "skipped": sorted(skipped, key=lambda item: item["row"]),
+        "errors": sorted(errors, key=lambda item: item["row"]),
+    })
+
+@require_POST
+def bulk_book(request, flight_id):
+    return _bulk_booking(request, flight_id, book_passengers, "booked")
+
+@require_POST
+def bulk_unbook(request, flight_id):
+    return _bulk_booking(request, flight_id, unbook_passengers, "unbooked")
+
+def _board(request, airport_id):
+    if not hasattr(request, "_board"):
+        request._board = get_board(airport_id)
+    return request._board
+
+def _board_etag(request, airport_id):
+    board = _board(request, airport_id)
+    if board is None:
+        return None
+    # The HTML page also depends on whether the visitor is logged in.
+    if request.resolver_match.url_name == "airport_board":
+        return f"{board['etag']}-{int(request.user.is_authenticated)}"
+    return board["etag"]
+
+def _board_last_modified(request, airport_id):
+    board = _board(request, airport_id)
+    return board and board["last_modified"]
+
+@condition(etag_func=_board_etag, last_modified_func=_board_last_modified)
+def airport_board(request, airport_id):
+    board = _board(request, airport_id)
+    if board is None:
+        raise Http404("Airport does not exist or invalid airport_id.")
+
+    return render(request, "flights/board.html", {
+        "board": board,
+    })
+
+@condition(etag_func=_board_etag, last_modified_func=_board_last_modified)
+def airport_board_json(request, airport_id):
+    board = _board(request, airport_id)
+    if board is None:
+        return JsonResponse({"error": "Airport does not exist."}, status=404)
+
+    return JsonResponse({
+        "airport": board["airport"],
+        "departures": board["departures"],
+        "arrivals": board["arrivals"],
+    })
+
 def create_airport(request):
     if not request.user.is_authenticated:
         return HttpResponseRedirect(reverse("login"))
@@ -176,6 +567,12 @@ def delete_airport(request, airport_id):
     except (Airport.DoesNotExist, ValueError, ValidationError):
         raise Http404("Airport does not exist or invalid airport_id.")  
 
+    # The cascade loads and deletes every departure, arrival and booking.
+    if Flight.objects.filter(Q(origin=airport) | Q(destination=airport)).count() > BACKGROUND_DELETE_FLIGHTS:
+        job = enqueue("delete_airport", airport_id=airport.pk)
+        messages.info(request, f"{airport} will be deleted in the background (job {job.id}).")
+        return HttpResponseRedirect(reverse("airports"))
+
     airport.delete()
     return HttpResponseRedirect(reverse("airports"))
 
@@ -250,7 +647,7 @@ def update_flight(request, flight_id):
         return HttpResponseRedirect(reverse("login"))
 
     try:
-        flight = Flight.objects.get(pk=flight_id)
+        flight = Flight.objects.select_related("origin", "destination").get(pk=flight_id)
     except (Flight.DoesNotExist, ValueError, ValidationError):
         raise Http404("Flight does not exist or invalid flight_id.")
 
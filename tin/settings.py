@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,7 +42,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'flights.instrumentation.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'flights.staticfiles.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,7 +57,8 @@ ROOT_URLCONF = 'tin.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates with render timing for PerformanceMiddleware.
+        'BACKEND': 'flights.instrumentation.TimedTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -74,14 +78,102 @@ WSGI_APPLICATION = 'tin.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DJANGO_DB_ENGINE selects the profile: 'sqlite' (default) or 'postgresql'.
+# PostgreSQL keeps connections open between requests and, when
+# DJANGO_DB_REPLICAS lists replica hosts, sends reads to them through
+# flights.routers.ReplicaRouter.
+
+if os.environ.get('DJANGO_DB_ENGINE') == 'postgresql':
+    _postgres = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('DJANGO_DB_NAME', 'tin'),
+        'USER': os.environ.get('DJANGO_DB_USER', ''),
+        'PASSWORD': os.environ.get('DJANGO_DB_PASSWORD', ''),
+        'HOST': os.environ.get('DJANGO_DB_HOST', ''),
+        'PORT': os.environ.get('DJANGO_DB_PORT', ''),
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
     }
+    DATABASES = {'default': _postgres}
+    for _number, _host in enumerate(filter(None, os.environ.get('DJANGO_DB_REPLICAS', '').split(',')), start=1):
+        DATABASES[f'replica{_number}'] = {**_postgres, 'HOST': _host, 'TEST': {'MIRROR': 'default'}}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3'),
+            # A file rather than shared-cache memory, whose table locks fail
+            # at once instead of honouring busy_timeout, so that concurrent
+            # tests wait for the write lock as production connections do.
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+
+DATABASE_ROUTERS = ['flights.routers.ReplicaRouter']
+
+# Applied by flights.signals to every new SQLite connection. WAL lets
+# readers run alongside the single writer; busy_timeout makes writers wait
+# for the lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Process-local memory by default; set DJANGO_CACHE_DIR to share a
+# file-based cache between worker processes on one machine. Boards, list
+# fragments and the route index are invalidated through the cache, so
+# run_jobs and import_data only reach running web processes through a
+# shared one.
+
+if os.environ.get('DJANGO_CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['DJANGO_CACHE_DIR'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# Sessions
+# DJANGO_SESSION_ENGINE picks where sessions live: 'db' (default),
+# 'cached_db' (cache in front of the database; pair it with
+# DJANGO_CACHE_DIR when running several worker processes), 'cache' or
+# 'signed_cookies' (no server-side storage at all).
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + os.environ.get('DJANGO_SESSION_ENGINE', 'db')
+
+
+# Password hashing
+# New and re-verified passwords are hashed with PASSWORD_HASH_ITERATIONS
+# rounds of PBKDF2; hashes with another count are rewritten at login.
+
+PASSWORD_HASHERS = [
+    'flights.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('DJANGO_PASSWORD_HASH_ITERATIONS', '600000'))
+
+# Failed logins allowed per (address, username) and per address within the
+# window, in seconds, before further attempts are refused unchecked.
+LOGIN_RATE_LIMIT = (5, 50, 300)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -118,7 +210,65 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# collectstatic copies assets here; flights.staticfiles.StaticFilesMiddleware
+# serves them from the app process once it has run. DJANGO_STATIC_MANIFEST
+# switches to the production mode: content-hashed file names cached as
+# immutable, with gzip (and, given the brotli package, brotli) variants
+# written at collectstatic time. Templates then need the collected
+# manifest, so leave it unset for development and tests.
+
+STATIC_ROOT = os.environ.get('DJANGO_STATIC_ROOT', BASE_DIR / 'staticfiles')
+
+# Cache lifetime in seconds of static files without a content hash.
+STATIC_MAX_AGE = 60
+
+if os.environ.get('DJANGO_STATIC_MANIFEST'):
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'flights.staticfiles.CompressedManifestStaticFilesStorage'},
+    }
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Views decorated with flights.querybudget.query_budget log a warning when
+# they exceed their declared query count; strict mode raises instead, and
+# is on for every test run through the test runner below.
+QUERY_BUDGET_STRICT = False
+TEST_RUNNER = 'flights.querybudget.StrictQueryBudgetRunner'
+
+# Share of requests measured by flights.instrumentation.PerformanceMiddleware
+# (Server-Timing header and per-URL histograms at /flights/performance).
+# One in ten keeps the histograms representative at a tenth of the cost;
+# set DJANGO_PERFORMANCE_SAMPLE_RATE=1 to measure everything.
+# Set DJANGO_PERFORMANCE_LOG to also append the histograms to a file.
+PERFORMANCE_SAMPLE_RATE = float(os.environ.get('DJANGO_PERFORMANCE_SAMPLE_RATE', '0.1'))
+PERFORMANCE_LOG_INTERVAL = 60
+
+if os.environ.get('DJANGO_PERFORMANCE_LOG'):
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            'performance': {
+                'class': 'logging.FileHandler',
+                'filename': os.environ['DJANGO_PERFORMANCE_LOG'],
+            },
+        },
+        'loggers': {
+            'flights.instrumentation': {
+                'handlers': ['performance'],
+                'level': 'INFO',
+            },
+        },
+    }
+
+# Background jobs (flights.jobs, run by `manage.py run_jobs`). Failed
+# attempts are retried after JOB_RETRY_BACKOFF seconds, doubling each time
+# up to JOB_RETRY_BACKOFF_MAX. Jobs whose worker process has died are
+# queued again; on another host that is assumed after JOB_TIMEOUT.
+JOB_RETRY_BACKOFF = 30
+JOB_RETRY_BACKOFF_MAX = 3600
+JOB_TIMEOUT = 3600